@@ -0,0 +1,31 @@
+"""memories_user_id_key_unique
+
+Revision ID: 20261019_002
+Revises: 20240203_001
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20261019_002'
+down_revision: Union[str, None] = '20240203_001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep only the newest row per (user_id, key) so the unique index can be built
+    op.execute(
+        "DELETE FROM memories WHERE id NOT IN ("
+        "SELECT MAX(id) FROM memories GROUP BY user_id, key)"
+    )
+    # Composite unique index is the ON CONFLICT target for preference upserts
+    op.create_index('uq_memories_user_id_key', 'memories', ['user_id', 'key'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_memories_user_id_key', table_name='memories')
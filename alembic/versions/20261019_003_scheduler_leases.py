@@ -0,0 +1,32 @@
+"""scheduler_leases
+
+Revision ID: 20261019_003
+Revises: 20261019_002
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20261019_003'
+down_revision: Union[str, None] = '20261019_002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # One row per lease name; replicas take it over once expires_at has passed
+    op.create_table(
+        'scheduler_leases',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('owner', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('scheduler_leases')
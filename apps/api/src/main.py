@@ -1,15 +1,22 @@
 from fastapi import FastAPI, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
 from core.database import get_db
 from core.models import Task, TaskStatus
 from core.schemas import TaskRead
-from core.db import crud
-from core.agent import run_agent_loop
-from core.logging_config import setup_logging, set_request_id, get_logger
-from core.rate_limiter import message_rate_limiter
+from core.db import crud, async_crud
+from core.agent.loop import run_agent_loop
+from core.logging_config import setup_logging, set_request_id, get_request_id, get_logger
+from core.rate_limiter import message_rate_limiter, check_async
+from core.admission import admission, intent_cost, BUSY_RETRY_AFTER
+from core.parser import parse_message
 from core.safety import validate_input, MAX_STEPS_PER_RUN
-from core.metrics import metrics, METRIC_REQUESTS_TOTAL, METRIC_REQUESTS_SUCCESS, METRIC_REQUESTS_FAILED, METRIC_RATE_LIMITED
+from core.cache import invalidation_bus
+from core import prometheus
+from core.metrics_history import metrics_history, SECOND
+from core.loop_monitor import loop_monitor
+from core.tracing import span
+from core.metrics import metrics, METRIC_REQUESTS_TOTAL, METRIC_REQUESTS_SUCCESS, METRIC_REQUESTS_FAILED, METRIC_RATE_LIMITED, METRIC_REQUEST_DURATION
 from typing import List
 from pydantic import BaseModel
 import time
@@ -27,6 +34,35 @@ class MessagePayload(BaseModel):
     message_id: int | None = None
     chat_id: int | None = None
 
+@app.on_event("startup")
+def start_cache_invalidation():
+    """Listen for cache invalidations from the bot and other workers."""
+    invalidation_bus.start()
+
+@app.on_event("startup")
+async def start_admission_monitor():
+    """Sample event-loop lag so expensive requests can be shed under load."""
+    admission.start_lag_monitor()
+    loop_monitor.start()
+
+@app.on_event("startup")
+def start_metrics_history():
+    """Sample key metrics every second for /metrics/history."""
+    metrics_history.start()
+
+@app.on_event("startup")
+def warm_caches():
+    """Preload recent users so the first messages skip the user lookup."""
+    try:
+        crud.warm_user_cache()
+    except Exception as e:
+        logger.warning(f"User cache warm-up skipped: {e}")
+
+@app.on_event("shutdown")
+def flush_message_log():
+    """Write buffered message-log rows before the worker exits."""
+    crud.message_log_buffer.close()
+
 @app.middleware("http")
 async def add_request_id(request: Request, call_next):
     """Add request ID to all requests."""
@@ -34,9 +70,19 @@ async def add_request_id(request: Request, call_next):
     set_request_id(request_id)
     
     start_time = time.time()
-    response = await call_next(request)
+    with span("http.request", method=request.method) as request_span:
+        response = await call_next(request)
+        # Route template (not the raw path) keeps label cardinality bounded
+        route = request.scope.get("route")
+        request_span.name = f"{request.method} {route.path if route else 'unmatched'}"
+        request_span.set(status=response.status_code)
     duration_ms = (time.time() - start_time) * 1000
     
+    metrics.observe(
+        METRIC_REQUEST_DURATION, duration_ms,
+        method=request.method, path=route.path if route else "unmatched", status=response.status_code,
+    )
+    
     response.headers["X-Request-ID"] = request_id
     response.headers["X-Response-Time"] = f"{duration_ms:.2f}ms"
     
@@ -50,13 +96,31 @@ def health_check():
 
 @app.get("/metrics")
 def get_metrics():
-    """Basic metrics endpoint."""
+    """Metrics in Prometheus text format."""
+    return Response(prometheus.render(), media_type=prometheus.CONTENT_TYPE)
+
+@app.get("/metrics/json")
+def get_metrics_json():
+    """Metrics as JSON, with histogram percentiles."""
     return metrics.get_all()
 
+@app.get("/metrics/history")
+def get_metrics_history(resolution: str = SECOND, window: int = None):
+    """Per-second or per-minute history of key counters and latencies (last hour at most)."""
+    try:
+        return metrics_history.query(resolution, window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/metrics/stalls")
+def get_loop_stalls():
+    """Longest event-loop stalls with the stack that blocked."""
+    return {"threshold_ms": loop_monitor.threshold * 1000, "stalls": loop_monitor.top_stalls()}
+
 @app.post("/v1/message")
 async def handle_message(payload: MessagePayload, db: Session = Depends(get_db)):
     """Receive message from bot, run agent loop, return response."""
-    request_id = set_request_id()
+    request_id = get_request_id()  # Set by the middleware; spans below join its trace
     metrics.increment(METRIC_REQUESTS_TOTAL)
     
     telegram_user_id = payload.telegram_user_id
@@ -65,10 +129,9 @@ async def handle_message(payload: MessagePayload, db: Session = Depends(get_db))
     logger.info(f"Received message from {telegram_user_id}: {text[:50]}...")
     
     # Rate limiting
-    allowed, remaining = message_rate_limiter.is_allowed(telegram_user_id)
+    allowed, remaining, retry_after = await check_async(message_rate_limiter, telegram_user_id)
     if not allowed:
         metrics.increment(METRIC_RATE_LIMITED)
-        retry_after = message_rate_limiter.get_retry_after(telegram_user_id)
         return JSONResponse(
             status_code=429,
             content={"error": "Rate limited", "retry_after": retry_after},
@@ -81,15 +144,24 @@ async def handle_message(payload: MessagePayload, db: Session = Depends(get_db))
         metrics.increment(METRIC_REQUESTS_FAILED)
         return JSONResponse(status_code=400, content={"error": error_msg})
     
+    # Shed LLM/desktop work while overloaded; cheap intents wait in a bounded queue
+    if not await admission.admit_async(intent_cost(parse_message(text).intent)):
+        return JSONResponse(
+            status_code=503,
+            content={"error": "Busy, try again", "retry_after": BUSY_RETRY_AFTER},
+            headers={"Retry-After": str(BUSY_RETRY_AFTER)}
+        )
+    
     # Ensure user exists
-    user = crud.get_or_create_user(db, telegram_user_id)
+    user = await async_crud.get_or_create_user(telegram_user_id)
+    user_id = user["id"]
     
     # Log the incoming message
-    crud.log_message(db, user.id, text, "telegram")
+    await async_crud.log_message(user_id, text, "telegram")
     
-    # Run agent loop
+    # Run agent loop off the event loop; counted so admission sees executor backlog
     try:
-        result = run_agent_loop(text, user.id, db)
+        result = await admission.to_thread(run_agent_loop, text, user_id, db)
         metrics.increment(METRIC_REQUESTS_SUCCESS)
     except Exception as e:
         metrics.increment(METRIC_REQUESTS_FAILED)
@@ -100,7 +172,7 @@ async def handle_message(payload: MessagePayload, db: Session = Depends(get_db))
     run_id = result.get("run_id")
     
     # Log agent response
-    crud.log_message(db, user.id, response_text, "agent")
+    await async_crud.log_message(user_id, response_text, "agent")
     
     return {"response": response_text, "run_id": run_id, "request_id": request_id}
 
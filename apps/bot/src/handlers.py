@@ -4,7 +4,7 @@ Telegram Bot Handlers - With Groq LLM and UI automation.
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from core.db import crud
+from core.db import async_crud
 from core.parser import parse_message, Intent
 from core.agent.planner import make_plan
 from core.agent.formatter import format_reply
@@ -12,10 +12,15 @@ from core.agent.guardrails import is_high_risk, get_risk_description
 from core.agent.tools import task_tool, scheduler_tool, approval_tool
 from core.agent.tools import shell_tool, file_tool, app_tool, ui_tool, vision_tool, media_tool
 from core.config import get_settings
+from core.metrics import metrics, METRIC_RATE_LIMITED, METRIC_TOOL_DURATION, METRIC_MESSAGE_DURATION
+from core.rate_limiter import AsyncRateLimiter
+from core.admission import admission, plan_cost, EXPENSIVE, BUSY_MESSAGE
+from core.tracing import current_span, span, traced
 from groq import Groq
 import json
 import logging
 import os
+import time
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -32,13 +37,17 @@ TOOL_REGISTRY = {
     "media_tool": media_tool,
 }
 
+# Always in memory: only one process may poll Telegram, so there is nothing to share,
+# and the sqlite backend's blocking file lock would stall the event loop.
+message_limiter = AsyncRateLimiter(max_requests=20, window_seconds=60)
+
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command."""
     try:
         telegram_user_id = str(update.effective_user.id)
         name = update.effective_user.first_name or f"User_{telegram_user_id[-4:]}"
         
-        user = crud.get_or_create_user(telegram_user_id, name)
+        user = await async_crud.get_or_create_user(telegram_user_id, name)
         
         await update.message.reply_text(
             f"👋 Hi {name}!\n\n"
@@ -55,8 +64,11 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error in start handler: {e}", exc_info=True)
         await update.message.reply_text(f"Error: {str(e)[:100]}")
 
+@traced("bot.message", root=True)  # One trace per Telegram update
 async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle all text messages."""
+    started = time.perf_counter()
+    intent = "none"
     try:
         telegram_user_id = str(update.effective_user.id)
         text = update.message.text.strip()
@@ -64,18 +76,26 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not text:
             return
         
+        allowed, _ = message_limiter.is_allowed(telegram_user_id)
+        if not allowed:
+            metrics.increment(METRIC_RATE_LIMITED)
+            retry_after = message_limiter.get_retry_after(telegram_user_id)
+            await update.message.reply_text(f"⏳ Too many messages. Try again in {retry_after}s.")
+            return
+        
         # Get or create user
-        user = crud.get_or_create_user(telegram_user_id)
+        user = await async_crud.get_or_create_user(telegram_user_id)
         user_id = user["id"]
         
-        # Log message
+        # Log message (buffered, written in the background)
         try:
-            crud.log_message(user_id, text, "telegram")
+            await async_crud.log_message(user_id, text, "telegram")
         except:
             pass
         
         # Parse message
         parsed = parse_message(text)
+        intent = parsed.intent.value
         logger.info(f"Parsed intent: {parsed.intent}, params: {parsed.params}")
         
         # INTERCEPTOR: Force media_tool for music commands
@@ -94,8 +114,12 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # If parser didn't understand, try Groq LLM
         elif parsed.intent == Intent.UNKNOWN and settings.GROQ_API_KEY:
+            if not admission.admit(EXPENSIVE):
+                await update.message.reply_text(BUSY_MESSAGE)
+                return
             logger.info("Using Groq LLM fallback")
-            llm_result = await get_groq_response(text)
+            with admission.llm_call():
+                llm_result = await get_groq_response(text)
             
             # Check if it's a tool command or just chat
             if llm_result.get("is_tool_command"):
@@ -107,6 +131,11 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             plan = make_plan(parsed)
         
+        # Shed desktop/shell/vision work while overloaded; task commands wait for load to clear
+        if not await admission.admit_async(plan_cost(plan)):
+            await update.message.reply_text(BUSY_MESSAGE)
+            return
+        
         # Execute plan
         result = await execute_plan_with_photos(plan, user_id, update)
         
@@ -119,13 +148,19 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error(f"Error in message handler: {e}", exc_info=True)
         await update.message.reply_text(f"⚠️ Error: {str(e)[:200]}")
+    finally:
+        metrics.observe(METRIC_MESSAGE_DURATION, (time.perf_counter() - started) * 1000, intent=intent)
+        current_span().set(intent=intent, update_id=update.update_id)
 
+@traced("llm.groq")
 async def get_groq_response(text: str) -> dict:
     """Use Groq LLM for understanding and chat."""
     try:
         client = Groq(api_key=settings.GROQ_API_KEY)
         
-        response = client.chat.completions.create(
+        # Run the blocking client off the event loop
+        response = await admission.to_thread(
+            client.chat.completions.create,
             model=settings.GROQ_MODEL,
             messages=[
                 {"role": "system", "content": """Kamu adalah asisten AI yang ramah dan helpful, berbicara dalam Bahasa Indonesia.
@@ -208,7 +243,7 @@ async def execute_plan_with_photos(plan: dict, user_id: int, update: Update, byp
             step_names = [f"{s.get('tool')}.{s.get('action')}" for s in steps]
             desc = f"Run {len(steps)} steps: {', '.join(step_names[:3])}" + ("..." if len(step_names)>3 else "")
             
-            approval = crud.create_approval_request(user_id, desc, {"steps": steps})
+            approval = await async_crud.create_approval_request(user_id, desc, {"steps": steps})
             
             # Send APPROVAL BUTTONS
             keyboard = [
@@ -244,8 +279,10 @@ async def execute_plan_with_photos(plan: dict, user_id: int, update: Update, byp
             continue
         
         try:
-            # Execute
-            result = tool.execute(action, params, user_id, None)
+            # Execute off the event loop; tools make blocking DB and subprocess calls
+            with span(f"tool.{tool_name}", action=action), \
+                    metrics.time(METRIC_TOOL_DURATION, tool=tool_name, status="ok"):
+                result = await admission.to_thread(tool.execute, action, params, user_id, None)
             results.append({"tool": tool_name, "result": result})
             
             # RECURSIVE EXECUTION for Approval Tool
@@ -305,6 +342,7 @@ async def send_document(update: Update, file_path: str):
     except Exception as e:
         logger.error(f"Failed to send document: {e}")
 
+@traced("bot.callback", root=True)
 async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle callback queries (buttons)."""
     query = update.callback_query
@@ -322,7 +360,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             approval_id = int(value)
             
             # Execute approval (Update DB only)
-            result = approval_tool.execute("approve", {"approval_id": approval_id}, user_id, None)
+            result = await admission.to_thread(approval_tool.execute, "approve", {"approval_id": approval_id}, user_id, None)
             
             if result.get("success"):
                 await query.message.edit_reply_markup(reply_markup=None) # Remove buttons
@@ -344,7 +382,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                  
         elif action == "reject":
             approval_id = int(value)
-            crud.update_approval_status(approval_id, "rejected")
+            await async_crud.update_approval_status(approval_id, "rejected")
             await query.message.edit_text(f"❌ Request #{approval_id} rejected.")
 
     except Exception as e:
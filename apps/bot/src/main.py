@@ -9,20 +9,35 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 
 from telegram.ext import Application
 from core.config import get_settings
+from core.logging_config import setup_logging
+from core.admission import admission
+from core.cache import invalidation_bus
+from core.prometheus import start_metrics_server
+from core.metrics_history import metrics_history
+from core.loop_monitor import loop_monitor
+from core.db import crud
+from core.supabase_client import close_async_supabase
 from handlers import setup_handlers
 from scheduler import setup_scheduler, shutdown_scheduler
 import logging
 import signal
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Configure logging (queued; written off the event loop)
+setup_logging(json_format=False)
 logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
+async def on_startup(app: Application):
+    """Start sampling event-loop lag and stalls, and metrics history."""
+    admission.start_lag_monitor()
+    loop_monitor.start()
+    metrics_history.start()
+
+async def on_shutdown(app: Application):
+    """Release the shared Supabase connection pool."""
+    await close_async_supabase()
+
 def main():
     if not settings.TELEGRAM_BOT_TOKEN:
         logger.error("TELEGRAM_BOT_TOKEN not set")
@@ -30,7 +45,8 @@ def main():
 
     logger.info("Starting Bot...")
     app = Application.builder().token(settings.TELEGRAM_BOT_TOKEN)\
-        .read_timeout(30).write_timeout(30).connect_timeout(30).pool_timeout(30).build()
+        .read_timeout(30).write_timeout(30).connect_timeout(30).pool_timeout(30)\
+        .post_init(on_startup).post_shutdown(on_shutdown).build()
     
     # Setup handlers
     setup_handlers(app)
@@ -38,10 +54,19 @@ def main():
     # Setup scheduler
     setup_scheduler(app)
     
+    # Keep in-process caches coherent with the API
+    invalidation_bus.start()
+    
+    # Prometheus scrape endpoint for this process
+    metrics_server = start_metrics_server(settings.BOT_METRICS_PORT, settings.BOT_METRICS_HOST)
+    
     # Graceful shutdown
     def signal_handler(sig, frame):
         logger.info("Shutting down...")
         shutdown_scheduler()
+        if metrics_server:
+            metrics_server.shutdown()
+        crud.message_log_buffer.close()
     
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
@@ -2,78 +2,241 @@
 Scheduler Service - Daily briefs using Supabase.
 """
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from telegram.ext import Application
 from core.config import get_settings
-from core.supabase_client import get_supabase
+from core.agent.formatter import format_daily_brief
+from core.agent import memory_service
+from core.brief_schedule import BriefSchedule, BRIEF_SCHEDULE_CHANNEL, MINUTES_PER_DAY
+from core.cache import invalidation_bus
+from core.database import SessionLocal
+from core.metrics import metrics
+from core.db import crud, async_crud
+from core.fanout import AsyncTokenBucket, FanoutSender
+from core.leader import ShardLeases
+from core.tracing import traced
+from typing import Dict, Any, Iterable, List
+import asyncio
 import logging
 import pytz
-from datetime import datetime
+from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 scheduler = AsyncIOScheduler()
 
-async def send_daily_brief(app: Application):
-    """Send daily brief to all users."""
+BRIEF_TOP_N = 5
+BRIEF_JOB_ID = "send_daily_brief"
+USER_PAGE_SIZE = 1000
+
+USER_COLUMNS = ("id", "telegram_user_id", "name", "timezone", "created_at")
+
+# Users bucketed by the UTC minute their brief is due
+brief_schedule = BriefSchedule()
+_loop = None  # Event loop the scheduler runs on, for cross-thread refreshes
+
+# Shared by every brief run so back-to-back minutes stay under Telegram's global limit
+brief_send_limiter = AsyncTokenBucket(rate=settings.BRIEF_SEND_RATE)
+
+# Every replica keeps the schedule, but only sends briefs for the shards it leases
+brief_leases = ShardLeases(
+    SessionLocal,
+    shards=settings.BRIEF_SHARDS,
+    ttl_seconds=settings.LEADER_LEASE_TTL,
+    max_held=settings.BRIEF_MAX_SHARDS_PER_REPLICA,
+)
+
+def _current_minute(now: datetime) -> int:
+    return now.hour * 60 + now.minute
+
+def _read_stored_preferences(user_ids: List[int] = None) -> Dict[int, Dict[str, Any]]:
+    with SessionLocal() as db:
+        return memory_service.get_schedule_preferences(db, user_ids)
+
+async def _stored_schedule_preferences(user_ids: List[int] = None) -> Dict[int, Dict[str, Any]]:
+    """Stored brief_time/timezone, or {} if the memory table cannot be read (users keep their row timezone)."""
+    try:
+        return await asyncio.to_thread(_read_stored_preferences, user_ids)
+    except Exception as e:
+        logger.warning(f"[Scheduler] Stored brief preferences unavailable, using defaults: {e}")
+        return {}
+
+def _schedule_entries(users: Iterable[Dict[str, Any]], stored: Dict[int, Dict[str, Any]]):
+    """(user_id, timezone, brief_time), preferring stored preferences over the user row."""
+    for user in users:
+        prefs = stored.get(user["id"], {})
+        yield user["id"], prefs.get("timezone") or user.get("timezone"), prefs.get("brief_time")
+
+@traced("scheduler.load_brief_schedule", root=True)
+async def load_brief_schedule(app: Application):
+    """
+    Rebuild the due-minute index from every user's timezone and brief_time.
+    Runs at startup and every BRIEF_SCHEDULE_RESYNC_SECONDS, which also picks up
+    users created elsewhere, missed invalidations and DST offset changes.
+    """
+    global _loop
+    _loop = asyncio.get_running_loop()
+    stored = await _stored_schedule_preferences()
+    try:
+        users = []
+        after_id = 0
+        while True:
+            page = await async_crud.get_users_page(after_id, USER_PAGE_SIZE)
+            users.extend(page)
+            if len(page) < USER_PAGE_SIZE:
+                break
+            after_id = page[-1]["id"]
+
+        count = brief_schedule.load(_schedule_entries(users, stored))
+        logger.info(f"[Scheduler] Brief schedule loaded for {count} users")
+    except Exception as e:
+        logger.error(f"[Scheduler] Failed to load brief schedule: {e}")
+    schedule_next_brief(app)
+
+async def refresh_brief_user(app: Application, user_id: int):
+    """Move one user to their new bucket after a brief_time or timezone change."""
+    try:
+        # Unlike the full load, skip on error rather than reset this user to defaults
+        stored = await asyncio.to_thread(_read_stored_preferences, [user_id])
+        page = await async_crud.get_users_page(user_id - 1, 1)
+        if not page or page[0]["id"] != user_id:
+            brief_schedule.remove_user(user_id)
+        else:
+            for entry in _schedule_entries(page, stored):
+                brief_schedule.set_user(*entry)
+    except Exception as e:
+        logger.error(f"[Scheduler] Failed to refresh brief schedule for user {user_id}: {e}")
+    schedule_next_brief(app)
+
+def add_new_user(app: Application, user: Dict[str, Any]):
+    """Schedule a just-created user; they have no stored preferences yet."""
+    brief_schedule.set_user(user["id"], user.get("timezone"), None)
+    schedule_next_brief(app)
+
+def schedule_next_brief(app: Application, after_minute: int = None):
+    """
+    Arm a one-shot job for the next minute after after_minute (default: now) that has
+    users due. If that minute has already passed, e.g. during a long run, run at once.
+    """
+    now = datetime.now(pytz.utc)
+    current = _current_minute(now)
+    after = current if after_minute is None else after_minute
+    minute = brief_schedule.next_due_minute(after)
+    if minute is None:
+        if scheduler.get_job(BRIEF_JOB_ID):
+            scheduler.remove_job(BRIEF_JOB_ID)
+        return
+
+    if 0 < (minute - after) % MINUTES_PER_DAY <= (current - after) % MINUTES_PER_DAY:
+        run_at = now  # run_due_briefs catches up from minute to the current one
+    else:
+        delta = (minute - current) % MINUTES_PER_DAY or MINUTES_PER_DAY
+        run_at = now.replace(second=0, microsecond=0) + timedelta(minutes=delta)
+    scheduler.add_job(
+        run_due_briefs,
+        DateTrigger(run_date=run_at),
+        args=[app, minute],
+        id=BRIEF_JOB_ID,
+        replace_existing=True,
+        misfire_grace_time=300,
+    )
+
+@traced("scheduler.run_due_briefs", root=True)
+async def run_due_briefs(app: Application, minute: int):
+    """Send briefs to the users due at this UTC minute, then arm the next wake-up."""
+    last_minute = minute
+    try:
+        # Catch up on any minutes that passed while this job was delayed
+        late = (_current_minute(datetime.now(pytz.utc)) - minute) % MINUTES_PER_DAY
+        last_minute = (minute + late) % MINUTES_PER_DAY
+        user_ids = set()
+        for m in range(minute, minute + late + 1):
+            user_ids |= brief_schedule.due(m % MINUTES_PER_DAY)
+        user_ids = {u for u in user_ids if brief_leases.owns(u)}
+        if user_ids:
+            await send_daily_brief(app, user_ids)
+    finally:
+        # From the last minute covered, not from now: buckets that fell due while sending still run
+        schedule_next_brief(app, last_minute)
+
+async def refresh_leases():
+    """Renew this replica's brief shard leases and claim any that lapsed."""
+    owned = await asyncio.to_thread(brief_leases.refresh)
+    metrics.set_gauge("brief_shards_owned", len(owned))
+
+@traced("scheduler.send_daily_brief")
+async def send_daily_brief(app: Application, user_ids: Iterable[int]):
+    """Send daily brief to the given users, fanned out under Telegram's rate limits."""
+    async def send(chat_id: int, text: str):
+        await app.bot.send_message(chat_id=chat_id, text=text)
+
+    sender = FanoutSender(
+        send,
+        brief_send_limiter,
+        concurrency=settings.BRIEF_SEND_CONCURRENCY,
+        per_chat_interval=settings.BRIEF_PER_CHAT_INTERVAL,
+        max_retries=settings.BRIEF_SEND_MAX_RETRIES,
+        name="brief_send",
+    )
     try:
-        supabase = get_supabase()
-        
-        # Get all users
-        result = supabase.table("users").select("*").execute()
-        users = result.data
-        
-        for user in users:
-            user_id = user["id"]
-            telegram_id = user.get("telegram_user_id")
-            user_tz = user.get("timezone", "Asia/Makassar")
-            
-            if not telegram_id:
-                continue
-            
-            # Check if it's morning in user's timezone
-            try:
-                tz = pytz.timezone(user_tz)
-                now = datetime.now(tz)
-                if now.hour != 7 or now.minute > 35:
-                    continue
-            except:
-                pass
-            
-            # Get open tasks
-            tasks_result = supabase.table("tasks").select("id,title").eq("user_id", user_id).eq("status", "open").execute()
-            tasks = tasks_result.data
-            
-            if not tasks:
-                message = "☀️ Good morning! You have no open tasks."
-            else:
-                task_list = "\n".join([f"  - {t['title']}" for t in tasks[:5]])
-                message = f"☀️ Daily Brief:\n\nOpen Tasks ({len(tasks)}):\n{task_list}"
-            
-            try:
-                await app.bot.send_message(chat_id=int(telegram_id), text=message)
-                logger.info(f"Sent daily brief to {telegram_id}")
-            except Exception as e:
-                logger.error(f"Failed to send brief to {telegram_id}: {e}")
-                
+        # One RPC per page of due users returns their open-task count and top titles
+        pages = async_crud.iter_daily_brief_pages(settings.BRIEF_PAGE_SIZE, BRIEF_TOP_N, list(user_ids))
+        async for page in pages:
+            crud.cache_users([{k: row.get(k) for k in USER_COLUMNS} for row in page])
+
+            items = [
+                (int(row["telegram_user_id"]), format_daily_brief(row.get("top_titles") or [], row.get("open_count", 0)))
+                for row in page if row.get("telegram_user_id")
+            ]
+            result = await sender.send_all(items)
+            logger.info(
+                f"[Scheduler] Sent {result['sent']} briefs ({result['failed']} failed, "
+                f"{result['retried']} retried) at {result['per_second']}/s"
+            )
+
     except Exception as e:
         logger.error(f"Daily brief error: {e}")
 
 def setup_scheduler(app: Application):
-    """Setup the scheduler with daily brief job."""
+    """Setup the scheduler with the brief schedule, its periodic rebuild and shard leases."""
+    brief_leases.check()  # Fail at startup, not on every lease refresh
+    scheduler.add_job(
+        refresh_leases,
+        IntervalTrigger(seconds=max(1, settings.LEADER_LEASE_TTL // 3)),
+        id="refresh_leases",
+        replace_existing=True,
+        next_run_time=datetime.now(pytz.utc),
+    )
     scheduler.add_job(
-        send_daily_brief,
-        CronTrigger(minute=30),
+        load_brief_schedule,
+        IntervalTrigger(seconds=settings.BRIEF_SCHEDULE_RESYNC_SECONDS),
         args=[app],
-        id="send_daily_brief",
-        replace_existing=True
+        id="load_brief_schedule",
+        replace_existing=True,
+        next_run_time=datetime.now(pytz.utc),
     )
     scheduler.start()
-    logger.info("[Scheduler] Started with daily brief at XX:30 (checking user timezones)")
+
+    # Preference changes arrive on the invalidation listener thread
+    def on_schedule_change(key: str):
+        if _loop is not None:  # Before the first load, the full scan covers it
+            asyncio.run_coroutine_threadsafe(refresh_brief_user(app, int(key)), _loop)
+
+    invalidation_bus.subscribe(BRIEF_SCHEDULE_CHANNEL, on_schedule_change)
+
+    # Users created by this process are scheduled at once rather than at the next resync
+    def on_user_created(user: Dict[str, Any]):
+        if _loop is not None:
+            _loop.call_soon_threadsafe(add_new_user, app, user)
+
+    crud.on_user_created(on_user_created)
+    logger.info("[Scheduler] Started; briefs run only at minutes with users due")
 
 def shutdown_scheduler():
     """Shutdown the scheduler."""
     if scheduler.running:
         scheduler.shutdown()
+        brief_leases.release_all()
         logger.info("[Scheduler] Shutdown complete")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Metrics recording overhead benchmark.
+
+Measures nanoseconds per increment/observe for the sharded Metrics registry
+against a single-lock baseline, with one and several recording threads.
+
+    PYTHONPATH=packages/core/src python benchmarks/metrics_overhead.py
+"""
+from concurrent.futures import ThreadPoolExecutor
+from core.metrics import Metrics, Histogram, label_set
+import argparse
+import threading
+import time
+
+class LockedMetrics:
+    """The previous design: every record takes one global lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, label_set(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+def ns_per_op(registry, op: str, threads: int, ops: int) -> float:
+    """Wall-clock nanoseconds per recorded value across all threads."""
+    def worker(_):
+        if op == "increment":
+            increment = registry.increment
+            for _ in range(ops):
+                increment("requests_total")
+        else:
+            observe = registry.observe
+            for i in range(ops):
+                observe("tool_duration_ms", float(i % 500), tool="task_tool", status="ok")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return (time.perf_counter() - started) * 1e9 / (threads * ops)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=200000, help="records per thread")
+    args = parser.parse_args()
+
+    rows = []
+    for op in ("increment", "observe"):
+        for threads in (1, args.threads):
+            for label, factory in (("single lock", LockedMetrics), ("sharded", Metrics)):
+                rows.append((f"{op}, {label}, {threads} thread(s)", ns_per_op(factory(), op, threads, args.ops)))
+
+    width = max(len(name) for name, _ in rows)
+    for name, ns in rows:
+        print(f"{name:<{width}}  {ns:>8.0f} ns/op")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Rate limiter contention benchmark.
+
+Compares the single-lock RateLimiter, StripedRateLimiter and AsyncRateLimiter
+on the same workload: many callers checking a spread of keys.
+
+    PYTHONPATH=packages/core/src python benchmarks/rate_limiter_contention.py
+"""
+from concurrent.futures import ThreadPoolExecutor
+from core.rate_limiter import RateLimiter, StripedRateLimiter, AsyncRateLimiter
+import argparse
+import asyncio
+import time
+
+def make_keys(count: int):
+    return [str(100000 + i) for i in range(count)]
+
+def run_threads(limiter, keys, threads: int, checks: int) -> float:
+    """Checks per second with `threads` workers hammering the limiter."""
+    def worker(offset: int):
+        is_allowed = limiter.is_allowed
+        n = len(keys)
+        for i in range(checks):
+            is_allowed(keys[(offset + i) % n])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return threads * checks / (time.perf_counter() - started)
+
+def run_tasks(limiter, keys, tasks: int, checks: int) -> float:
+    """Checks per second with `tasks` coroutines on one event loop."""
+    async def worker(offset: int):
+        is_allowed = limiter.is_allowed
+        n = len(keys)
+        for i in range(checks):
+            is_allowed(keys[(offset + i) % n])
+            if i % 100 == 0:
+                await asyncio.sleep(0)  # Interleave like real handlers
+
+    async def main():
+        await asyncio.gather(*(worker(t) for t in range(tasks)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return tasks * checks / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--checks", type=int, default=50000, help="checks per worker")
+    parser.add_argument("--keys", type=int, default=10000)
+    args = parser.parse_args()
+
+    keys = make_keys(args.keys)
+    # Generous limits so every check takes the same (allowed) path
+    limits = dict(max_requests=10**9, window_seconds=60)
+
+    results = {
+        "RateLimiter (1 lock), threads": run_threads(RateLimiter(**limits), keys, args.threads, args.checks),
+        "StripedRateLimiter (16), threads": run_threads(StripedRateLimiter(**limits), keys, args.threads, args.checks),
+        "RateLimiter (1 lock), asyncio": run_tasks(RateLimiter(**limits), keys, args.threads, args.checks),
+        "AsyncRateLimiter, asyncio": run_tasks(AsyncRateLimiter(**limits), keys, args.threads, args.checks),
+    }
+
+    width = max(len(name) for name in results)
+    for name, rate in results.items():
+        print(f"{name:<{width}}  {rate:>12,.0f} checks/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Admission - Load shedding for expensive work based on live load signals.
+"""
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+from core.config import get_settings
+from core.metrics import metrics
+from core.parser import Intent
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+CHEAP = "cheap"
+EXPENSIVE = "expensive"
+
+# Tools that drive the desktop, spawn processes or call an LLM
+EXPENSIVE_TOOLS = {"shell_tool", "ui_tool", "vision_tool", "media_tool", "app_tool"}
+# Intents that need one of those tools, or the LLM fallback (UNKNOWN)
+EXPENSIVE_INTENTS = {Intent.UNKNOWN, Intent.RUN_COMMAND, Intent.OPEN_APP, Intent.CLOSE_APP, Intent.SCREENSHOT}
+
+BUSY_MESSAGE = "⏳ I'm busy right now, please try again in a minute."
+BUSY_RETRY_AFTER = 30
+# How often queued cheap work re-checks the load signals
+QUEUE_POLL_INTERVAL = 0.05
+
+def intent_cost(intent: Intent) -> str:
+    """Cost class of a parsed intent."""
+    return EXPENSIVE if intent in EXPENSIVE_INTENTS else CHEAP
+
+def plan_cost(plan: Dict[str, Any]) -> str:
+    """Cost class of a plan: expensive if any step uses an expensive tool."""
+    steps = plan.get("steps", [])
+    return EXPENSIVE if any(step.get("tool") in EXPENSIVE_TOOLS for step in steps) else CHEAP
+
+class AdmissionController:
+    """
+    Tracks event-loop lag, pending executor jobs and in-flight LLM calls.
+    Expensive work is shed while any signal is over its limit. Cheap work waits in a
+    bounded queue until load clears, and is shed only if the queue is full or the wait times out.
+    """
+
+    def __init__(
+        self,
+        max_loop_lag_ms: float = 250,
+        max_executor_pending: int = 8,
+        max_inflight_llm: int = 4,
+        max_queued: int = 64,
+        queue_timeout_ms: float = 2000,
+        name: str = "admission",
+    ):
+        self.max_loop_lag_ms = max_loop_lag_ms
+        self.max_executor_pending = max_executor_pending
+        self.max_inflight_llm = max_inflight_llm
+        self.max_queued = max_queued
+        self.queue_timeout_ms = queue_timeout_ms
+        self.name = name
+        self.loop_lag_ms = 0.0
+        self.executor_pending = 0
+        self.llm_inflight = 0
+        self.queued = 0
+        self._lock = threading.Lock()
+        self._monitor: Optional[asyncio.Task] = None
+
+    async def _monitor_loop_lag(self, interval: float):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            lag_ms = max(0.0, (time.monotonic() - started - interval) * 1000)
+            # Smooth single hiccups, but let sustained lag through within a few samples
+            self.loop_lag_ms = 0.5 * self.loop_lag_ms + 0.5 * lag_ms
+            metrics.set_gauge(f"{self.name}_loop_lag_ms", round(self.loop_lag_ms, 1))
+            metrics.set_gauge(f"{self.name}_overloaded", int(self.overload_reason() is not None))
+
+    def start_lag_monitor(self, interval: float = 0.5):
+        """Start sampling lag on the running event loop. Safe to call more than once."""
+        if self._monitor is None or self._monitor.done():
+            self._monitor = asyncio.get_running_loop().create_task(self._monitor_loop_lag(interval))
+
+    def _adjust(self, attr: str, delta: int):
+        with self._lock:
+            value = getattr(self, attr) + delta
+            setattr(self, attr, value)
+        metrics.set_gauge(f"{self.name}_{attr}", value)
+
+    async def to_thread(self, fn: Callable, *args, **kwargs) -> Any:
+        """asyncio.to_thread that counts queued and running jobs."""
+        self._adjust("executor_pending", 1)
+        try:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        finally:
+            self._adjust("executor_pending", -1)
+
+    @contextmanager
+    def llm_call(self):
+        """Count an LLM request for as long as it is in flight."""
+        self._adjust("llm_inflight", 1)
+        try:
+            yield
+        finally:
+            self._adjust("llm_inflight", -1)
+
+    def overload_reason(self) -> Optional[str]:
+        """Name of the first signal over its limit, or None."""
+        if self.loop_lag_ms > self.max_loop_lag_ms:
+            return "loop_lag"
+        if self.executor_pending >= self.max_executor_pending:
+            return "executor"
+        if self.llm_inflight >= self.max_inflight_llm:
+            return "llm"
+        return None
+
+    def _shed(self, cost: str, reason: str) -> bool:
+        metrics.increment(f"{self.name}_shed_total")
+        metrics.increment(f"{self.name}_shed_{reason}_total")
+        logger.warning(f"[Admission] Shedding {cost} work: {reason}")
+        return False
+
+    def admit(self, cost: str) -> bool:
+        """Decide whether to start work of this cost now, without waiting. Cheap work always starts."""
+        reason = self.overload_reason() if cost == EXPENSIVE else None
+        if reason is None:
+            metrics.increment(f"{self.name}_admitted_total")
+            return True
+        return self._shed(cost, reason)
+
+    async def admit_async(self, cost: str) -> bool:
+        """
+        Like admit(), but cheap work arriving while overloaded is queued until the load
+        clears, for up to queue_timeout_ms. Expensive work is still shed immediately.
+        """
+        if cost == EXPENSIVE or self.overload_reason() is None:
+            return self.admit(cost)
+        with self._lock:
+            full = self.queued >= self.max_queued
+        if full:
+            return self._shed(cost, "queue_full")
+
+        self._adjust("queued", 1)
+        try:
+            deadline = time.monotonic() + self.queue_timeout_ms / 1000
+            while self.overload_reason() is not None:
+                if time.monotonic() >= deadline:
+                    return self._shed(cost, "queue_timeout")
+                await asyncio.sleep(QUEUE_POLL_INTERVAL)
+        finally:
+            self._adjust("queued", -1)
+        metrics.increment(f"{self.name}_admitted_total")
+        metrics.increment(f"{self.name}_admitted_after_queue_total")
+        return True
+
+    def state(self) -> Dict[str, Any]:
+        """Current signals and whether expensive work would be shed."""
+        return {
+            "loop_lag_ms": round(self.loop_lag_ms, 1),
+            "executor_pending": self.executor_pending,
+            "llm_inflight": self.llm_inflight,
+            "queued": self.queued,
+            "overloaded": self.overload_reason(),
+        }
+
+# Global admission controller, one per process
+admission = AdmissionController(
+    max_loop_lag_ms=settings.ADMISSION_MAX_LOOP_LAG_MS,
+    max_executor_pending=settings.ADMISSION_MAX_EXECUTOR_PENDING,
+    max_inflight_llm=settings.ADMISSION_MAX_INFLIGHT_LLM,
+    max_queued=settings.ADMISSION_MAX_QUEUED,
+    queue_timeout_ms=settings.ADMISSION_QUEUE_TIMEOUT_MS,
+)
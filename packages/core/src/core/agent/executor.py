@@ -10,6 +10,8 @@ from core.models import ApprovalRequest, ApprovalStatus
 from core.db import crud
 from core.safety import MAX_STEPS_PER_RUN, TOOL_TIMEOUT_SECONDS
 from core.logging_config import get_logger
+from core.metrics import metrics, METRIC_TOOL_DURATION
+from core.tracing import span
 
 logger = get_logger(__name__)
 
@@ -87,7 +89,9 @@ def execute_plan(plan: Dict[str, Any], user_id: int, db: Session) -> Dict[str, A
             continue
         
         try:
-            result = tool.execute(action, params, user_id, db)
+            with span(f"tool.{tool_name}", action=action), \
+                    metrics.time(METRIC_TOOL_DURATION, tool=tool_name, status="ok"):
+                result = tool.execute(action, params, user_id, db)
             results.append({"tool": tool_name, "action": action, "result": result})
         except Exception as e:
             logger.error(f"Tool error: {e}")
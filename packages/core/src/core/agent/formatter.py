@@ -1,9 +1,16 @@
 """
 Formatter - Formats agent response for user.
 """
-from typing import Dict, Any
+from typing import Dict, Any, List
 from core.parser import Intent, ParsedIntent
 
+def format_daily_brief(titles: List[str], total: int = None) -> str:
+    """Format the daily brief from the top open task titles and the open-task count."""
+    if not titles:
+        return "☀️ Good morning! You have no open tasks."
+    task_list = "\n".join([f"  - {title}" for title in titles])
+    return f"☀️ Daily Brief:\n\nOpen Tasks ({total if total is not None else len(titles)}):\n{task_list}"
+
 def format_reply(parsed: ParsedIntent, result: Dict[str, Any], verify: Dict[str, Any]) -> str:
     """Format the final reply based on intent, result, and verification."""
     
@@ -49,10 +56,7 @@ def format_reply(parsed: ParsedIntent, result: Dict[str, Any], verify: Dict[str,
     
     elif parsed.intent == Intent.DAILY_BRIEF:
         tasks = first_result.get("tasks", [])
-        if not tasks:
-            return "☀️ Good morning! You have no open tasks."
-        task_list = "\n".join([f"  - {t['title']}" for t in tasks])
-        return f"☀️ Daily Brief:\n\nOpen Tasks ({len(tasks)}):\n{task_list}"
+        return format_daily_brief([t["title"] for t in tasks], first_result.get("total"))
     
     elif parsed.intent == Intent.APPROVE:
         if first_result.get("success"):
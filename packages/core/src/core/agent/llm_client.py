@@ -3,6 +3,8 @@ LLM Client - OpenAI integration with structured output for computer use.
 """
 from openai import OpenAI
 from core.config import get_settings
+from core.admission import admission
+from core.tracing import span
 from core.agent.llm_schemas import LLMResponse, LLMIntent, ALLOWED_TOOLS, BLOCKED_PATTERNS
 import json
 import hashlib
@@ -89,19 +91,20 @@ def call_llm(text: str) -> Optional[LLMResponse]:
     try:
         client = OpenAI(api_key=settings.OPENAI_API_KEY)
         
-        response = client.chat.completions.create(
-            model=settings.OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": f"Parse this message: {text}"}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.1,
-            max_tokens=500
-        )
+        with span("llm.call", model=settings.OPENAI_MODEL), admission.llm_call():
+            response = client.chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Parse this message: {text}"}
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.1,
+                max_tokens=500
+            )
         
         content = response.choices[0].message.content
-        logger.info(f"[LLM] Raw response: {content}")
+        logger.info("[LLM] Raw response: %s", content)
         
         data = json.loads(content)
         llm_response = LLMResponse(**data)
@@ -36,23 +36,23 @@ def run_agent_loop(text: str, user_id: int, db: Session) -> Dict[str, Any]:
         parsed = classify_intent(text)
     
     intent_str = parsed.intent.value
-    logger.info(f"[Agent] Intent: {intent_str}, Params: {parsed.params}")
+    logger.info("[Agent] Intent: %s, Params: %s", intent_str, parsed.params)
     
     # 2. Make plan
     plan = make_plan(parsed)
-    logger.info(f"[Agent] Plan: {plan}")
+    logger.info("[Agent] Plan: %s", plan)
     
     # 3. Execute plan
     result = execute_plan(plan, user_id, db)
-    logger.info(f"[Agent] Result: {result}")
+    logger.info("[Agent] Result: %s", result)
     
     # 4. Verify result
     verify = verify_result(parsed, result)
-    logger.info(f"[Agent] Verify: {verify}")
+    logger.info("[Agent] Verify: %s", verify)
     
     # 5. Format reply
     response = format_reply(parsed, result, verify)
-    logger.info(f"[Agent] Response: {response}")
+    logger.info("[Agent] Response: %s", response)
     
     # 6. Persist run
     status = "completed" if verify.get("ok") else "failed"
@@ -1,14 +1,21 @@
 """
 Memory Service - Key-value preferences and reflection storage.
 """
+from sqlalchemy import cast, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Session
 from core.models import Memory
+from core.cache import TTLCache, invalidation_bus
+from core.brief_schedule import BRIEF_SCHEDULE_CHANNEL, SCHEDULE_KEYS
+from core.config import get_settings
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 import json
 import logging
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 # Default preferences
 DEFAULT_PREFERENCES = {
@@ -19,13 +26,17 @@ DEFAULT_PREFERENCES = {
     "due_date_display": True,
 }
 
-def get_preference(db: Session, user_id: int, key: str) -> Any:
-    """Get a single preference value."""
-    prefs = get_all_preferences(db, user_id)
-    return prefs.get(key, DEFAULT_PREFERENCES.get(key))
+# Merged preferences per user; written through by set_preferences
+PREFERENCES_CHANNEL = "preferences"
+_preference_cache = TTLCache(max_size=10000, ttl_seconds=settings.PREFERENCE_CACHE_TTL, name="preferences")
+invalidation_bus.subscribe(PREFERENCES_CHANNEL, lambda key: _preference_cache.delete(int(key)))
 
-def get_all_preferences(db: Session, user_id: int) -> Dict[str, Any]:
-    """Get all user preferences, merged with defaults."""
+def _load_preferences(db: Session, user_id: int) -> Dict[str, Any]:
+    """Get merged preferences from cache or DB. Callers must not mutate the result."""
+    prefs = _preference_cache.get(user_id)
+    if prefs is not None:
+        return prefs
+    
     mem = db.query(Memory).filter(
         Memory.user_id == user_id,
         Memory.key == "preferences"
@@ -34,29 +45,106 @@ def get_all_preferences(db: Session, user_id: int) -> Dict[str, Any]:
     prefs = dict(DEFAULT_PREFERENCES)
     if mem and mem.value_json:
         prefs.update(mem.value_json)
+    _preference_cache.set(user_id, prefs)
     return prefs
 
-def set_preference(db: Session, user_id: int, key: str, value: Any) -> Dict[str, Any]:
-    """Set a single preference value."""
-    prefs = get_all_preferences(db, user_id)
-    prefs[key] = value
-    
+def get_preference(db: Session, user_id: int, key: str) -> Any:
+    """Get a single preference value."""
+    return _load_preferences(db, user_id).get(key, DEFAULT_PREFERENCES.get(key))
+
+def get_all_preferences(db: Session, user_id: int) -> Dict[str, Any]:
+    """Get all user preferences, merged with defaults."""
+    return dict(_load_preferences(db, user_id))
+
+def invalidate_preferences(user_id: int):
+    """Drop cached preferences for a user in this and sibling processes."""
+    _preference_cache.delete(user_id)
+    invalidation_bus.publish(PREFERENCES_CHANNEL, user_id)
+
+def _merge_preferences(db: Session, user_id: int, values: Dict[str, Any]) -> Dict[str, Any]:
+    """Read-merge-write fallback for dialects without INSERT ... ON CONFLICT."""
     mem = db.query(Memory).filter(
         Memory.user_id == user_id,
         Memory.key == "preferences"
     ).first()
     
     if mem:
-        mem.value_json = prefs
+        stored = dict(mem.value_json or {})
+        stored.update(values)
+        mem.value_json = stored
         mem.updated_at = datetime.utcnow()
     else:
-        mem = Memory(user_id=user_id, key="preferences", value_json=prefs)
-        db.add(mem)
+        stored = dict(values)
+        db.add(Memory(user_id=user_id, key="preferences", value_json=stored))
+    
+    db.commit()
+    return stored
+
+def _upsert_preferences(db: Session, user_id: int, values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merge values into the stored preferences in one INSERT ... ON CONFLICT statement.
+    Returns the stored (non-default) preferences after the merge.
+    """
+    table = Memory.__table__
+    dialect = db.get_bind().dialect.name
+    
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table)
+        merged = cast(
+            cast(table.c.value_json, JSONB).op("||")(cast(stmt.excluded.value_json, JSONB)),
+            table.c.value_json.type,
+        )
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table)
+        merged = func.json_patch(table.c.value_json, stmt.excluded.value_json)
+    else:
+        return _merge_preferences(db, user_id, values)
     
+    stmt = stmt.values(user_id=user_id, key="preferences", value_json=values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.key],
+        set_={"value_json": merged, "updated_at": func.now()},
+    ).returning(table.c.value_json)
+    
+    stored = db.execute(stmt).scalar_one()
     db.commit()
-    logger.info(f"[Memory] Set preference {key}={value} for user {user_id}")
+    return stored if isinstance(stored, dict) else json.loads(stored)
+
+def set_preferences(db: Session, user_id: int, values: Dict[str, Any]) -> Dict[str, Any]:
+    """Set several preference values in a single statement."""
+    stored = _upsert_preferences(db, user_id, values)
+    
+    prefs = dict(DEFAULT_PREFERENCES)
+    prefs.update(stored)
+    
+    # Write through locally, then tell sibling processes to drop their copy
+    _preference_cache.set(user_id, dict(prefs))
+    invalidation_bus.publish(PREFERENCES_CHANNEL, user_id)
+    if SCHEDULE_KEYS & values.keys():
+        invalidation_bus.publish(BRIEF_SCHEDULE_CHANNEL, user_id)
+    
+    logger.info(f"[Memory] Set preferences {list(values)} for user {user_id}")
     return prefs
 
+def set_preference(db: Session, user_id: int, key: str, value: Any) -> Dict[str, Any]:
+    """Set a single preference value."""
+    return set_preferences(db, user_id, {key: value})
+
+def get_schedule_preferences(db: Session, user_ids: List[int] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    Explicitly set brief_time/timezone per user, read straight from the DB.
+    Users without stored values are absent; callers fall back to defaults.
+    """
+    query = db.query(Memory.user_id, Memory.value_json).filter(Memory.key == "preferences")
+    if user_ids is not None:
+        query = query.filter(Memory.user_id.in_(user_ids))
+    
+    stored = {}
+    for user_id, value in query.yield_per(1000):
+        if isinstance(value, dict):
+            stored[user_id] = {k: value[k] for k in SCHEDULE_KEYS if k in value}
+    return stored
+
 def add_reflection(db: Session, user_id: int, run_id: int, reflection: Dict[str, Any]):
     """
     Add a reflection after an agent run.
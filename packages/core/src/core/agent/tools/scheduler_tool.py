@@ -4,14 +4,17 @@ Scheduler Tool - Daily brief using Supabase.
 from typing import Dict, Any
 from core.db import crud
 
+BRIEF_TASK_LIMIT = 10  # brief_snapshots keeps this many
+
 def execute(action: str, params: Dict[str, Any], user_id: int, db) -> Dict[str, Any]:
     """Execute scheduler-related actions."""
     
     if action == "daily_brief":
-        tasks = crud.get_tasks_by_user(user_id, "open")
+        snapshot = crud.get_brief_snapshot(user_id)
         return {
             "success": True,
-            "tasks": [{"id": t["id"], "title": t["title"]} for t in tasks[:10]]
+            "tasks": snapshot["top_tasks"][:BRIEF_TASK_LIMIT],
+            "total": snapshot["open_count"],
         }
     
     else:
@@ -7,6 +7,7 @@ import os
 from typing import Dict, Any
 from sqlalchemy.orm import Session
 from core.logging_config import get_logger
+from core.tracing import span, inject_env
 
 logger = get_logger(__name__)
 
@@ -59,14 +60,16 @@ def execute(action: str, params: Dict[str, Any], user_id: int, db: Session) -> D
         logger.info(f"Executing shell command: {command}")
         
         try:
-            result = subprocess.run(
-                command,
-                shell=True,
-                cwd=cwd,
-                capture_output=True,
-                text=True,
-                timeout=TIMEOUT_SECONDS
-            )
+            with span("subprocess", command=command.split()[0] if command.split() else ""):
+                result = subprocess.run(
+                    command,
+                    shell=True,
+                    cwd=cwd,
+                    env=inject_env(),  # Child sees AGENT_TRACE_ID / AGENT_PARENT_SPAN_ID
+                    capture_output=True,
+                    text=True,
+                    timeout=TIMEOUT_SECONDS
+                )
             
             stdout = result.stdout[:MAX_OUTPUT_LENGTH] if result.stdout else ""
             stderr = result.stderr[:MAX_OUTPUT_LENGTH] if result.stderr else ""
@@ -17,7 +17,7 @@ def execute(action: str, params: Dict[str, Any], user_id: int, db) -> Dict[str,
     
     elif action == "list":
         status = params.get("status", "open")
-        tasks = crud.get_tasks_by_user(user_id, status)
+        tasks = crud.get_tasks_by_user(user_id, status, columns="id,title,status")
         return {
             "success": True,
             "tasks": [{"id": t["id"], "title": t["title"], "status": t["status"]} for t in tasks]
@@ -7,6 +7,7 @@ import base64
 from typing import Dict, Any, Optional
 from groq import Groq
 from core.config import get_settings
+from core.admission import admission
 from core.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -43,6 +44,7 @@ def get_latest_screenshot() -> Optional[str]:
     files.sort(key=lambda x: x[1], reverse=True)
     return files[0][0]
 
+@admission.llm_call()
 def analyze_screen(image_path: str, question: str) -> Dict[str, Any]:
     """
     Analyze a screenshot and answer a question about it.
@@ -0,0 +1,115 @@
+"""
+Brief Schedule - Index of users bucketed by the UTC minute their daily brief is due.
+"""
+from datetime import date, datetime, time as dt_time
+from typing import Dict, Iterable, Optional, Set, Tuple
+import logging
+import threading
+import pytz
+
+logger = logging.getLogger(__name__)
+
+# Invalidation channel: brief_time or timezone changed for a user
+BRIEF_SCHEDULE_CHANNEL = "brief_schedule"
+SCHEDULE_KEYS = {"brief_time", "timezone"}
+
+DEFAULT_BRIEF_TIME = "07:30"
+DEFAULT_TIMEZONE = "Asia/Makassar"
+MINUTES_PER_DAY = 24 * 60
+
+def utc_minute(timezone: str, brief_time: str, on: date = None) -> int:
+    """
+    Minute of the UTC day (0-1439) at which brief_time local time falls on the given date.
+    Invalid timezones or times fall back to the defaults.
+    """
+    try:
+        tz = pytz.timezone(timezone or DEFAULT_TIMEZONE)
+    except pytz.UnknownTimeZoneError:
+        logger.warning(f"[Brief] Unknown timezone {timezone}, using {DEFAULT_TIMEZONE}")
+        tz = pytz.timezone(DEFAULT_TIMEZONE)
+
+    try:
+        hour, minute = (int(part) for part in (brief_time or DEFAULT_BRIEF_TIME).split(":"))
+        local_time = dt_time(hour, minute)
+    except ValueError:
+        logger.warning(f"[Brief] Invalid brief_time {brief_time}, using {DEFAULT_BRIEF_TIME}")
+        local_time = dt_time(7, 30)
+
+    on = on or datetime.now(tz).date()
+    local = tz.localize(datetime.combine(on, local_time))
+    utc = local.astimezone(pytz.utc)
+    return utc.hour * 60 + utc.minute
+
+class BriefSchedule:
+    """
+    Buckets user IDs by due UTC minute of the day.
+    Minutes depend on DST, so rebuild once a day; single users are moved
+    with set_user when their preferences change.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[int, Set[int]] = {}
+        self._user_minute: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def set_user(self, user_id: int, timezone: str, brief_time: str, on: date = None) -> int:
+        """Place a user in the bucket for their brief time. Returns the UTC minute."""
+        minute = utc_minute(timezone, brief_time, on)
+        with self._lock:
+            self._remove(user_id)
+            self._buckets.setdefault(minute, set()).add(user_id)
+            self._user_minute[user_id] = minute
+        return minute
+
+    def load(self, entries: Iterable[Tuple[int, str, str]], on: date = None) -> int:
+        """Replace the whole index from (user_id, timezone, brief_time) entries."""
+        buckets: Dict[int, Set[int]] = {}
+        user_minute: Dict[int, int] = {}
+        for user_id, timezone, brief_time in entries:
+            minute = utc_minute(timezone, brief_time, on)
+            buckets.setdefault(minute, set()).add(user_id)
+            user_minute[user_id] = minute
+        with self._lock:
+            self._buckets = buckets
+            self._user_minute = user_minute
+        return len(user_minute)
+
+    def remove_user(self, user_id: int):
+        """Drop a user from the schedule."""
+        with self._lock:
+            self._remove(user_id)
+
+    def _remove(self, user_id: int):
+        minute = self._user_minute.pop(user_id, None)
+        if minute is None:
+            return
+        bucket = self._buckets.get(minute)
+        if bucket is not None:
+            bucket.discard(user_id)
+            if not bucket:
+                del self._buckets[minute]
+
+    def due(self, minute: int) -> Set[int]:
+        """User IDs whose brief is due at this UTC minute of the day."""
+        with self._lock:
+            return set(self._buckets.get(minute, ()))
+
+    def minute_of(self, user_id: int) -> Optional[int]:
+        """Scheduled UTC minute for a user, if any."""
+        return self._user_minute.get(user_id)
+
+    def next_due_minute(self, after_minute: int) -> Optional[int]:
+        """First non-empty minute strictly after after_minute, wrapping past midnight."""
+        with self._lock:
+            if not self._buckets:
+                return None
+            later = [m for m in self._buckets if m > after_minute]
+            return min(later) if later else min(self._buckets)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._user_minute.clear()
+
+    def __len__(self) -> int:
+        return len(self._user_minute)
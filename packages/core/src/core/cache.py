@@ -0,0 +1,198 @@
+"""
+Cache - In-process TTL caches with cross-process invalidation.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from core.config import get_settings
+from core.metrics import metrics
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+_MISSING = object()
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a fixed TTL."""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 300, name: str = "cache"):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _live(self, key: Hashable) -> Any:
+        """Value for key if present and unexpired, else _MISSING. Caller holds the lock."""
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return _MISSING
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or default if missing or expired."""
+        with self._lock:
+            value = self._live(key)
+            if value is _MISSING:
+                self.misses += 1
+                metrics.increment(f"cache_{self.name}_misses")
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            metrics.increment(f"cache_{self.name}_hits")
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value without counting a hit or refreshing recency."""
+        with self._lock:
+            value = self._live(key)
+            return default if value is _MISSING else value
+
+    def update(self, key: Hashable, fn: Callable[[Any], Any]) -> bool:
+        """
+        Atomically replace a cached value with fn(value), keeping its expiry.
+        fn returning None drops the key. Returns False if the key was not cached.
+        """
+        with self._lock:
+            value = self._live(key)
+            if value is _MISSING:
+                return False
+            new_value = fn(value)
+            if new_value is None:
+                del self._data[key]
+            else:
+                self._data[key] = (self._data[key][0], new_value)
+            return True
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: float = None):
+        """Store a value, evicting the least recently used entry when full."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                metrics.increment(f"cache_{self.name}_evictions")
+
+    def delete(self, key: Hashable) -> bool:
+        """Drop a key. Returns True if it was cached."""
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get size and hit/miss counts."""
+        with self._lock:
+            return {"name": self.name, "size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+class InvalidationBus:
+    """
+    Broadcasts cache invalidations to sibling processes (bot, API workers).
+    Messages go over UDP multicast on loopback, so every process on the host
+    that called start() receives them. Delivery is best-effort; cache TTLs
+    bound staleness if a datagram is lost.
+    """
+
+    def __init__(self, group: str = "239.255.42.99", port: int = 0):
+        self.group = group
+        self.port = port
+        self._origin = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._subscribers: Dict[str, List[Callable[[str], None]]] = {}
+        self._send_sock: Optional[socket.socket] = None
+        self._listener: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        """Register a callback for invalidations published by other processes."""
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+    def publish(self, channel: str, key: Any):
+        """
+        Notify other processes that a key changed.
+        The publishing process is expected to have updated its own cache already.
+        """
+        if not self.port:
+            return
+
+        payload = json.dumps({"o": self._origin, "c": channel, "k": str(key)}).encode()
+        try:
+            with self._lock:
+                if self._send_sock is None:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+                    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 0)
+                    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+                    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton("127.0.0.1"))
+                    sock.setblocking(False)
+                    self._send_sock = sock
+                self._send_sock.sendto(payload, (self.group, self.port))
+        except OSError as e:
+            logger.warning(f"[Cache] Failed to publish invalidation {channel}:{key}: {e}")
+
+    def start(self) -> bool:
+        """Start the background listener. Safe to call more than once."""
+        if not self.port or self._listener is not None:
+            return self._listener is not None
+
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, "SO_REUSEPORT"):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(("", self.port))
+            membership = struct.pack("4s4s", socket.inet_aton(self.group), socket.inet_aton("127.0.0.1"))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        except OSError as e:
+            logger.warning(f"[Cache] Invalidation listener disabled: {e}")
+            return False
+
+        self._listener = threading.Thread(target=self._listen, args=(sock,), name="cache-invalidation", daemon=True)
+        self._listener.start()
+        logger.info(f"[Cache] Listening for invalidations on {self.group}:{self.port}")
+        return True
+
+    def _listen(self, sock: socket.socket):
+        while True:
+            try:
+                data, _ = sock.recvfrom(4096)
+                message = json.loads(data)
+            except (OSError, ValueError) as e:
+                logger.debug(f"[Cache] Dropped invalidation datagram: {e}")
+                continue
+
+            if message.get("o") == self._origin:
+                continue
+            self._dispatch(message.get("c", ""), message.get("k", ""))
+
+    def _dispatch(self, channel: str, key: str):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, []))
+        for callback in callbacks:
+            try:
+                callback(key)
+            except Exception as e:
+                logger.error(f"[Cache] Invalidation handler for {channel} failed: {e}")
+
+# Global invalidation bus, started by the bot and API processes
+invalidation_bus = InvalidationBus(port=settings.CACHE_INVALIDATION_PORT)
@@ -19,10 +19,71 @@ class Settings(BaseSettings):
     TELEGRAM_CHAT_ID: str = ""
     SUPABASE_URL: str = ""
     SUPABASE_KEY: str = ""
+    SUPABASE_POOL_SIZE: int = 20
+    SUPABASE_TIMEOUT: int = 30
+    DATABASE_URL: str = "sqlite:///./agent.db"
     TIMEZONE: str = "Asia/Makassar"
     # Groq (free, fast)
     GROQ_API_KEY: str = ""
     GROQ_MODEL: str = "llama-3.1-70b-versatile"
+    # Caching (0 disables cross-process invalidation)
+    PREFERENCE_CACHE_TTL: int = 300
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: int = 600
+    TASK_CACHE_SIZE: int = 5000
+    TASK_CACHE_TTL: int = 300
+    TASK_CACHE_MAX_TASKS: int = 200
+    # Daily brief
+    BRIEF_PAGE_SIZE: int = 500
+    # Full schedule rebuild; also picks up users created by other processes and DST changes
+    BRIEF_SCHEDULE_RESYNC_SECONDS: int = 900
+    # Telegram allows ~30 msg/s overall and ~1 msg/s per chat
+    BRIEF_SEND_CONCURRENCY: int = 20
+    BRIEF_SEND_RATE: float = 30.0
+    BRIEF_PER_CHAT_INTERVAL: float = 1.0
+    BRIEF_SEND_MAX_RETRIES: int = 3
+    # Replicas split briefs by shard lease (1 shard = single leader; 0 max = no cap)
+    BRIEF_SHARDS: int = 1
+    BRIEF_MAX_SHARDS_PER_REPLICA: int = 0
+    LEADER_LEASE_TTL: int = 30
+    # Message log buffering (drop_oldest or drop_newest when full)
+    MESSAGE_LOG_BATCH_SIZE: int = 50
+    MESSAGE_LOG_FLUSH_MS: int = 500
+    MESSAGE_LOG_MAX_PENDING: int = 5000
+    MESSAGE_LOG_BLOCK_MS: int = 0
+    MESSAGE_LOG_DROP_POLICY: str = "drop_oldest"
+    CACHE_INVALIDATION_PORT: int = 47231
+    # Rate limiting: "memory" (per process) or "sqlite" (shared by all workers on the host)
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_SQLITE_PATH: str = "/tmp/agent_rate_limits.db"
+    # Admission control: expensive work is shed while any signal is over its limit,
+    # cheap work waits (up to ADMISSION_MAX_QUEUED requests, ADMISSION_QUEUE_TIMEOUT_MS each)
+    ADMISSION_MAX_LOOP_LAG_MS: int = 250
+    ADMISSION_MAX_EXECUTOR_PENDING: int = 8
+    ADMISSION_MAX_INFLIGHT_LLM: int = 4
+    ADMISSION_MAX_QUEUED: int = 64
+    ADMISSION_QUEUE_TIMEOUT_MS: int = 2000
+    # Logging pipeline: records are queued and written in batches by a listener thread
+    LOG_QUEUE_MAX: int = 10000
+    LOG_BATCH_SIZE: int = 200
+    LOG_BLOCK_MS: int = 0
+    LOG_DROP_POLICY: str = "drop_oldest"
+    LOG_FILE: str = ""  # Empty = stderr only
+    LOG_FILE_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_FILE_BACKUPS: int = 5
+    # Hot-path log control: "logger=rate,..." keeps that fraction of INFO/DEBUG records
+    LOG_SAMPLE_RATES: str = ""
+    LOG_MAX_FIELD_CHARS: int = 2000
+    LOG_MAX_MESSAGE_CHARS: int = 8000
+    # Finished trace spans are appended here as JSONL (empty = not exported)
+    TRACE_EXPORT_PATH: str = ""
+    # Event-loop stalls longer than this are recorded with the blocking stack
+    LOOP_STALL_THRESHOLD_MS: int = 100
+    # Shared metrics for multi-worker API processes (empty = per-process metrics)
+    METRICS_MULTIPROC_DIR: str = ""
+    # Bot Prometheus endpoint (0 disables); bound to localhost for the local monitoring stack
+    BOT_METRICS_PORT: int = 9465
+    BOT_METRICS_HOST: str = "127.0.0.1"
 
     class Config:
         env_file = find_env_file()
@@ -0,0 +1,280 @@
+"""
+Async CRUD Operations - Supabase REST API on a pooled async HTTP/2 client.
+Mirrors core.db.crud for use on the event loop; caches and the message-log
+buffer are shared with the sync module.
+"""
+from typing import Optional, Dict, Any, List
+from core.supabase_client import get_async_supabase
+from core.db import crud
+from core.db.crud import Cursor, apply_keyset, with_keyset_columns
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ========== USERS ==========
+async def get_or_create_user(telegram_user_id: str, name: str = None) -> Dict[str, Any]:
+    """Get existing user or create new one."""
+    user = crud._user_cache.get(telegram_user_id)
+    if user is not None:
+        return user
+    
+    supabase = await get_async_supabase()
+    
+    # Try to find existing user
+    result = await supabase.table("users").select("*").eq("telegram_user_id", telegram_user_id).execute()
+    
+    if not result.data:
+        # Create new user; a concurrent first message may win the insert
+        new_user = {
+            "telegram_user_id": telegram_user_id,
+            "name": name or f"User_{telegram_user_id[-4:]}",
+            "timezone": "Asia/Makassar",
+        }
+        result = await supabase.table("users").upsert(
+            new_user, on_conflict="telegram_user_id", ignore_duplicates=True
+        ).execute()
+        if result.data:
+            logger.info(f"Created new user: {telegram_user_id}")
+            crud.user_created(result.data[0])
+        else:
+            result = await supabase.table("users").select("*").eq("telegram_user_id", telegram_user_id).execute()
+    
+    user = result.data[0]
+    crud._user_cache.set(telegram_user_id, user)
+    return user
+
+async def get_user_by_telegram_id(telegram_user_id: str) -> Optional[Dict[str, Any]]:
+    """Get user by Telegram ID."""
+    user = crud._user_cache.get(telegram_user_id)
+    if user is not None:
+        return user
+    
+    supabase = await get_async_supabase()
+    result = await supabase.table("users").select("*").eq("telegram_user_id", telegram_user_id).execute()
+    if not result.data:
+        return None
+    crud._user_cache.set(telegram_user_id, result.data[0])
+    return result.data[0]
+
+async def get_users_page(after_id: int = 0, page_size: int = 1000, columns: str = "id,timezone") -> List[Dict[str, Any]]:
+    """One page of users ordered by id, for full scans such as building the brief schedule."""
+    supabase = await get_async_supabase()
+    result = await supabase.table("users").select(columns).gt("id", after_id).order("id").limit(page_size).execute()
+    return result.data or []
+
+# ========== TASKS ==========
+async def create_task(user_id: int, title: str, description: str = None) -> Dict[str, Any]:
+    """Create a new task."""
+    supabase = await get_async_supabase()
+    new_task = {
+        "user_id": user_id,
+        "title": title,
+        "description": description or "",
+        "status": "open",
+    }
+    result = await supabase.table("tasks").insert(new_task).execute()
+    crud.task_created(result.data[0])
+    return result.data[0]
+
+async def get_tasks_by_user(
+    user_id: int,
+    status: str = None,
+    columns: str = "*",
+    limit: int = None,
+    after: Cursor = None,
+) -> List[Dict[str, Any]]:
+    """Get tasks for a user, newest first. See crud.get_tasks_by_user."""
+    supabase = await get_async_supabase()
+    if status == "open":
+        tasks = crud._open_task_cache.get(user_id)
+        if tasks is None:
+            generation = crud.open_tasks_generation(user_id)
+            result = await crud.open_tasks_query(supabase, user_id).execute()
+            tasks = crud.store_open_tasks(user_id, result.data, generation)
+        if tasks is not crud._TOO_MANY_TASKS:
+            return crud.page_cached_tasks(tasks, columns, limit, after)
+    
+    query = supabase.table("tasks").select(with_keyset_columns(columns)).eq("user_id", user_id)
+    if status:
+        query = query.eq("status", status)
+    result = await apply_keyset(query, limit, after).execute()
+    return result.data
+
+async def count_tasks_by_user(user_id: int, status: str = None) -> int:
+    """Count tasks for a user without fetching rows."""
+    if status == "open":
+        tasks = crud._open_task_cache.get(user_id)
+        if tasks is not None and tasks is not crud._TOO_MANY_TASKS:
+            return len(tasks)
+    
+    supabase = await get_async_supabase()
+    query = supabase.table("tasks").select("id", count="exact", head=True).eq("user_id", user_id)
+    if status:
+        query = query.eq("status", status)
+    return (await query.execute()).count or 0
+
+async def close_task(task_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+    """Mark task as done."""
+    supabase = await get_async_supabase()
+    result = await supabase.table("tasks").update({"status": "done"}).eq("id", task_id).eq("user_id", user_id).execute()
+    if not result.data:
+        return None
+    crud.task_removed(user_id, task_id)
+    return result.data[0]
+
+async def delete_task(task_id: int, user_id: int) -> bool:
+    """Delete a task."""
+    supabase = await get_async_supabase()
+    result = await supabase.table("tasks").delete().eq("id", task_id).eq("user_id", user_id).execute()
+    if not result.data:
+        return False
+    crud.task_removed(user_id, task_id)
+    return True
+
+# ========== MESSAGES ==========
+async def log_message(user_id: int, text: str, source: str = "telegram") -> Dict[str, Any]:
+    """Log a message (buffered; never waits on the network)."""
+    return crud.log_message(user_id, text, source)
+
+# ========== APPROVAL REQUESTS ==========
+async def create_approval_request(user_id: int, action_type: str, payload: Dict) -> Dict[str, Any]:
+    """Create a pending approval request."""
+    supabase = await get_async_supabase()
+    new_request = {
+        "user_id": user_id,
+        "action_type": action_type,
+        "action_payload_json": payload,
+        "status": "pending",
+    }
+    result = await supabase.table("approval_requests").insert(new_request).execute()
+    return result.data[0]
+
+async def get_approval_request(approval_id: int) -> Optional[Dict[str, Any]]:
+    """Get approval request by ID."""
+    supabase = await get_async_supabase()
+    result = await supabase.table("approval_requests").select("*").eq("id", approval_id).execute()
+    return result.data[0] if result.data else None
+
+async def update_approval_status(approval_id: int, status: str) -> bool:
+    """Update approval request status."""
+    supabase = await get_async_supabase()
+    result = await supabase.table("approval_requests").update({"status": status}).eq("id", approval_id).execute()
+    return len(result.data) > 0
+
+# ========== MEMORY ==========
+async def get_user_preferences(user_id: int) -> Dict[str, Any]:
+    """Get user preferences from memory."""
+    prefs = crud._user_preference_cache.get(user_id)
+    if prefs is not None:
+        return dict(prefs)
+    
+    supabase = await get_async_supabase()
+    result = await supabase.table("memory").select("key,value").eq("user_id", user_id).eq("memory_type", "preference").execute()
+    
+    prefs = {}
+    for row in result.data:
+        prefs[row.get("key", "")] = row.get("value", "")
+    crud._user_preference_cache.set(user_id, prefs)
+    return dict(prefs)
+
+async def set_user_preference(user_id: int, key: str, value: str) -> bool:
+    """Set a user preference."""
+    return await set_user_preferences(user_id, {key: value})
+
+async def set_user_preferences(user_id: int, values: Dict[str, str]) -> bool:
+    """Set several user preferences in one upsert on (user_id, key)."""
+    if not values:
+        return True
+    
+    supabase = await get_async_supabase()
+    rows = [
+        {"user_id": user_id, "memory_type": "preference", "key": key, "value": value}
+        for key, value in values.items()
+    ]
+    await supabase.table("memory").upsert(rows, on_conflict="user_id,key").execute()
+    
+    prefs = crud._user_preference_cache.get(user_id)
+    if prefs is not None:
+        crud._user_preference_cache.set(user_id, {**prefs, **values})
+    crud.invalidation_bus.publish(crud.USER_PREFERENCES_CHANNEL, user_id)
+    return True
+
+# ========== DAILY BRIEF ==========
+# brief_snapshots rows are kept current by a trigger on tasks (see supabase_schema.sql)
+async def get_brief_snapshot(user_id: int) -> Dict[str, Any]:
+    """Open-task count and newest open tasks ({id, title}, up to 10) for one user."""
+    supabase = await get_async_supabase()
+    result = await supabase.table("brief_snapshots").select("open_count,top_tasks").eq("user_id", user_id).execute()
+    if not result.data:
+        return {"open_count": 0, "top_tasks": []}
+    return result.data[0]
+
+async def get_daily_brief_page(
+    after_id: int = 0,
+    page_size: int = 500,
+    top_n: int = 5,
+    user_ids: List[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    One page of users (ordered by id) with open_count and top_titles,
+    fetched in a single daily_brief_page RPC. user_ids restricts the page to those users.
+    """
+    supabase = await get_async_supabase()
+    params = {"after_id": after_id, "page_size": page_size, "top_n": top_n}
+    if user_ids is not None:
+        params["user_ids"] = sorted(user_ids)
+    result = await supabase.rpc("daily_brief_page", params).execute()
+    return result.data or []
+
+async def iter_daily_brief_pages(page_size: int = 500, top_n: int = 5, user_ids: List[int] = None):
+    """Stream brief data for every user (or just user_ids) page by page."""
+    after_id = 0
+    while True:
+        page = await get_daily_brief_page(after_id, page_size, top_n, user_ids)
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        after_id = page[-1]["id"]
+
+# ========== PROPOSALS ==========
+async def create_proposal(user_id: int, proposal: Dict) -> Dict[str, Any]:
+    """Create an improvement proposal."""
+    supabase = await get_async_supabase()
+    new_proposal = {
+        "user_id": user_id,
+        "proposal_json": proposal,
+        "status": "pending",
+    }
+    result = await supabase.table("improvement_proposals").insert(new_proposal).execute()
+    return result.data[0]
+
+async def get_proposals_by_user(
+    user_id: int,
+    status: str = None,
+    columns: str = "*",
+    limit: int = None,
+    after: Cursor = None,
+) -> List[Dict[str, Any]]:
+    """Get proposals for a user, newest first. See crud.get_proposals_by_user."""
+    supabase = await get_async_supabase()
+    query = supabase.table("improvement_proposals").select(with_keyset_columns(columns)).eq("user_id", user_id)
+    if status:
+        query = query.eq("status", status)
+    result = await apply_keyset(query, limit, after).execute()
+    return result.data
+
+async def count_proposals_by_user(user_id: int, status: str = None) -> int:
+    """Count proposals for a user without fetching rows."""
+    supabase = await get_async_supabase()
+    query = supabase.table("improvement_proposals").select("id", count="exact", head=True).eq("user_id", user_id)
+    if status:
+        query = query.eq("status", status)
+    return (await query.execute()).count or 0
+
+async def update_proposal_status(proposal_id: int, status: str) -> bool:
+    """Update proposal status."""
+    supabase = await get_async_supabase()
+    result = await supabase.table("improvement_proposals").update({"status": status}).eq("id", proposal_id).execute()
+    return len(result.data) > 0
@@ -2,40 +2,219 @@
 CRUD Operations - Using Supabase REST API.
 """
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Callable, Optional, Dict, Any, List, Tuple
 from core.supabase_client import get_supabase
+from core.cache import TTLCache, invalidation_bus
+from core.db.message_buffer import MessageLogBuffer
+from core.config import get_settings
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# ========== PAGINATION ==========
+# Keyset cursor: (created_at, id) of the last row of the previous page
+Cursor = Tuple[str, int]
+
+def with_keyset_columns(columns: str) -> str:
+    """Make sure the keyset columns are selected so the caller can build the next cursor."""
+    if columns == "*":
+        return columns
+    names = [c.strip() for c in columns.split(",")]
+    for key in ("id", "created_at"):
+        if key not in names:
+            names.append(key)
+    return ",".join(names)
+
+def apply_keyset(query, limit: int = None, after: Cursor = None):
+    """Order newest first by (created_at, id) and apply the cursor and LIMIT server-side."""
+    if after:
+        created_at, row_id = after
+        query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{int(row_id)})')
+    query = query.order("created_at", desc=True).order("id", desc=True)
+    if limit:
+        query = query.limit(limit)
+    return query
+
+def next_cursor(rows: List[Dict[str, Any]], limit: int = None) -> Optional[Cursor]:
+    """Cursor for the page after rows, or None if this was the last page."""
+    if not rows or not limit or len(rows) < limit:
+        return None
+    return (rows[-1]["created_at"], rows[-1]["id"])
 
 # ========== USERS ==========
+# telegram_user_id -> user row; rows are immutable apart from name/timezone
+_user_cache = TTLCache(max_size=settings.USER_CACHE_SIZE, ttl_seconds=settings.USER_CACHE_TTL, name="users")
+_user_created_callbacks: List[Callable[[Dict[str, Any]], None]] = []
+
+def on_user_created(callback: Callable[[Dict[str, Any]], None]):
+    """Register a callback for users created by this process, e.g. to schedule their brief."""
+    _user_created_callbacks.append(callback)
+
+def user_created(user: Dict[str, Any]):
+    """Notify callbacks of a newly inserted user row."""
+    for callback in _user_created_callbacks:
+        try:
+            callback(user)
+        except Exception as e:
+            logger.error(f"User created callback failed for {user.get('id')}: {e}")
+
+def cache_users(users: List[Dict[str, Any]]) -> int:
+    """Prime the user cache with rows already fetched elsewhere."""
+    count = 0
+    for user in users:
+        telegram_user_id = user.get("telegram_user_id")
+        if telegram_user_id:
+            _user_cache.set(str(telegram_user_id), user)
+            count += 1
+    return count
+
+def warm_user_cache(telegram_user_ids: List[str] = None, limit: int = None) -> int:
+    """
+    Load users into the cache in bulk.
+    Loads the given IDs, or the most recently created users if none are given.
+    """
+    supabase = get_supabase()
+    count = 0
+    if telegram_user_ids is None:
+        limit = limit or settings.USER_CACHE_SIZE
+        result = supabase.table("users").select("*").order("created_at", desc=True).limit(limit).execute()
+        count = cache_users(result.data)
+    else:
+        ids = [str(i) for i in telegram_user_ids]
+        for start in range(0, len(ids), 100):  # Keep the IN list well under URL limits
+            result = supabase.table("users").select("*").in_("telegram_user_id", ids[start:start + 100]).execute()
+            count += cache_users(result.data)
+    logger.info(f"Warmed user cache with {count} users")
+    return count
+
 def get_or_create_user(telegram_user_id: str, name: str = None) -> Dict[str, Any]:
     """Get existing user or create new one."""
+    user = _user_cache.get(telegram_user_id)
+    if user is not None:
+        return user
+    
     supabase = get_supabase()
     
     # Try to find existing user
     result = supabase.table("users").select("*").eq("telegram_user_id", telegram_user_id).execute()
     
-    if result.data:
-        return result.data[0]
+    if not result.data:
+        # Create new user; a concurrent first message may win the insert
+        new_user = {
+            "telegram_user_id": telegram_user_id,
+            "name": name or f"User_{telegram_user_id[-4:]}",
+            "timezone": "Asia/Makassar",
+        }
+        result = supabase.table("users").upsert(
+            new_user, on_conflict="telegram_user_id", ignore_duplicates=True
+        ).execute()
+        if result.data:
+            logger.info(f"Created new user: {telegram_user_id}")
+            user_created(result.data[0])
+        else:
+            result = supabase.table("users").select("*").eq("telegram_user_id", telegram_user_id).execute()
     
-    # Create new user
-    new_user = {
-        "telegram_user_id": telegram_user_id,
-        "name": name or f"User_{telegram_user_id[-4:]}",
-        "timezone": "Asia/Makassar",
-    }
-    result = supabase.table("users").insert(new_user).execute()
-    logger.info(f"Created new user: {telegram_user_id}")
-    return result.data[0]
+    user = result.data[0]
+    _user_cache.set(telegram_user_id, user)
+    return user
 
 def get_user_by_telegram_id(telegram_user_id: str) -> Optional[Dict[str, Any]]:
     """Get user by Telegram ID."""
+    user = _user_cache.get(telegram_user_id)
+    if user is not None:
+        return user
+    
     supabase = get_supabase()
     result = supabase.table("users").select("*").eq("telegram_user_id", telegram_user_id).execute()
-    return result.data[0] if result.data else None
+    if not result.data:
+        return None
+    _user_cache.set(telegram_user_id, result.data[0])
+    return result.data[0]
+
+def get_users_page(after_id: int = 0, page_size: int = 1000, columns: str = "id,timezone") -> List[Dict[str, Any]]:
+    """One page of users ordered by id, for full scans such as building the brief schedule."""
+    supabase = get_supabase()
+    result = supabase.table("users").select(columns).gt("id", after_id).order("id").limit(page_size).execute()
+    return result.data or []
 
 # ========== TASKS ==========
+# user_id -> open tasks (full rows, newest first), or _TOO_MANY_TASKS when over the cap.
+# Filled on first read and updated in place by create/close/delete.
+OPEN_TASKS_CHANNEL = "open_tasks"
+_TOO_MANY_TASKS = object()  # Sentinel, compared by identity
+_open_task_cache = TTLCache(max_size=settings.TASK_CACHE_SIZE, ttl_seconds=settings.TASK_CACHE_TTL, name="open_tasks")
+# Bumped on every change to a user's open tasks (striped by user_id), so a fill whose
+# query raced with a change is not stored; the next read loads it again.
+_task_generations = [0] * 256
+_task_fill_lock = threading.Lock()
+
+def open_tasks_generation(user_id: int) -> int:
+    """Read before the fill query and pass to store_open_tasks."""
+    return _task_generations[int(user_id) % len(_task_generations)]
+
+def _open_tasks_changed(user_id: int, fn: Callable[[Any], Any] = None):
+    """Invalidate in-flight fills, then update (or with no fn, drop) the cached list."""
+    user_id = int(user_id)
+    with _task_fill_lock:
+        _task_generations[user_id % len(_task_generations)] += 1
+        if fn is None:
+            _open_task_cache.delete(user_id)
+        else:
+            _open_task_cache.update(user_id, fn)
+
+invalidation_bus.subscribe(OPEN_TASKS_CHANNEL, _open_tasks_changed)
+
+def open_tasks_query(supabase, user_id: int):
+    """Query that fills the open-task cache (one row past the cap to detect overflow)."""
+    query = supabase.table("tasks").select("*").eq("user_id", user_id).eq("status", "open")
+    return apply_keyset(query, settings.TASK_CACHE_MAX_TASKS + 1)
+
+def store_open_tasks(user_id: int, rows: List[Dict[str, Any]], generation: int):
+    """
+    Cache a user's open tasks, unless they changed since `generation` was read,
+    and return the list (or _TOO_MANY_TASKS) either way.
+    """
+    tasks = rows if len(rows) <= settings.TASK_CACHE_MAX_TASKS else _TOO_MANY_TASKS
+    with _task_fill_lock:
+        if open_tasks_generation(user_id) == generation:
+            _open_task_cache.set(user_id, tasks)
+    return tasks
+
+def page_cached_tasks(tasks: List[Dict[str, Any]], columns: str = "*", limit: int = None, after: Cursor = None) -> List[Dict[str, Any]]:
+    """Apply cursor, limit and projection to a cached task list."""
+    if after:
+        after = (after[0], int(after[1]))
+        tasks = [t for t in tasks if (t["created_at"], t["id"]) < after]
+    if limit:
+        tasks = tasks[:limit]
+    if columns == "*":
+        return [dict(t) for t in tasks]
+    names = with_keyset_columns(columns).split(",")
+    return [{n: t.get(n) for n in names} for t in tasks]
+
+def task_created(task: Dict[str, Any]):
+    """Add a new open task to its owner's cached list."""
+    def add(tasks):
+        if tasks is _TOO_MANY_TASKS or len(tasks) >= settings.TASK_CACHE_MAX_TASKS:
+            return _TOO_MANY_TASKS
+        return [task] + tasks
+    
+    if task.get("status") == "open":
+        _open_tasks_changed(task["user_id"], add)
+    invalidation_bus.publish(OPEN_TASKS_CHANNEL, task["user_id"])
+
+def task_removed(user_id: int, task_id: int):
+    """Drop a closed or deleted task from its owner's cached list."""
+    def remove(tasks):
+        if tasks is _TOO_MANY_TASKS:
+            return None  # May fit under the cap now; reload on next read
+        return [t for t in tasks if t["id"] != int(task_id)]
+    
+    _open_tasks_changed(user_id, remove)
+    invalidation_bus.publish(OPEN_TASKS_CHANNEL, user_id)
+
 def create_task(user_id: int, title: str, description: str = None) -> Dict[str, Any]:
     """Create a new task."""
     supabase = get_supabase()
@@ -46,40 +225,98 @@ def create_task(user_id: int, title: str, description: str = None) -> Dict[str,
         "status": "open",
     }
     result = supabase.table("tasks").insert(new_task).execute()
+    task_created(result.data[0])
     return result.data[0]
 
-def get_tasks_by_user(user_id: int, status: str = None) -> List[Dict[str, Any]]:
-    """Get tasks for a user, optionally filtered by status."""
+def get_tasks_by_user(
+    user_id: int,
+    status: str = None,
+    columns: str = "*",
+    limit: int = None,
+    after: Cursor = None,
+) -> List[Dict[str, Any]]:
+    """
+    Get tasks for a user, newest first, optionally filtered by status.
+    Pass limit/after to page with next_cursor(); columns narrows the projection.
+    Open tasks are served from the per-user cache when it holds the full list.
+    """
     supabase = get_supabase()
-    query = supabase.table("tasks").select("*").eq("user_id", user_id)
+    if status == "open":
+        tasks = _open_task_cache.get(user_id)
+        if tasks is None:
+            generation = open_tasks_generation(user_id)
+            tasks = store_open_tasks(user_id, open_tasks_query(supabase, user_id).execute().data, generation)
+        if tasks is not _TOO_MANY_TASKS:
+            return page_cached_tasks(tasks, columns, limit, after)
+    
+    query = supabase.table("tasks").select(with_keyset_columns(columns)).eq("user_id", user_id)
     if status:
         query = query.eq("status", status)
-    result = query.order("created_at", desc=True).execute()
+    result = apply_keyset(query, limit, after).execute()
     return result.data
 
+def count_tasks_by_user(user_id: int, status: str = None) -> int:
+    """Count tasks for a user without fetching rows."""
+    if status == "open":
+        tasks = _open_task_cache.get(user_id)
+        if tasks is not None and tasks is not _TOO_MANY_TASKS:
+            return len(tasks)
+    
+    supabase = get_supabase()
+    query = supabase.table("tasks").select("id", count="exact", head=True).eq("user_id", user_id)
+    if status:
+        query = query.eq("status", status)
+    return query.execute().count or 0
+
 def close_task(task_id: int, user_id: int) -> Optional[Dict[str, Any]]:
     """Mark task as done."""
     supabase = get_supabase()
     result = supabase.table("tasks").update({"status": "done"}).eq("id", task_id).eq("user_id", user_id).execute()
-    return result.data[0] if result.data else None
+    if not result.data:
+        return None
+    task_removed(user_id, task_id)
+    return result.data[0]
 
 def delete_task(task_id: int, user_id: int) -> bool:
     """Delete a task."""
     supabase = get_supabase()
     result = supabase.table("tasks").delete().eq("id", task_id).eq("user_id", user_id).execute()
-    return len(result.data) > 0
+    if not result.data:
+        return False
+    task_removed(user_id, task_id)
+    return True
 
 # ========== MESSAGES ==========
-def log_message(user_id: int, text: str, source: str = "telegram") -> Dict[str, Any]:
-    """Log a message."""
+def insert_messages(rows: List[Dict[str, Any]]) -> int:
+    """Insert message-log rows in a single bulk insert."""
+    if not rows:
+        return 0
     supabase = get_supabase()
+    supabase.table("messages").insert(rows).execute()
+    return len(rows)
+
+message_log_buffer = MessageLogBuffer(
+    insert_messages,
+    batch_size=settings.MESSAGE_LOG_BATCH_SIZE,
+    flush_interval_ms=settings.MESSAGE_LOG_FLUSH_MS,
+    max_pending=settings.MESSAGE_LOG_MAX_PENDING,
+    block_ms=settings.MESSAGE_LOG_BLOCK_MS,
+    drop_policy=settings.MESSAGE_LOG_DROP_POLICY,
+)
+
+def log_message(user_id: int, text: str, source: str = "telegram") -> Dict[str, Any]:
+    """
+    Log a message.
+    Rows are buffered and written in bulk in the background; the returned
+    row has no id yet.
+    """
     new_message = {
         "user_id": user_id,
         "text": text[:4000],  # Limit length
         "source": source,
     }
-    result = supabase.table("messages").insert(new_message).execute()
-    return result.data[0] if result.data else {}
+    message_log_buffer.put(new_message)
+    return new_message
 
 # ========== APPROVAL REQUESTS ==========
 def create_approval_request(user_id: int, action_type: str, payload: Dict) -> Dict[str, Any]:
@@ -107,34 +344,87 @@ def update_approval_status(approval_id: int, status: str) -> bool:
     return len(result.data) > 0
 
 # ========== MEMORY ==========
+USER_PREFERENCES_CHANNEL = "user_preferences"
+_user_preference_cache = TTLCache(max_size=10000, ttl_seconds=settings.PREFERENCE_CACHE_TTL, name="user_preferences")
+invalidation_bus.subscribe(USER_PREFERENCES_CHANNEL, lambda key: _user_preference_cache.delete(int(key)))
+
 def get_user_preferences(user_id: int) -> Dict[str, Any]:
     """Get user preferences from memory."""
+    prefs = _user_preference_cache.get(user_id)
+    if prefs is not None:
+        return dict(prefs)
+    
     supabase = get_supabase()
-    result = supabase.table("memory").select("*").eq("user_id", user_id).eq("memory_type", "preference").execute()
+    result = supabase.table("memory").select("key,value").eq("user_id", user_id).eq("memory_type", "preference").execute()
     
     prefs = {}
     for row in result.data:
         prefs[row.get("key", "")] = row.get("value", "")
-    return prefs
+    _user_preference_cache.set(user_id, prefs)
+    return dict(prefs)
 
 def set_user_preference(user_id: int, key: str, value: str) -> bool:
     """Set a user preference."""
-    supabase = get_supabase()
+    return set_user_preferences(user_id, {key: value})
+
+def set_user_preferences(user_id: int, values: Dict[str, str]) -> bool:
+    """Set several user preferences in one upsert on (user_id, key)."""
+    if not values:
+        return True
     
-    # Check if exists
-    existing = supabase.table("memory").select("id").eq("user_id", user_id).eq("key", key).execute()
+    supabase = get_supabase()
+    rows = [
+        {"user_id": user_id, "memory_type": "preference", "key": key, "value": value}
+        for key, value in values.items()
+    ]
+    supabase.table("memory").upsert(rows, on_conflict="user_id,key").execute()
     
-    if existing.data:
-        supabase.table("memory").update({"value": value}).eq("id", existing.data[0]["id"]).execute()
-    else:
-        supabase.table("memory").insert({
-            "user_id": user_id,
-            "memory_type": "preference",
-            "key": key,
-            "value": value,
-        }).execute()
+    # Write through only if the user is cached; otherwise the next read loads everything
+    prefs = _user_preference_cache.get(user_id)
+    if prefs is not None:
+        _user_preference_cache.set(user_id, {**prefs, **values})
+    invalidation_bus.publish(USER_PREFERENCES_CHANNEL, user_id)
     return True
 
+# ========== DAILY BRIEF ==========
+# brief_snapshots rows are kept current by a trigger on tasks (see supabase_schema.sql)
+def get_brief_snapshot(user_id: int) -> Dict[str, Any]:
+    """Open-task count and newest open tasks ({id, title}, up to 10) for one user."""
+    supabase = get_supabase()
+    result = supabase.table("brief_snapshots").select("open_count,top_tasks").eq("user_id", user_id).execute()
+    if not result.data:
+        return {"open_count": 0, "top_tasks": []}
+    return result.data[0]
+
+def get_daily_brief_page(
+    after_id: int = 0,
+    page_size: int = 500,
+    top_n: int = 5,
+    user_ids: List[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    One page of users (ordered by id) with open_count and top_titles,
+    fetched in a single daily_brief_page RPC. user_ids restricts the page to those users.
+    """
+    supabase = get_supabase()
+    params = {"after_id": after_id, "page_size": page_size, "top_n": top_n}
+    if user_ids is not None:
+        params["user_ids"] = sorted(user_ids)
+    result = supabase.rpc("daily_brief_page", params).execute()
+    return result.data or []
+
+def iter_daily_brief_pages(page_size: int = 500, top_n: int = 5, user_ids: List[int] = None):
+    """Stream brief data for every user (or just user_ids) page by page."""
+    after_id = 0
+    while True:
+        page = get_daily_brief_page(after_id, page_size, top_n, user_ids)
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        after_id = page[-1]["id"]
+
 # ========== PROPOSALS ==========
 def create_proposal(user_id: int, proposal: Dict) -> Dict[str, Any]:
     """Create an improvement proposal."""
@@ -147,15 +437,29 @@ def create_proposal(user_id: int, proposal: Dict) -> Dict[str, Any]:
     result = supabase.table("improvement_proposals").insert(new_proposal).execute()
     return result.data[0]
 
-def get_proposals_by_user(user_id: int, status: str = None) -> List[Dict[str, Any]]:
-    """Get proposals for a user."""
+def get_proposals_by_user(
+    user_id: int,
+    status: str = None,
+    columns: str = "*",
+    limit: int = None,
+    after: Cursor = None,
+) -> List[Dict[str, Any]]:
+    """Get proposals for a user, newest first. Pages like get_tasks_by_user."""
     supabase = get_supabase()
-    query = supabase.table("improvement_proposals").select("*").eq("user_id", user_id)
+    query = supabase.table("improvement_proposals").select(with_keyset_columns(columns)).eq("user_id", user_id)
     if status:
         query = query.eq("status", status)
-    result = query.order("created_at", desc=True).execute()
+    result = apply_keyset(query, limit, after).execute()
     return result.data
 
+def count_proposals_by_user(user_id: int, status: str = None) -> int:
+    """Count proposals for a user without fetching rows."""
+    supabase = get_supabase()
+    query = supabase.table("improvement_proposals").select("id", count="exact", head=True).eq("user_id", user_id)
+    if status:
+        query = query.eq("status", status)
+    return query.execute().count or 0
+
 def update_proposal_status(proposal_id: int, status: str) -> bool:
     """Update proposal status."""
     supabase = get_supabase()
@@ -0,0 +1,136 @@
+"""
+Message Buffer - Batches message-log rows into bulk inserts off the request path.
+"""
+from collections import deque
+from typing import Any, Callable, Dict, List
+from core.metrics import metrics
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+class MessageLogBuffer:
+    """
+    Bounded buffer flushed by a background thread every batch_size rows
+    or flush_interval_ms, whichever comes first.
+    When full, put() waits up to block_ms for room, then applies the drop policy.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[List[Dict[str, Any]]], Any],
+        batch_size: int = 50,
+        flush_interval_ms: int = 500,
+        max_pending: int = 5000,
+        block_ms: int = 0,
+        drop_policy: str = DROP_OLDEST,
+    ):
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.block_timeout = block_ms / 1000
+        self.drop_policy = drop_policy
+        self._rows: deque = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, row: Dict[str, Any]) -> bool:
+        """Queue a row. Returns False if the row (or an older one) was dropped."""
+        with self._cond:
+            if self._closed:
+                return False
+            self._ensure_started()
+
+            if len(self._rows) >= self.max_pending and self.block_timeout:
+                deadline = time.monotonic() + self.block_timeout
+                while len(self._rows) >= self.max_pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.notify_all()
+                    self._cond.wait(remaining)
+
+            accepted = True
+            if len(self._rows) >= self.max_pending:
+                self.dropped += 1
+                metrics.increment("message_log_dropped_total")
+                if self.drop_policy == DROP_NEWEST:
+                    return False
+                self._rows.popleft()
+                accepted = False
+
+            self._rows.append(row)
+            if len(self._rows) >= self.batch_size:
+                self._cond.notify_all()
+            return accepted
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="message-log-buffer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        batch = []
+        while self._rows and len(batch) < self.batch_size:
+            batch.append(self._rows.popleft())
+        metrics.set_gauge("message_log_pending", len(self._rows))
+        self._cond.notify_all()  # Wake producers waiting for room
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and len(self._rows) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+                batch = self._take_batch()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: List[Dict[str, Any]]):
+        try:
+            self.flush_fn(batch)
+            metrics.increment("messages_logged_total", len(batch))
+        except Exception as e:
+            self.dropped += len(batch)
+            metrics.increment("message_log_dropped_total", len(batch))
+            logger.error(f"[MessageLog] Failed to insert {len(batch)} rows: {e}")
+
+    def flush(self):
+        """Synchronously write everything queued so far."""
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            if not batch:
+                return
+            self._flush(batch)
+
+    def close(self, timeout: float = 5.0):
+        """Stop the flusher and write remaining rows. Safe to call more than once."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def __len__(self) -> int:
+        return len(self._rows)
@@ -0,0 +1,121 @@
+"""
+Fanout - Concurrent, rate-limited delivery of outbound messages.
+"""
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from core.metrics import metrics
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Server-requested delay from a flood-control error (e.g. telegram RetryAfter), else None."""
+    delay = getattr(error, "retry_after", None)
+    if delay is None:
+        return None
+    if isinstance(delay, timedelta):
+        return delay.total_seconds()
+    return float(delay)
+
+class AsyncTokenBucket:
+    """Token bucket shared by coroutines on one event loop. Waiters are served in order."""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Hold every sender back, e.g. after the server asked us to slow down."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+class FanoutSender:
+    """
+    Sends (chat_id, payload) items concurrently under a semaphore, the shared
+    token bucket and a minimum interval per chat. Flood-control errors are
+    retried after the server-given delay; other errors fail the item.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Any, Any], Awaitable[Any]],
+        limiter: AsyncTokenBucket,
+        concurrency: int = 20,
+        per_chat_interval: float = 1.0,
+        max_retries: int = 3,
+        name: str = "fanout",
+    ):
+        self.send = send
+        self.limiter = limiter
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.name = name
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._chat_ready: Dict[Any, float] = {}
+
+    async def _wait_for_chat(self, chat_id: Any):
+        ready_at = self._chat_ready.get(chat_id, 0.0)
+        now = time.monotonic()
+        self._chat_ready[chat_id] = max(now, ready_at) + self.per_chat_interval
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+    async def _send_one(self, chat_id: Any, payload: Any, totals: Dict[str, int]) -> bool:
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self._wait_for_chat(chat_id)
+                await self.limiter.acquire()
+                try:
+                    await self.send(chat_id, payload)
+                    totals["sent"] += 1
+                    metrics.increment(f"{self.name}_sent_total")
+                    return True
+                except Exception as e:
+                    delay = retry_after_seconds(e)
+                    if delay is None or attempt == self.max_retries:
+                        totals["failed"] += 1
+                        metrics.increment(f"{self.name}_failed_total")
+                        logger.error(f"[Fanout] Failed to send to {chat_id}: {e}")
+                        return False
+                    totals["retried"] += 1
+                    metrics.increment(f"{self.name}_retried_total")
+                    logger.warning(f"[Fanout] Flood control for {chat_id}, retrying in {delay}s")
+                    self.limiter.pause(delay)
+                    await asyncio.sleep(delay)
+        return False
+
+    async def send_all(self, items: Iterable[Tuple[Any, Any]]) -> Dict[str, Any]:
+        """Deliver every item. Returns sent/failed/retried counts and the achieved rate."""
+        totals = {"sent": 0, "failed": 0, "retried": 0}
+        started = time.monotonic()
+        await asyncio.gather(*(self._send_one(chat_id, payload, totals) for chat_id, payload in items))
+
+        elapsed = time.monotonic() - started
+        totals["seconds"] = round(elapsed, 3)
+        totals["per_second"] = round(totals["sent"] / elapsed, 2) if elapsed > 0 else 0.0
+        metrics.set_gauge(f"{self.name}_last_per_second", totals["per_second"])
+        return totals
@@ -0,0 +1,164 @@
+"""
+Leader - Lease-based locks so only one bot replica runs each scheduled job.
+"""
+from sqlalchemy import inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from core.models import SchedulerLease
+from typing import Callable, Dict, Set
+import logging
+import os
+import socket
+import time
+import uuid
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Dialects with INSERT ... ON CONFLICT; only Postgres is shared between hosts
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+class LeaseConfigError(RuntimeError):
+    """The lease table cannot keep replicas apart (raised by ShardLeases.check at startup)."""
+
+def make_owner_id() -> str:
+    """Identity of this process in the lease table."""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+def shard_of(user_id: int, shards: int) -> int:
+    """Stable shard for a user, identical on every replica."""
+    return zlib.crc32(str(user_id).encode()) % shards
+
+def try_acquire(db: Session, name: str, owner: str, ttl_seconds: float) -> bool:
+    """
+    Take or renew a lease in one INSERT ... ON CONFLICT statement.
+    Succeeds if the lease is free, expired, or already ours.
+    """
+    table = SchedulerLease.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect not in _INSERTS:
+        raise LeaseConfigError(f"Leases not supported on {dialect}")
+    stmt = _INSERTS[dialect](table)
+
+    now = time.time()
+    stmt = stmt.values(name=name, owner=owner, expires_at=now + ttl_seconds)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={"owner": stmt.excluded.owner, "expires_at": stmt.excluded.expires_at},
+        where=(table.c.owner == stmt.excluded.owner) | (table.c.expires_at < now),
+    ).returning(table.c.owner)
+
+    row = db.execute(stmt).first()
+    db.commit()
+    return row is not None
+
+def release(db: Session, name: str, owner: str):
+    """Give up a lease we hold so another replica can take it immediately."""
+    db.query(SchedulerLease).filter(
+        SchedulerLease.name == name,
+        SchedulerLease.owner == owner,
+    ).delete()
+    db.commit()
+
+class ShardLeases:
+    """
+    Holds leases on brief shards. With one shard this is plain leader election;
+    with more, replicas split users between them by shard_of(user_id).
+    Call check() once at startup, then refresh() well within the TTL to keep
+    held shards and pick up free ones.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        shards: int = 1,
+        ttl_seconds: float = 30,
+        max_held: int = 0,
+        prefix: str = "brief_shard",
+        owner: str = None,
+    ):
+        self.session_factory = session_factory
+        self.shards = shards
+        self.ttl_seconds = ttl_seconds
+        self.max_held = max_held or shards
+        self.prefix = prefix
+        self.owner = owner or make_owner_id()
+        self._valid_until: Dict[int, float] = {}
+        self.local = False  # Owns every shard without touching the database
+
+    def check(self):
+        """
+        Make sure leases are stored where every replica sees them: a Postgres
+        database with the scheduler_leases table. Otherwise raise LeaseConfigError,
+        or with a single shard fall back to owning it locally with a warning.
+        """
+        with self.session_factory() as db:
+            bind = db.get_bind()
+            dialect = bind.dialect.name
+            if dialect not in _INSERTS:
+                problem = f"{dialect} cannot store leases"
+            elif not inspect(bind).has_table(SchedulerLease.__tablename__):
+                problem = f"table {SchedulerLease.__tablename__} is missing (run alembic upgrade head)"
+            elif dialect != "postgresql":
+                problem = f"{dialect} is local to this host, so replicas would not see each other's leases"
+            else:
+                return
+
+        if self.shards > 1:
+            raise LeaseConfigError(f"Brief shard leases need a shared Postgres DATABASE_URL: {problem}")
+        logger.warning(f"[Leader] {problem}; assuming a single replica that owns every shard")
+        self.local = True
+
+    def _name(self, shard: int) -> str:
+        return f"{self.prefix}:{shard}/{self.shards}"
+
+    def refresh(self) -> Set[int]:
+        """Renew held shards, then claim free ones up to max_held. Returns owned shards."""
+        if self.local:
+            self._valid_until = {s: float("inf") for s in range(self.shards)}
+            return self.owned
+        with self.session_factory() as db:
+            held = sorted(self.owned)
+            others = [s for s in range(self.shards) if s not in held]
+            for shard in held + others:
+                if shard not in held and len(self.owned) >= self.max_held:
+                    break
+                # Count validity from before the round trip so we never overestimate it
+                started = time.monotonic()
+                try:
+                    acquired = try_acquire(db, self._name(shard), self.owner, self.ttl_seconds)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"[Leader] Lease refresh failed for shard {shard}: {e}")
+                    continue
+                if acquired:
+                    if shard not in self._valid_until:
+                        logger.info(f"[Leader] {self.owner} took shard {shard}/{self.shards}")
+                    self._valid_until[shard] = started + self.ttl_seconds
+                elif self._valid_until.pop(shard, None) is not None:
+                    logger.warning(f"[Leader] {self.owner} lost shard {shard}/{self.shards}")
+        return self.owned
+
+    @property
+    def owned(self) -> Set[int]:
+        """Shards whose lease has not lapsed since it was last renewed."""
+        now = time.monotonic()
+        return {s for s, until in self._valid_until.items() if until > now}
+
+    def owns(self, user_id: int) -> bool:
+        """Whether this replica is responsible for a user's brief."""
+        return shard_of(user_id, self.shards) in self.owned
+
+    def release_all(self):
+        """Hand every held shard back, e.g. on shutdown."""
+        if self.local:
+            self._valid_until.clear()
+            return
+        with self.session_factory() as db:
+            for shard in list(self._valid_until):
+                try:
+                    release(db, self._name(shard), self.owner)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"[Leader] Failed to release shard {shard}: {e}")
+        self._valid_until.clear()
@@ -6,10 +6,28 @@ import json
 import uuid
 from datetime import datetime
 from contextvars import ContextVar
-from typing import Optional
+from logging.handlers import QueueHandler, RotatingFileHandler
+from typing import Any, Dict, List, Optional
+from core.config import get_settings
+from core.metrics import metrics
+import atexit
+import gzip
+import os
+import queue
+import random
+import reprlib
+import shutil
+import threading
+
+try:
+    import orjson
+except ImportError:  # Optional speed-up; stdlib json is used without it
+    orjson = None
 
 # Context variable for request ID
 request_id_var: ContextVar[str] = ContextVar('request_id', default='')
+# Current span, maintained by core.tracing
+span_id_var: ContextVar[str] = ContextVar('span_id', default='')
 
 def get_request_id() -> str:
     """Get current request ID from context."""
@@ -21,6 +39,77 @@ def set_request_id(request_id: str = None) -> str:
     request_id_var.set(rid)
     return rid
 
+def dumps(obj: Any) -> str:
+    """JSON-encode a log record, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str).decode()
+    return json.dumps(obj, default=str)
+
+def truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [+{len(text) - limit} chars]"
+
+class _CappedRepr(reprlib.Repr):
+    """repr() of containers that stops early instead of rendering every element."""
+
+    def __init__(self, limit: int):
+        super().__init__()
+        self.maxlevel = 4
+        self.maxdict = self.maxlist = self.maxtuple = self.maxset = self.maxfrozenset = 50
+        self.maxstring = self.maxother = self.maxlong = limit
+
+_CONTAINERS = (dict, list, tuple, set, frozenset)
+
+def cap_arg(value: Any, limit: int, capped_repr: reprlib.Repr) -> Any:
+    """Size-capped stand-in for a %-format argument: long strings and big containers are cut."""
+    if isinstance(value, str):
+        return truncate(value, limit)
+    if isinstance(value, _CONTAINERS):
+        return truncate(capped_repr.repr(value), limit)
+    return value
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """'core.agent.loop=0.1,core.agent.llm_client=0.5' -> {logger: rate}."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the records below WARNING from the configured loggers
+    (and their children). Warnings and errors are never sampled out.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def rate_for(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            parts = name.split(".")
+            for i in range(len(parts), 0, -1):
+                prefix = ".".join(parts[:i])
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1 or random.random() < rate:
+            return True
+        metrics.increment("log_records_sampled_out_total")
+        return False
+
 class JSONFormatter(logging.Formatter):
     """Structured JSON log formatter."""
     
@@ -30,8 +119,11 @@ class JSONFormatter(logging.Formatter):
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
-            "request_id": get_request_id(),
+            "request_id": getattr(record, "request_id", None) or get_request_id(),
         }
+        span_id = getattr(record, "span_id", None) or span_id_var.get()
+        if span_id:
+            log_record["span_id"] = span_id
         
         # Add extra fields
         if hasattr(record, 'user_id'):
@@ -45,32 +137,223 @@ class JSONFormatter(logging.Formatter):
         if record.exc_info:
             log_record["exception"] = self.formatException(record.exc_info)
         
-        return json.dumps(log_record)
+        return dumps(log_record)
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Hands records to a bounded queue; formatting and I/O happen on the listener thread.
+    When full, waits up to block_ms for room, then applies the drop policy.
+    """
+
+    def __init__(
+        self,
+        log_queue: queue.Queue,
+        drop_policy: str = DROP_OLDEST,
+        block_ms: int = 0,
+        max_field_chars: int = 2000,
+        max_message_chars: int = 8000,
+    ):
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        super().__init__(log_queue)
+        self.drop_policy = drop_policy
+        self.block_timeout = block_ms / 1000
+        self.max_field_chars = max_field_chars
+        self.max_message_chars = max_message_chars
+        self._repr = _CappedRepr(max_field_chars)
+        self.dropped = 0
+
+    def _cap(self, value):
+        return cap_arg(value, self.max_field_chars, self._repr)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Capture what only the calling context knows; leave formatting to the listener
+        if not getattr(record, "request_id", None):
+            record.request_id = get_request_id()
+        record.span_id = span_id_var.get()
+        if record.args:
+            # Cap arguments before merging, so a huge tool result is never fully rendered
+            if not isinstance(record.args, dict):
+                record.args = tuple(self._cap(arg) for arg in record.args)
+            elif "%(" in str(record.msg):
+                record.args = {key: self._cap(value) for key, value in record.args.items()}
+            else:
+                # logging unwraps a lone dict argument, e.g. logger.info("%s", result)
+                record.args = (self._cap(record.args),)
+        record.msg = truncate(record.getMessage(), self.max_message_chars)
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self.block_timeout:
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        self.dropped += 1
+        metrics.increment("log_records_dropped_total")
+        if self.drop_policy == DROP_OLDEST:
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
 
-def setup_logging(json_format: bool = True, level: int = logging.INFO):
-    """Setup logging with optional JSON format."""
+class BatchingQueueListener:
+    """
+    Drains the log queue on a daemon thread, up to batch_size records at a time.
+    Stream and file handlers get one write and one flush per batch.
+    """
+
+    _STOP = object()
+
+    def __init__(self, log_queue: queue.Queue, handlers: List[logging.Handler], batch_size: int = 200):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="log-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write everything queued so far and stop the thread."""
+        if self._thread is None:
+            return
+        self.queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+        for handler in self.handlers:
+            handler.close()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(record is self._STOP for record in batch)
+            self.handle_batch([record for record in batch if record is not self._STOP])
+            metrics.set_gauge("log_queue_depth", self.queue.qsize())
+            if stop:
+                return
+
+    def handle_batch(self, records: List[logging.LogRecord]):
+        for handler in self.handlers:
+            if isinstance(handler, logging.StreamHandler):
+                self._write_batch(handler, records)
+            else:
+                for record in records:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+    def _write_batch(self, handler: logging.StreamHandler, records: List[logging.LogRecord]):
+        rotating = isinstance(handler, RotatingFileHandler) and handler.maxBytes > 0
+        chunks: List[str] = []
+        pending = 0
+        record = None
+        handler.acquire()
+        try:
+            for record in records:
+                if record.levelno < handler.level or not handler.filter(record):
+                    continue
+                text = handler.format(record) + handler.terminator
+                if rotating and handler.stream.tell() + pending + len(text) >= handler.maxBytes:
+                    handler.stream.write("".join(chunks))
+                    handler.doRollover()
+                    chunks, pending = [], 0
+                chunks.append(text)
+                pending += len(text)
+            if chunks:
+                handler.stream.write("".join(chunks))
+                handler.flush()
+        except Exception:
+            handler.handleError(record)
+        finally:
+            handler.release()
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+def gzip_rotating_file_handler(path: str, max_bytes: int, backups: int) -> RotatingFileHandler:
+    """RotatingFileHandler whose rotated files are gzip-compressed (app.log.1.gz, ...)."""
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    return handler
+
+_listener: Optional[BatchingQueueListener] = None
+
+def setup_logging(json_format: bool = True, level: int = logging.INFO, log_file: Optional[str] = None):
+    """
+    Setup logging with optional JSON format.
+    Callers only enqueue records; a listener thread formats and writes them
+    to stderr and, if log_file (or LOG_FILE) is set, a gzip-rotated file.
+    """
+    global _listener
+    settings = get_settings()
     root_logger = logging.getLogger()
     root_logger.setLevel(level)
     
     # Remove existing handlers
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
-    
-    # Create console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(level)
+    if _listener:
+        _listener.stop()
     
     if json_format:
-        console_handler.setFormatter(JSONFormatter())
+        formatter = JSONFormatter()
     else:
-        console_handler.setFormatter(logging.Formatter(
-            '%(asctime)s [%(request_id)s] %(levelname)s %(name)s: %(message)s',
-            defaults={'request_id': get_request_id}
-        ))
+        formatter = logging.Formatter('%(asctime)s [%(request_id)s] %(levelname)s %(name)s: %(message)s')
     
-    root_logger.addHandler(console_handler)
+    # Sinks, written by the listener thread only
+    console_handler = logging.StreamHandler()
+    sinks: List[logging.Handler] = [console_handler]
+    log_file = log_file or settings.LOG_FILE
+    if log_file:
+        sinks.append(gzip_rotating_file_handler(log_file, settings.LOG_FILE_MAX_BYTES, settings.LOG_FILE_BACKUPS))
+    for sink in sinks:
+        sink.setLevel(level)
+        sink.setFormatter(formatter)
+    
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_MAX)
+    queue_handler = BoundedQueueHandler(
+        log_queue, settings.LOG_DROP_POLICY, settings.LOG_BLOCK_MS,
+        settings.LOG_MAX_FIELD_CHARS, settings.LOG_MAX_MESSAGE_CHARS,
+    )
+    # Records no sink would write are dropped before any message is rendered
+    queue_handler.setLevel(min(sink.level for sink in sinks))
+    sample_rates = parse_sample_rates(settings.LOG_SAMPLE_RATES)
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+    root_logger.addHandler(queue_handler)
+    _listener = BatchingQueueListener(log_queue, sinks, settings.LOG_BATCH_SIZE)
+    _listener.start()
     return root_logger
 
+def shutdown_logging():
+    """Flush queued records; registered to run at exit."""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
+
 class LoggerAdapter(logging.LoggerAdapter):
     """Logger adapter that includes request ID."""
     
@@ -0,0 +1,187 @@
+"""
+Loop Monitor - Finds callbacks that block the event loop and tracks thread-pool saturation.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from core.config import get_settings
+from core.metrics import metrics
+import asyncio
+import contextvars
+import heapq
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+MAX_STACK_FRAMES = 25
+
+class InstrumentedThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that knows how many jobs are queued and running."""
+
+    def __init__(self, max_workers: Optional[int] = None, thread_name_prefix: str = "", name: str = "executor"):
+        super().__init__(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self.name = name
+        self.pending = 0  # Submitted and not finished
+        self.active = 0
+        self._count_lock = threading.Lock()
+
+    def _adjust(self, pending: int, active: int):
+        with self._count_lock:
+            self.pending += pending
+            self.active += active
+
+    def submit(self, fn, /, *args, **kwargs):
+        submitted = time.perf_counter()
+
+        def run():
+            metrics.observe(f"{self.name}_queue_wait_ms", (time.perf_counter() - submitted) * 1000)
+            self._adjust(0, 1)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._adjust(-1, -1)
+
+        self._adjust(1, 0)
+        try:
+            # Carry request_id and the current span into the worker, as asyncio.to_thread does
+            return super().submit(contextvars.copy_context().run, run)
+        except BaseException:
+            self._adjust(-1, 0)
+            raise
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.pending - self.active,
+            "active": self.active,
+            "utilization": round(self.active / self.max_workers, 3),
+        }
+
+def _anyio_stats() -> Optional[Dict[str, Any]]:
+    """Starlette runs sync endpoints on anyio's thread limiter, not the loop's executor."""
+    try:
+        from anyio.to_thread import current_default_thread_limiter
+        limiter = current_default_thread_limiter()
+    except Exception:
+        return None
+    busy = limiter.borrowed_tokens
+    return {
+        "queued": limiter.statistics().tasks_waiting,
+        "active": busy,
+        "utilization": round(busy / limiter.total_tokens, 3) if limiter.total_tokens else 0.0,
+    }
+
+_LIBRARY_PATHS = tuple({sysconfig.get_paths()[k] for k in ("stdlib", "platstdlib", "purelib", "platlib")})
+
+def _blocking_site(stack: traceback.StackSummary) -> str:
+    """Innermost frame of our own code, i.e. the handler line that made the blocking call."""
+    for frame in reversed(stack):
+        if not frame.filename.startswith(_LIBRARY_PATHS):
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+    innermost = stack[-1]
+    return f"{os.path.basename(innermost.filename)}:{innermost.lineno} {innermost.name}"
+
+class LoopMonitor:
+    """
+    A heartbeat task ticks every `interval` seconds; a watchdog thread that sees
+    no tick for `threshold_ms` grabs the loop thread's stack. When the loop
+    resumes, the stall is recorded with that stack, and the longest `top_n`
+    stalls are kept. Each tick also samples thread-pool queue depth and use.
+    """
+
+    def __init__(self, threshold_ms: float = 100, interval: float = 0.02, top_n: int = 10, name: str = "loop"):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.top_n = top_n
+        self.name = name
+        self.executor: Optional[InstrumentedThreadPoolExecutor] = None
+        self._beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._stalls: List[tuple] = []  # Min-heap of (duration_ms, seq, stall)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.monotonic()
+            self._sample_pools()
+            await asyncio.sleep(self.interval)
+
+    def _sample_pools(self):
+        pools = {"executor": self.executor.stats() if self.executor else None, "anyio_executor": _anyio_stats()}
+        for prefix, stats in pools.items():
+            if stats:
+                metrics.set_gauge(f"{prefix}_queue_depth", stats["queued"])
+                metrics.set_gauge(f"{prefix}_active", stats["active"])
+                metrics.set_gauge(f"{prefix}_utilization", stats["utilization"])
+
+    def _watch(self):
+        stalled_beat = None
+        site = stack = None
+        while True:
+            time.sleep(self.interval)
+            beat = self._beat
+            if stalled_beat is not None and beat != stalled_beat:
+                # Loop is back: the gap beyond one interval was spent blocked
+                self._record((beat - stalled_beat - self.interval) * 1000, site, stack)
+                stalled_beat = None
+            elif stalled_beat is None and time.monotonic() - beat > self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    stalled_beat = beat
+                    summary = traceback.extract_stack(frame)
+                    site = _blocking_site(summary)
+                    stack = summary.format()[-MAX_STACK_FRAMES:]
+
+    def _record(self, duration_ms: float, site: str, stack: List[str]):
+        metrics.increment(f"{self.name}_stalls_total")
+        metrics.observe(f"{self.name}_stall_ms", duration_ms, site=site)
+        logger.warning(f"[LoopMonitor] Event loop blocked {duration_ms:.0f}ms in {site}")
+        stall = {
+            "duration_ms": round(duration_ms, 1),
+            "site": site,
+            "at": time.time(),
+            "stack": "".join(stack),
+        }
+        with self._lock:
+            self._seq += 1
+            entry = (duration_ms, self._seq, stall)
+            if len(self._stalls) < self.top_n:
+                heapq.heappush(self._stalls, entry)
+            elif duration_ms > self._stalls[0][0]:
+                heapq.heapreplace(self._stalls, entry)
+
+    def top_stalls(self) -> List[Dict[str, Any]]:
+        """Longest stalls seen so far, longest first."""
+        with self._lock:
+            return [stall for _, _, stall in sorted(self._stalls, reverse=True)]
+
+    def start(self, install_executor: bool = True):
+        """Start on the running loop. Safe to call more than once."""
+        if self._task is not None and not self._task.done():
+            return
+        loop = asyncio.get_running_loop()
+        if install_executor and self.executor is None:
+            # asyncio.to_thread and run_in_executor(None, ...) land here
+            self.executor = InstrumentedThreadPoolExecutor(thread_name_prefix="asyncio")
+            loop.set_default_executor(self.executor)
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = loop.create_task(self._heartbeat())
+        if self._watchdog is None:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+# Global loop monitor, one per process
+loop_monitor = LoopMonitor(threshold_ms=settings.LOOP_STALL_THRESHOLD_MS)
@@ -1,41 +1,235 @@
 """
 Metrics - Basic metrics collection for /metrics endpoint.
 """
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from core.config import get_settings
+import math
 import threading
+import time
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+def label_set(labels: Dict[str, Any]) -> LabelSet:
+    """Canonical, hashable form of a label dict."""
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def series_name(name: str, labels: LabelSet) -> str:
+    """name{k="v",...} as used in get_all() keys."""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+class Histogram:
+    """
+    Fixed-memory histogram with log-spaced (HDR-style) buckets.
+    Each power of two is split into `sub_buckets` steps, so any recorded value
+    is reported within ~1/sub_buckets relative error.
+    """
+
+    def __init__(self, lowest: float = 0.01, highest: float = 3_600_000, sub_buckets: int = 8):
+        self.lowest = lowest
+        self.sub_buckets = sub_buckets
+        self._log_growth = math.log(2) / sub_buckets
+        size = int(math.ceil(math.log(highest / lowest) / self._log_growth)) + 1
+        self.counts: List[int] = [0] * (size + 1)  # Index 0 holds values <= lowest
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value: float) -> int:
+        if value <= self.lowest:
+            return 0
+        index = int(math.ceil(math.log(value / self.lowest) / self._log_growth))
+        return min(index, len(self.counts) - 1)
+
+    def upper_bound(self, index: int) -> float:
+        """Largest value that falls into a bucket."""
+        return self.lowest * math.exp(index * self._log_growth)
+
+    def observe(self, value: float):
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """Value at quantile q (0-100), reported as its bucket's upper bound."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                if index == len(self.counts) - 1:
+                    return self.max  # Overflow bucket has no upper bound
+                return min(self.upper_bound(index), self.max)
+        return self.max
+
+    def copy(self) -> "Histogram":
+        clone = Histogram.__new__(Histogram)
+        clone.__dict__.update(self.__dict__)
+        clone.counts = list(self.counts)
+        return clone
+
+    def merge(self, other: "Histogram"):
+        """Add another histogram with the same bucket layout into this one."""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def export_buckets(self) -> List[Tuple[float, int]]:
+        """Cumulative (upper bound, count) at each power of two, for Prometheus buckets."""
+        buckets = []
+        seen = 0
+        for index, n in enumerate(self.counts[:-1]):
+            seen += n
+            if index % self.sub_buckets == 0:
+                buckets.append((self.upper_bound(index), seen))
+        return buckets
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "min": round(self.min, 3) if self.count else 0.0,
+            "max": round(self.max, 3) if self.count else 0.0,
+            "p50": round(self.percentile(50), 3),
+            "p90": round(self.percentile(90), 3),
+            "p99": round(self.percentile(99), 3),
+        }
+
+class _Shard:
+    """Counters and histograms written by one thread only."""
+    __slots__ = ("thread", "counters", "histograms")
+
+    def __init__(self, thread: Optional[threading.Thread]):
+        self.thread = thread
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[Tuple[str, LabelSet], Histogram] = {}
+
+    def merge_into(self, counters: Dict[str, int], histograms: Dict[Tuple[str, LabelSet], Histogram]):
+        # dict()/list() copies are atomic under the GIL, so the owner may keep writing
+        for name, value in dict(self.counters).items():
+            counters[name] = counters.get(name, 0) + value
+        for key, histogram in dict(self.histograms).items():
+            if key in histograms:
+                histograms[key].merge(histogram)
+            else:
+                histograms[key] = histogram.copy()
 
 class Metrics:
-    """Simple metrics collector."""
-    
+    """
+    Simple metrics collector.
+    Each thread records into its own shard without locking; shards are merged
+    when metrics are read, and shards of finished threads are folded together.
+    """
+
     def __init__(self):
-        self._lock = threading.Lock()
-        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()  # Guards the shard list, not recording
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._retired = _Shard(None)
         self._gauges: Dict[str, float] = {}
         self._start_time = datetime.utcnow()
-    
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
     def increment(self, name: str, value: int = 1):
         """Increment a counter."""
-        with self._lock:
-            self._counters[name] = self._counters.get(name, 0) + value
-    
+        counters = self._shard().counters
+        counters[name] = counters.get(name, 0) + value
+
     def set_gauge(self, name: str, value: float):
         """Set a gauge value."""
+        self._gauges[name] = value  # Last write wins; a single dict store is atomic
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a value (e.g. a duration in ms) in the histogram for name and labels."""
+        histograms = self._shard().histograms
+        key = (name, label_set(labels))
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        """
+        Observe the duration of the block in milliseconds.
+        Yields the label dict so the block can adjust labels; if the block
+        raises, status is set to "error".
+        """
+        started = time.perf_counter()
+        try:
+            yield labels
+        except BaseException:
+            labels["status"] = "error"
+            raise
+        finally:
+            self.observe(name, (time.perf_counter() - started) * 1000, **labels)
+
+    def get_histogram(self, name: str, **labels) -> Dict[str, float]:
+        """Summary (count, sum, min, max, p50/p90/p99) of one histogram series."""
+        histogram = self.collect()[2].get((name, label_set(labels)))
+        return histogram.summary() if histogram else Histogram().summary()
+
+    def collect(self) -> Tuple[Dict[str, int], Dict[str, float], Dict[Tuple[str, LabelSet], Histogram]]:
+        """Merged copy of counters, gauges and histograms for exporters."""
+        counters: Dict[str, int] = {}
+        histograms: Dict[Tuple[str, LabelSet], Histogram] = {}
         with self._lock:
-            self._gauges[name] = value
-    
+            # Dead threads can no longer write, so their shards can be folded for good
+            live = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    live.append(shard)
+                else:
+                    shard.merge_into(self._retired.counters, self._retired.histograms)
+            self._shards = live
+            for shard in [self._retired] + live:
+                shard.merge_into(counters, histograms)
+        return counters, dict(self._gauges), histograms
+
+    def uptime_seconds(self) -> float:
+        return (datetime.utcnow() - self._start_time).total_seconds()
+
     def get_all(self) -> Dict[str, Any]:
         """Get all metrics."""
-        with self._lock:
-            uptime = (datetime.utcnow() - self._start_time).total_seconds()
-            return {
-                "uptime_seconds": uptime,
-                "counters": dict(self._counters),
-                "gauges": dict(self._gauges),
-            }
+        counters, gauges, histograms = self.collect()
+        return {
+            "uptime_seconds": self.uptime_seconds(),
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": {
+                series_name(name, labels): h.summary()
+                for (name, labels), h in histograms.items()
+            },
+        }
+
+def create_metrics() -> Metrics:
+    """In-process registry, or one shared by all workers when METRICS_MULTIPROC_DIR is set."""
+    directory = get_settings().METRICS_MULTIPROC_DIR
+    if not directory:
+        return Metrics()
+    from core.metrics_store import MultiProcessMetrics  # Imports this module
+    return MultiProcessMetrics(directory)
 
 # Global metrics instance
-metrics = Metrics()
+metrics = create_metrics()
 
 # Pre-defined metric names
 METRIC_REQUESTS_TOTAL = "requests_total"
@@ -45,3 +239,6 @@ METRIC_RATE_LIMITED = "rate_limited_total"
 METRIC_AGENT_RUNS = "agent_runs_total"
 METRIC_LLM_CALLS = "llm_calls_total"
 METRIC_DB_QUERIES = "db_queries_total"
+METRIC_REQUEST_DURATION = "http_request_duration_ms"
+METRIC_TOOL_DURATION = "tool_duration_ms"
+METRIC_MESSAGE_DURATION = "bot_message_duration_ms"
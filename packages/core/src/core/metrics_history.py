@@ -0,0 +1,162 @@
+"""
+Metrics History - Fixed-memory per-second and per-minute rollups of selected metrics.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from core.metrics import (
+    Metrics, Histogram, metrics,
+    METRIC_REQUESTS_TOTAL, METRIC_REQUESTS_FAILED, METRIC_RATE_LIMITED,
+    METRIC_REQUEST_DURATION, METRIC_TOOL_DURATION, METRIC_MESSAGE_DURATION,
+)
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SECOND = "second"
+MINUTE = "minute"
+
+HISTORY_COUNTERS = (METRIC_REQUESTS_TOTAL, METRIC_REQUESTS_FAILED, METRIC_RATE_LIMITED, "admission_shed_total")
+# Label sets are merged per name, so memory does not grow with routes or tools
+HISTORY_HISTOGRAMS = (METRIC_REQUEST_DURATION, METRIC_TOOL_DURATION, METRIC_MESSAGE_DURATION)
+
+class RingBuffer:
+    """`slots` time-stamped values, one per `step` seconds; the oldest slot is overwritten."""
+
+    def __init__(self, slots: int, step: int = 1):
+        self.step = step
+        self._times: List[Optional[int]] = [None] * slots
+        self._values: List[Any] = [None] * slots
+
+    def put(self, t: int, value: Any):
+        index = (t // self.step) % len(self._times)
+        self._times[index] = t
+        self._values[index] = value
+
+    def since(self, t: int) -> List[Tuple[int, Any]]:
+        """(timestamp, value) pairs recorded at or after t, oldest first."""
+        points = [(ts, v) for ts, v in zip(self._times, self._values) if ts is not None and ts >= t]
+        return sorted(points, key=lambda point: point[0])
+
+def _delta(current: Histogram, previous: Optional[Histogram]) -> Histogram:
+    """Observations recorded between two snapshots of a histogram."""
+    previous = previous or Histogram()
+    delta = Histogram()
+    delta.counts = [a - b for a, b in zip(current.counts, previous.counts)]
+    delta.count = current.count - previous.count
+    delta.sum = current.sum - previous.sum
+    nonzero = [i for i, n in enumerate(delta.counts) if n]
+    if nonzero:
+        # Only bucket bounds are known for the interval
+        delta.min = delta.upper_bound(nonzero[0] - 1) if nonzero[0] else 0.0
+        delta.max = min(delta.upper_bound(nonzero[-1]), current.max)
+    return delta
+
+def _point(histogram: Histogram) -> Dict[str, float]:
+    summary = histogram.summary()
+    return {k: summary[k] for k in ("count", "p50", "p90", "p99", "max")}
+
+class MetricsHistory:
+    """
+    Samples a registry once per second and keeps the last hour of history:
+    counter deltas and latency percentiles per second and per minute.
+    History is per process, even when the registry is shared between workers.
+    """
+
+    def __init__(
+        self,
+        registry: Metrics = metrics,
+        counters: Iterable[str] = HISTORY_COUNTERS,
+        histograms: Iterable[str] = HISTORY_HISTOGRAMS,
+        seconds: int = 3600,
+        minutes: int = 60,
+    ):
+        self.registry = registry
+        self.counters = tuple(counters)
+        self.histograms = tuple(histograms)
+        self._rings = {
+            SECOND: {name: RingBuffer(seconds) for name in self.counters + self.histograms},
+            MINUTE: {name: RingBuffer(minutes, 60) for name in self.counters + self.histograms},
+        }
+        self._lock = threading.Lock()
+        self._last_counters: Optional[Dict[str, int]] = None
+        self._last_histograms: Dict[str, Histogram] = {}
+        self._minute: Optional[int] = None
+        self._minute_counters: Dict[str, int] = {}
+        self._minute_histograms: Dict[str, Histogram] = {}
+        self._sampler: Optional[threading.Thread] = None
+
+    def _merged_histograms(self, histograms: Dict[Tuple[str, Any], Histogram]) -> Dict[str, Histogram]:
+        merged: Dict[str, Histogram] = {}
+        for (name, _), histogram in histograms.items():
+            if name in self.histograms:
+                if name in merged:
+                    merged[name].merge(histogram)
+                else:
+                    merged[name] = histogram.copy()
+        return merged
+
+    def _close_minute(self):
+        for name, value in self._minute_counters.items():
+            self._rings[MINUTE][name].put(self._minute, value)
+        for name, histogram in self._minute_histograms.items():
+            self._rings[MINUTE][name].put(self._minute, _point(histogram))
+        self._minute_counters = {}
+        self._minute_histograms = {}
+
+    def sample(self, now: Optional[float] = None):
+        """Record the change since the previous sample under second `now`."""
+        now = int(now if now is not None else time.time())
+        # Local totals only: a multi-process registry's collect() would lock and read every worker's file each second
+        counters, _, histograms = Metrics.collect(self.registry)
+        merged = self._merged_histograms(histograms)
+
+        with self._lock:
+            minute = now - now % 60
+            if self._minute is not None and minute != self._minute:
+                self._close_minute()
+            self._minute = minute
+
+            if self._last_counters is not None:
+                for name in self.counters:
+                    value = counters.get(name, 0)
+                    previous = self._last_counters.get(name, 0)
+                    delta = value - previous if value >= previous else value  # Counter reset
+                    self._rings[SECOND][name].put(now, delta)
+                    self._minute_counters[name] = self._minute_counters.get(name, 0) + delta
+                for name, histogram in merged.items():
+                    delta = _delta(histogram, self._last_histograms.get(name))
+                    self._rings[SECOND][name].put(now, _point(delta))
+                    if name in self._minute_histograms:
+                        self._minute_histograms[name].merge(delta)
+                    else:
+                        self._minute_histograms[name] = delta
+            self._last_counters = counters
+            self._last_histograms = merged
+
+    def query(self, resolution: str = SECOND, window_seconds: Optional[int] = None) -> Dict[str, Any]:
+        """History of every tracked series over the last window_seconds."""
+        if resolution not in self._rings:
+            raise ValueError(f"resolution must be '{SECOND}' or '{MINUTE}'")
+        window = window_seconds or (300 if resolution == SECOND else 3600)
+        since = int(time.time()) - window
+        with self._lock:
+            series = {name: ring.since(since) for name, ring in self._rings[resolution].items()}
+        return {"resolution": resolution, "window_seconds": window, "series": series}
+
+    def _run(self):
+        while True:
+            time.sleep(1 - time.time() % 1)  # Align samples to whole seconds
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"[Metrics] History sample failed: {e}")
+
+    def start(self):
+        """Sample from a daemon thread. Safe to call more than once."""
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._run, name="metrics-history", daemon=True)
+            self._sampler.start()
+
+# Global history of the global registry
+metrics_history = MetricsHistory()
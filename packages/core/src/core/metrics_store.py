@@ -0,0 +1,245 @@
+"""
+Metrics Store - mmap-backed metrics shared by all worker processes on a host.
+"""
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+from core.metrics import Metrics, Histogram, LabelSet
+import atexit
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FILE = "archive.db"
+LOCK_FILE = ".lock"
+
+_HEADER = struct.Struct("i4x")  # Bytes used, then padding to keep values 8-aligned
+_KEY_LEN = struct.Struct("i")
+_VALUE = struct.Struct("d")
+
+def _entry_size(key: bytes) -> int:
+    padded = len(key) + (-(_KEY_LEN.size + len(key)) % 8)
+    return _KEY_LEN.size + padded + _VALUE.size
+
+def _encode(kind: str, name: str, labels: LabelSet, index: int = -1) -> bytes:
+    return json.dumps([kind, name, labels, index], separators=(",", ":")).encode()
+
+def read_entries(path: str) -> Dict[bytes, float]:
+    """All key -> value entries of a store file (empty if missing)."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return {}
+    if len(data) < _HEADER.size:
+        return {}
+    used = _HEADER.unpack_from(data, 0)[0]
+    entries = {}
+    pos = _HEADER.size
+    while pos < used:
+        length = _KEY_LEN.unpack_from(data, pos)[0]
+        key = data[pos + _KEY_LEN.size:pos + _KEY_LEN.size + length]
+        size = _entry_size(key)
+        entries[key] = _VALUE.unpack_from(data, pos + size - _VALUE.size)[0]
+        pos += size
+    return entries
+
+class MmapFile:
+    """
+    Append-only key/value file with in-place float updates, one writer per file.
+    The used-bytes header is bumped only after an entry is complete, so
+    readers in other processes never see a half-written entry.
+    """
+
+    def __init__(self, path: str, initial_size: int = 64 * 1024):
+        self.path = path
+        self._file = open(path, "w+b")
+        self._file.truncate(initial_size)
+        self._mm = mmap.mmap(self._file.fileno(), initial_size)
+        self._used = _HEADER.size
+        _HEADER.pack_into(self._mm, 0, self._used)
+        self._positions: Dict[bytes, int] = {}
+
+    def _grow(self, needed: int):
+        size = len(self._mm)
+        while size < needed:
+            size *= 2
+        self._mm.close()
+        self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+
+    def write(self, key: bytes, value: float):
+        pos = self._positions.get(key)
+        if pos is not None:
+            _VALUE.pack_into(self._mm, pos, value)
+            return
+        size = _entry_size(key)
+        if self._used + size > len(self._mm):
+            self._grow(self._used + size)
+        _KEY_LEN.pack_into(self._mm, self._used, len(key))
+        self._mm[self._used + _KEY_LEN.size:self._used + _KEY_LEN.size + len(key)] = key
+        pos = self._used + size - _VALUE.size
+        _VALUE.pack_into(self._mm, pos, value)
+        self._positions[key] = pos
+        self._used += size
+        _HEADER.pack_into(self._mm, 0, self._used)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class _Totals:
+    """Counters, gauges and histograms rebuilt from store entries."""
+
+    def __init__(self):
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.histograms: Dict[Tuple[str, LabelSet], Histogram] = {}
+
+    def add(self, entries: Dict[bytes, float], with_gauges: bool = True):
+        for key, value in entries.items():
+            kind, name, labels, index = json.loads(key)
+            if kind == "c":
+                self.counters[name] = self.counters.get(name, 0) + value
+            elif kind == "g":
+                # Gauges are per-process states; report the busiest live worker
+                if with_gauges:
+                    self.gauges[name] = max(self.gauges.get(name, value), value)
+            else:
+                series = (name, tuple(tuple(pair) for pair in labels))
+                histogram = self.histograms.get(series)
+                if histogram is None:
+                    histogram = self.histograms[series] = Histogram()
+                if kind == "hb":
+                    histogram.counts[index] += int(value)
+                    histogram.count += int(value)
+                elif kind == "hs":
+                    histogram.sum += value
+                elif kind == "hmin":
+                    histogram.min = min(histogram.min, value)
+                elif kind == "hmax":
+                    histogram.max = max(histogram.max, value)
+
+    def entries(self) -> List[Tuple[bytes, float]]:
+        """Counter and histogram entries (not gauges), as written by a worker."""
+        rows = [(_encode("c", name, ()), value) for name, value in self.counters.items()]
+        for (name, labels), histogram in self.histograms.items():
+            rows += _histogram_entries(name, labels, histogram)
+        return rows
+
+def _histogram_entries(name: str, labels: LabelSet, histogram: Histogram) -> List[Tuple[bytes, float]]:
+    if not histogram.count:
+        return []
+    rows = [(_encode("hb", name, labels, i), n) for i, n in enumerate(histogram.counts) if n]
+    rows += [
+        (_encode("hs", name, labels), histogram.sum),
+        (_encode("hmin", name, labels), histogram.min),
+        (_encode("hmax", name, labels), histogram.max),
+    ]
+    return rows
+
+class MultiProcessMetrics(Metrics):
+    """
+    Metrics whose totals are shared through one mmap file per process in `directory`.
+    Recording stays in-process and lock-free; totals are flushed to the file every
+    `flush_interval` seconds and before every read. Reads aggregate all files, and
+    files of dead workers are folded into an archive so their counts survive.
+    """
+
+    def __init__(self, directory: str, flush_interval: float = 1.0):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._pid = os.getpid()
+        path = os.path.join(directory, f"{self._pid}.db")
+        with self._dir_lock():
+            if os.path.exists(path):
+                # Left by an exited worker whose pid we reuse; archive it rather than truncate it
+                archive = _Totals()
+                archive.add(read_entries(os.path.join(directory, ARCHIVE_FILE)), with_gauges=False)
+                self._archive(archive, [path])
+            self._store = MmapFile(path)
+        self._flush_lock = threading.Lock()
+        self._flusher = threading.Thread(target=self._flush_loop, args=(flush_interval,), name="metrics-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"[Metrics] Flush to {self.directory} failed: {e}")
+
+    def flush(self):
+        """Write this process's current totals to its store file."""
+        counters, gauges, histograms = super().collect()
+        with self._flush_lock:
+            for name, value in counters.items():
+                self._store.write(_encode("c", name, ()), value)
+            for name, value in gauges.items():
+                self._store.write(_encode("g", name, ()), value)
+            for (name, labels), histogram in histograms.items():
+                for key, value in _histogram_entries(name, labels, histogram):
+                    self._store.write(key, value)
+
+    @contextmanager
+    def _dir_lock(self) -> Iterator[None]:
+        """Exclusive lock on the directory, held while files are archived or read."""
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _fold_dead(self, archive: _Totals):
+        """Merge files of exited workers into the archive, then delete them. Caller holds the dir lock."""
+        dead = []
+        for filename in os.listdir(self.directory):
+            stem, ext = os.path.splitext(filename)
+            if ext == ".db" and stem.isdigit() and int(stem) != self._pid and not _pid_alive(int(stem)):
+                dead.append(os.path.join(self.directory, filename))
+        if dead:
+            self._archive(archive, dead)
+
+    def _archive(self, archive: _Totals, dead: List[str]):
+        """Add dead workers' files to archive (already holding archive.db), rewrite it and delete them."""
+        for path in dead:
+            archive.add(read_entries(path), with_gauges=False)
+        tmp = os.path.join(self.directory, f"{ARCHIVE_FILE}.{self._pid}.tmp")
+        writer = MmapFile(tmp)
+        for key, value in archive.entries():
+            writer.write(key, value)
+        writer.close()
+        os.replace(tmp, os.path.join(self.directory, ARCHIVE_FILE))
+        for path in dead:
+            os.remove(path)
+        logger.info(f"[Metrics] Archived metrics of {len(dead)} exited worker(s)")
+
+    def collect(self) -> Tuple[Dict[str, int], Dict[str, float], Dict[Tuple[str, LabelSet], Histogram]]:
+        """Totals across every worker process on this host."""
+        self.flush()
+        with self._dir_lock():
+            totals = _Totals()
+            totals.add(read_entries(os.path.join(self.directory, ARCHIVE_FILE)), with_gauges=False)
+            self._fold_dead(totals)
+            for filename in os.listdir(self.directory):
+                stem, ext = os.path.splitext(filename)
+                if ext == ".db" and stem.isdigit():
+                    totals.add(read_entries(os.path.join(self.directory, filename)))
+        counters = {name: int(v) if float(v).is_integer() else v for name, v in totals.counters.items()}
+        return counters, totals.gauges, totals.histograms
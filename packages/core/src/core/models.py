@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Boolean, ForeignKey, JSON, Index, Float
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from core.database import Base
@@ -87,6 +87,9 @@ class ApprovalRequest(Base):
 
 class Memory(Base):
     __tablename__ = "memories"
+    __table_args__ = (
+        Index("uq_memories_user_id_key", "user_id", "key", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -142,3 +145,10 @@ class ActiveRule(Base):
     user = relationship("User", backref="active_rules")
     proposal = relationship("ImprovementProposal", backref="rules")
 
+class SchedulerLease(Base):
+    """Time-limited lock held by one bot replica (scheduler leader or brief shard)."""
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(Float, nullable=False)  # Unix timestamp
@@ -0,0 +1,155 @@
+"""
+Prometheus - Text exposition of the metrics registry, plus an embedded HTTP endpoint.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+from core.metrics import Metrics, LabelSet, metrics
+from core.metrics_history import metrics_history, SECOND
+from core.loop_monitor import loop_monitor
+import gc
+import json
+import logging
+import math
+import os
+import re
+import resource
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_:]")
+
+def metric_name(name: str) -> str:
+    """Registry name made safe for Prometheus."""
+    name = _INVALID_NAME_CHARS.sub("_", name)
+    return "_" + name if name[:1].isdigit() else name
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(labels: LabelSet) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{metric_name(k)}="{_escape(v)}"' for k, v in labels) + "}"
+
+def _value(value: float) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(round(value, 6))
+    return str(value)
+
+def process_stats() -> Dict[str, Any]:
+    """RSS, open FDs, CPU time and GC activity of this process."""
+    stats: Dict[str, Any] = {"process_cpu_seconds_total": time.process_time()}
+    try:
+        with open("/proc/self/statm") as f:
+            stats["process_resident_memory_bytes"] = int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # No /proc (macOS): fall back to peak RSS, which is in bytes there and KiB elsewhere
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        stats["process_resident_memory_bytes"] = max_rss if sys.platform == "darwin" else max_rss * 1024
+    for fd_dir in ("/proc/self/fd", "/dev/fd"):
+        try:
+            stats["process_open_fds"] = len(os.listdir(fd_dir))
+            break
+        except OSError:
+            continue
+    stats["gc"] = gc.get_stats()
+    stats["gc_pending"] = gc.get_count()
+    return stats
+
+def _process_lines() -> List[str]:
+    stats = process_stats()
+    lines = []
+    for name in ("process_resident_memory_bytes", "process_open_fds"):
+        if name in stats:
+            lines += [f"# TYPE {name} gauge", f"{name} {stats[name]}"]
+    lines += ["# TYPE process_cpu_seconds_total counter", f"process_cpu_seconds_total {_value(stats['process_cpu_seconds_total'])}"]
+
+    for name, key in (("python_gc_collections_total", "collections"), ("python_gc_objects_collected_total", "collected")):
+        lines.append(f"# TYPE {name} counter")
+        lines += [f'{name}{{generation="{gen}"}} {s[key]}' for gen, s in enumerate(stats["gc"])]
+    lines.append("# TYPE python_gc_objects_pending gauge")
+    lines += [f'python_gc_objects_pending{{generation="{gen}"}} {n}' for gen, n in enumerate(stats["gc_pending"])]
+    return lines
+
+def render(registry: Metrics = metrics, include_process: bool = True) -> str:
+    """Registry in Prometheus text format (0.0.4)."""
+    counters, gauges, histograms = registry.collect()
+    lines = ["# TYPE process_uptime_seconds gauge", f"process_uptime_seconds {_value(registry.uptime_seconds())}"]
+
+    for name, value in sorted(counters.items()):
+        name = metric_name(name)
+        lines += [f"# TYPE {name} counter", f"{name} {_value(value)}"]
+    for name, value in sorted(gauges.items()):
+        name = metric_name(name)
+        lines += [f"# TYPE {name} gauge", f"{name} {_value(value)}"]
+
+    typed = set()
+    for (name, labels), histogram in sorted(histograms.items()):
+        name = metric_name(name)
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        for bound, count in histogram.export_buckets():
+            lines.append(f"{name}_bucket{_labels(labels + (('le', _value(bound)),))} {count}")
+        lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+        lines.append(f"{name}_sum{_labels(labels)} {_value(histogram.sum)}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+    if include_process:
+        lines += _process_lines()
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: Metrics = metrics
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/metrics/history":
+            query = parse_qs(url.query)
+            try:
+                window = int(query["window"][0]) if "window" in query else None
+                history = metrics_history.query(query.get("resolution", [SECOND])[0], window)
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            self._send(json.dumps(history).encode(), "application/json")
+        elif url.path == "/metrics/stalls":
+            stalls = {"threshold_ms": loop_monitor.threshold * 1000, "stalls": loop_monitor.top_stalls()}
+            self._send(json.dumps(stalls).encode(), "application/json")
+        elif url.path in ("/metrics", "/"):
+            self._send(render(self.registry).encode(), CONTENT_TYPE)
+        else:
+            self.send_error(404)
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the log
+
+def start_metrics_server(port: int, host: str = "127.0.0.1", registry: Metrics = metrics) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics, /metrics/history and /metrics/stalls from a daemon thread. Returns None if disabled (port 0) or the port is taken."""
+    if not port:
+        return None
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.error(f"[Metrics] Could not serve metrics on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"[Metrics] Serving Prometheus metrics on http://{host}:{server.server_port}/metrics")
+    return server
@@ -1,53 +1,239 @@
 """
-Rate Limiter - Simple in-memory rate limiting for message spam protection.
+Rate Limiter - Rate limiting for message spam protection, in memory or shared between processes.
 """
-from datetime import datetime, timedelta
-from typing import Dict, Tuple
+from typing import Dict, Hashable, List, Tuple
+from core.config import get_settings
+import asyncio
+import logging
+import math
+import sqlite3
 import threading
+import time
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+class _Bucket:
+    """Theoretical arrival time (GCRA) for one key."""
+    __slots__ = ("tat",)
+
+    def __init__(self, tat: float):
+        self.tat = tat
+
+class _Stripe:
+    """One lock and the buckets of the keys that hash to it."""
+    __slots__ = ("lock", "buckets", "next_sweep")
+
+    def __init__(self, next_sweep: float):
+        self.lock = threading.Lock()
+        self.buckets: Dict[Hashable, _Bucket] = {}
+        self.next_sweep = next_sweep
+
+_EPSILON = 1e-9  # Absorb float drift from repeated interval additions
 
 class RateLimiter:
-    """Simple token bucket rate limiter."""
-    
+    """
+    GCRA rate limiter: max_requests per window_seconds, allowing a burst of max_requests.
+    Each key stores one float; keys idle long enough to be back at full burst are swept.
+    Keys are spread over `stripes` independently locked shards (1 = a single global lock).
+    """
+
+    def __init__(self, max_requests: int = 10, window_seconds: int = 60, stripes: int = 1):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self._interval = window_seconds / max_requests
+        first_sweep = time.monotonic() + window_seconds
+        self._stripes = [_Stripe(first_sweep) for _ in range(stripes)]
+
+    def _stripe(self, key: Hashable) -> _Stripe:
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def _check(self, stripe: _Stripe, key: Hashable) -> Tuple[bool, int]:
+        """GCRA step for one key. Caller owns the stripe."""
+        now = time.monotonic()
+        if now >= stripe.next_sweep:
+            # Drop keys whose bucket has fully refilled
+            stripe.buckets = {k: b for k, b in stripe.buckets.items() if b.tat > now}
+            stripe.next_sweep = now + self.window_seconds
+
+        bucket = stripe.buckets.get(key)
+        tat = max(bucket.tat, now) if bucket else now
+        new_tat = tat + self._interval
+
+        # Over the limit once the next slot lies beyond the window
+        if new_tat - now > self.window_seconds + _EPSILON:
+            return False, 0
+
+        if bucket:
+            bucket.tat = new_tat
+        else:
+            stripe.buckets[key] = _Bucket(new_tat)
+        remaining = int((self.window_seconds - (new_tat - now)) / self._interval + _EPSILON)
+        return True, remaining
+
+    def _retry_after(self, stripe: _Stripe, key: Hashable) -> int:
+        bucket = stripe.buckets.get(key)
+        if bucket is None:
+            return 0
+        retry_after = bucket.tat + self._interval - self.window_seconds - time.monotonic()
+        return max(0, math.ceil(retry_after))
+
+    def is_allowed(self, user_id: str) -> Tuple[bool, int]:
+        """
+        Check if request is allowed for user.
+        Returns (allowed, remaining_requests).
+        """
+        stripe = self._stripe(user_id)
+        with stripe.lock:
+            return self._check(stripe, user_id)
+
+    def get_retry_after(self, user_id: str) -> int:
+        """Get seconds until next request is allowed."""
+        stripe = self._stripe(user_id)
+        with stripe.lock:
+            return self._retry_after(stripe, user_id)
+
+    def is_allowed_many(self, keys: List[str]) -> List[Tuple[bool, int]]:
+        """Check several keys at once, e.g. a user and a chat. Each key is charged if allowed."""
+        return [self.is_allowed(key) for key in keys]
+
+    def __len__(self) -> int:
+        return sum(len(s.buckets) for s in self._stripes)
+
+class StripedRateLimiter(RateLimiter):
+    """RateLimiter whose keys hash to one of N locks, so threads rarely wait on each other."""
+
+    def __init__(self, max_requests: int = 10, window_seconds: int = 60, stripes: int = 16):
+        super().__init__(max_requests, window_seconds, stripes)
+
+class AsyncRateLimiter(RateLimiter):
+    """
+    Lock-free RateLimiter for code running on one asyncio event loop.
+    Checks never await, so they are atomic with respect to other tasks and
+    never park the loop on a lock. Not safe to share across threads.
+    """
+
     def __init__(self, max_requests: int = 10, window_seconds: int = 60):
+        super().__init__(max_requests, window_seconds, stripes=1)
+
+    def is_allowed(self, user_id: str) -> Tuple[bool, int]:
+        """
+        Check if request is allowed for user.
+        Returns (allowed, remaining_requests).
+        """
+        return self._check(self._stripes[0], user_id)
+
+    def get_retry_after(self, user_id: str) -> int:
+        """Get seconds until next request is allowed."""
+        return self._retry_after(self._stripes[0], user_id)
+
+class SqliteRateLimiter:
+    """
+    GCRA limiter whose state lives in a SQLite file, so every worker process on
+    the host shares one limit. Each check is a single atomic UPSERT; wall-clock
+    time is used because monotonic clocks are per process.
+    """
+
+    # Charge the key only if the next slot still fits in the window; no row back means denied
+    _CHECK = (
+        "INSERT INTO rate_limits (key, tat) VALUES (:key, :now + :interval) "
+        "ON CONFLICT (key) DO UPDATE SET tat = max(tat, :now) + :interval "
+        "WHERE max(tat, :now) + :interval - :now <= :window + :epsilon "
+        "RETURNING tat"
+    )
+
+    def __init__(self, path: str, max_requests: int = 10, window_seconds: int = 60, namespace: str = ""):
+        self.path = path
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self._buckets: Dict[str, list] = {}
-        self._lock = threading.Lock()
-    
+        self.namespace = namespace
+        self._interval = window_seconds / max_requests
+        self._local = threading.local()
+        self._next_sweep = time.time() + window_seconds
+        self._conn().execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread connection in autocommit mode."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # Limiter state may lose the last writes on power loss
+            self._local.conn = conn
+        return conn
+
+    def _charge(self, conn: sqlite3.Connection, key: str, now: float) -> Tuple[bool, int]:
+        row = conn.execute(self._CHECK, {
+            "key": self.namespace + key,
+            "now": now,
+            "interval": self._interval,
+            "window": self.window_seconds,
+            "epsilon": _EPSILON,
+        }).fetchone()
+        if row is None:
+            return False, 0
+        remaining = int((self.window_seconds - (row[0] - now)) / self._interval + _EPSILON)
+        return True, remaining
+
+    def _maybe_sweep(self, conn: sqlite3.Connection, now: float):
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.window_seconds
+            conn.execute("DELETE FROM rate_limits WHERE tat <= ?", (now,))
+
     def is_allowed(self, user_id: str) -> Tuple[bool, int]:
         """
         Check if request is allowed for user.
         Returns (allowed, remaining_requests).
         """
-        with self._lock:
-            now = datetime.utcnow()
-            cutoff = now - timedelta(seconds=self.window_seconds)
-            
-            if user_id not in self._buckets:
-                self._buckets[user_id] = []
-            
-            # Remove old requests
-            self._buckets[user_id] = [t for t in self._buckets[user_id] if t > cutoff]
-            
-            current_count = len(self._buckets[user_id])
-            remaining = max(0, self.max_requests - current_count)
-            
-            if current_count >= self.max_requests:
-                return False, 0
-            
-            # Record this request
-            self._buckets[user_id].append(now)
-            return True, remaining - 1
-    
+        return self.is_allowed_many([user_id])[0]
+
+    def is_allowed_many(self, keys: List[str]) -> List[Tuple[bool, int]]:
+        """Check several keys in one write transaction."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._maybe_sweep(conn, now)
+            results = [self._charge(conn, key, now) for key in keys]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return results
+
     def get_retry_after(self, user_id: str) -> int:
         """Get seconds until next request is allowed."""
-        with self._lock:
-            if user_id not in self._buckets or not self._buckets[user_id]:
-                return 0
-            
-            oldest = min(self._buckets[user_id])
-            retry_after = (oldest + timedelta(seconds=self.window_seconds) - datetime.utcnow()).total_seconds()
-            return max(0, int(retry_after))
-
-# Global rate limiter instance
-message_rate_limiter = RateLimiter(max_requests=20, window_seconds=60)
+        row = self._conn().execute(
+            "SELECT tat FROM rate_limits WHERE key = ?", (self.namespace + user_id,)
+        ).fetchone()
+        if row is None:
+            return 0
+        return max(0, math.ceil(row[0] + self._interval - self.window_seconds - time.time()))
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT count(*) FROM rate_limits").fetchone()[0]
+
+def create_rate_limiter(max_requests: int, window_seconds: int, namespace: str, in_memory: type = StripedRateLimiter):
+    """Build the configured backend: in_memory (per process) or sqlite (shared on the host)."""
+    if settings.RATE_LIMIT_BACKEND == "sqlite":
+        try:
+            return SqliteRateLimiter(settings.RATE_LIMIT_SQLITE_PATH, max_requests, window_seconds, f"{namespace}:")
+        except sqlite3.Error as e:
+            logger.error(f"[RateLimit] Shared backend unavailable, using in-memory limits: {e}")
+    return in_memory(max_requests, window_seconds)
+
+async def check_async(limiter, user_id: str) -> Tuple[bool, int, int]:
+    """
+    (allowed, remaining, retry_after) from async code. The sqlite backend may
+    wait on the file lock, so it runs in a worker thread instead of on the loop.
+    """
+    def check():
+        allowed, remaining = limiter.is_allowed(user_id)
+        return allowed, remaining, 0 if allowed else limiter.get_retry_after(user_id)
+
+    if isinstance(limiter, SqliteRateLimiter):
+        return await asyncio.to_thread(check)
+    return check()
+
+# Global rate limiter instance (API workers may check it from several threads)
+message_rate_limiter = create_rate_limiter(max_requests=20, window_seconds=60, namespace="message")
@@ -1,21 +1,86 @@
 """
 Supabase Client - REST API connection to Supabase.
 """
-from supabase import create_client, Client
+from supabase import create_client, acreate_client, Client, AsyncClient, AsyncClientOptions
 from core.config import get_settings
+from core.tracing import start_span
 from functools import lru_cache
+from typing import Optional
+import asyncio
+import httpx
 import logging
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+def _start_request_span(request: httpx.Request):
+    request.extensions["span"] = start_span("supabase", method=request.method, path=request.url.path)
+
+def _end_request_span(response: httpx.Response):
+    request_span = response.request.extensions.get("span")
+    if request_span:
+        request_span.set(status=response.status_code)
+        request_span.end()
+
+async def _astart_request_span(request: httpx.Request):
+    _start_request_span(request)
+
+async def _aend_request_span(response: httpx.Response):
+    _end_request_span(response)
+
 @lru_cache()
 def get_supabase() -> Client:
     """Get Supabase client singleton."""
     if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
         raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
     
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+    client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+    # Time every PostgREST call as a span of the current request
+    client.postgrest.session.event_hooks["request"].append(_start_request_span)
+    client.postgrest.session.event_hooks["response"].append(_end_request_span)
+    return client
+
+_async_client: Optional[AsyncClient] = None
+_async_lock = asyncio.Lock()
+
+async def get_async_supabase() -> AsyncClient:
+    """
+    Get async Supabase client singleton.
+    All requests share one pooled HTTP/2 connection set.
+    """
+    global _async_client
+    if _async_client is not None:
+        return _async_client
+    
+    async with _async_lock:
+        if _async_client is None:
+            if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
+                raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
+            
+            http_client = httpx.AsyncClient(
+                http2=True,
+                follow_redirects=True,
+                timeout=settings.SUPABASE_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.SUPABASE_POOL_SIZE,
+                    max_keepalive_connections=settings.SUPABASE_POOL_SIZE,
+                ),
+                event_hooks={"request": [_astart_request_span], "response": [_aend_request_span]},
+            )
+            _async_client = await acreate_client(
+                settings.SUPABASE_URL,
+                settings.SUPABASE_KEY,
+                options=AsyncClientOptions(httpx_client=http_client),
+            )
+            logger.info(f"Async Supabase client ready (pool size {settings.SUPABASE_POOL_SIZE})")
+    return _async_client
+
+async def close_async_supabase():
+    """Close the shared async connection pool."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.options.httpx_client.aclose()
+        _async_client = None
 
 def init_tables():
     """Initialize tables in Supabase if they don't exist.
@@ -0,0 +1,213 @@
+"""
+Tracing - Lightweight spans carrying request_id across tasks, threads and subprocesses.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from core.config import get_settings
+from core.logging_config import (
+    BoundedQueueHandler, BatchingQueueListener, dumps, request_id_var, span_id_var, DROP_NEWEST,
+)
+import asyncio
+import atexit
+import functools
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+TRACE_ID_ENV = "AGENT_TRACE_ID"
+PARENT_SPAN_ENV = "AGENT_PARENT_SPAN_ID"
+
+class Span:
+    """One timed operation. trace_id is the request_id shared by every span of a request."""
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration", "attributes", "status", "thread_id")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, **attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.attributes: Dict[str, Any] = attributes
+        self.status = "ok"
+        self.thread_id = threading.get_ident()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self):
+        """Stop the clock and export. Extra calls are ignored."""
+        if self.duration is None:
+            self.duration = time.time() - self.start
+            export(self)
+
+    def to_event(self) -> Dict[str, Any]:
+        """Chrome trace-event ("X" complete event) form, as written by the exporter."""
+        return {
+            "name": self.name,
+            "ph": "X",
+            "ts": int(self.start * 1_000_000),
+            "dur": int((self.duration or 0) * 1_000_000),
+            "pid": os.getpid(),
+            "tid": self.thread_id,
+            "args": {
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "status": self.status,
+                **self.attributes,
+            },
+        }
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def _new_trace_id() -> str:
+    return str(uuid.uuid4())[:8]  # Same shape as set_request_id()
+
+def start_span(name: str, root: bool = False, **attributes) -> Span:
+    """
+    Span under the current one, not made current; call end() when done (e.g. from HTTP hooks).
+    root=True starts a new trace instead, e.g. for a scheduler job.
+    """
+    if root:
+        return Span(name, _new_trace_id(), None, **attributes)
+    parent = _current_span.get()
+    trace_id = request_id_var.get() or (parent.trace_id if parent else "") or _new_trace_id()
+    return Span(name, trace_id, parent.span_id if parent else None, **attributes)
+
+@contextmanager
+def span(name: str, root: bool = False, **attributes) -> Iterator[Span]:
+    """Time a block as a child of the current span. Starts a trace if root or there is no request_id yet."""
+    current = start_span(name, root, **attributes)
+    # A new trace's id doubles as request_id for logs inside the block
+    rid_token = request_id_var.set(current.trace_id) if root or not request_id_var.get() else None
+    token = _current_span.set(current)
+    span_token = span_id_var.set(current.span_id)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        span_id_var.reset(span_token)
+        _current_span.reset(token)
+        if rid_token is not None:
+            request_id_var.reset(rid_token)
+        current.end()
+
+def traced(name: Optional[str] = None, root: bool = False):
+    """Decorator form of span() for sync and async functions."""
+    def decorator(fn: Callable):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, root):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, root):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def wrap(fn: Callable) -> Callable:
+    """Bind fn to the caller's context, for executors that do not copy it (run_in_executor, submit)."""
+    context = copy_context()
+    return functools.partial(context.run, fn)
+
+def inject_env(env: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Environment for a subprocess (default: ours) carrying the trace and parent span."""
+    env = dict(os.environ if env is None else env)
+    trace_id = request_id_var.get()
+    parent = _current_span.get()
+    if trace_id or parent:
+        env[TRACE_ID_ENV] = trace_id or parent.trace_id
+    if parent:
+        env[PARENT_SPAN_ENV] = parent.span_id
+    return env
+
+def resume_from_env(environ: Optional[Dict[str, str]] = None) -> Optional[str]:
+    """In a child process, continue the trace passed by inject_env(). Returns the trace id."""
+    environ = os.environ if environ is None else environ
+    trace_id = environ.get(TRACE_ID_ENV)
+    if not trace_id:
+        return None
+    request_id_var.set(trace_id)
+    parent_id = environ.get(PARENT_SPAN_ENV)
+    if parent_id:
+        remote = Span("remote-parent", trace_id)
+        remote.span_id = parent_id
+        _current_span.set(remote)
+        span_id_var.set(parent_id)
+    return trace_id
+
+class _SpanFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return dumps(record.span)
+
+class JsonlSpanExporter:
+    """
+    Appends finished spans to a JSONL file, one Chrome trace event per line.
+    Uses the logging pipeline's bounded queue and batching listener, so the
+    write happens off the request path; when the queue is full new spans are dropped.
+    """
+
+    def __init__(self, path: str, queue_max: int = 10000, batch_size: int = 200):
+        self.path = path
+        sink = logging.FileHandler(path, encoding="utf-8")
+        sink.setFormatter(_SpanFormatter())
+        span_queue: queue.Queue = queue.Queue(maxsize=queue_max)
+        self._handler = BoundedQueueHandler(span_queue, DROP_NEWEST)
+        self._listener = BatchingQueueListener(span_queue, [sink], batch_size)
+        self._listener.start()
+
+    def export(self, finished: Span):
+        record = logging.makeLogRecord({"name": "trace", "levelno": logging.INFO, "msg": finished.name})
+        record.span = finished.to_event()
+        self._handler.handle(record)
+
+    def shutdown(self):
+        self._listener.stop()
+
+_exporter: Optional[JsonlSpanExporter] = None
+_exporter_lock = threading.Lock()
+
+def export(finished: Span):
+    """Send a finished span to the exporter configured by TRACE_EXPORT_PATH, if any."""
+    global _exporter
+    if not settings.TRACE_EXPORT_PATH:
+        return
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = JsonlSpanExporter(settings.TRACE_EXPORT_PATH)
+                atexit.register(_exporter.shutdown)
+    _exporter.export(finished)
+
+def load_chrome_trace(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Exported JSONL as a Chrome/Perfetto trace document ({"traceEvents": [...]})."""
+    with open(path, encoding="utf-8") as f:
+        return {"traceEvents": [json.loads(line) for line in f if line.strip()]}
+
+# Child processes started with inject_env() join their parent's trace
+resume_from_env()
+
+if __name__ == "__main__":
+    # python -m core.tracing spans.jsonl > trace.json, then open in Perfetto or chrome://tracing
+    json.dump(load_chrome_trace(sys.argv[1]), sys.stdout)
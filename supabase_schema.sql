@@ -77,8 +77,150 @@ CREATE TABLE IF NOT EXISTS active_rules (
 
 -- INDEXES
 CREATE INDEX idx_tasks_user_status ON tasks(user_id, status);
+CREATE INDEX IF NOT EXISTS idx_tasks_user_status_keyset ON tasks(user_id, status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_proposals_user_keyset ON improvement_proposals(user_id, created_at DESC, id DESC);
 CREATE INDEX idx_messages_user ON messages(user_id);
 CREATE INDEX idx_approval_user_status ON approval_requests(user_id, status);
+-- Upsert target. Older select-then-insert writes may have left duplicates: keep the newest row
+DELETE FROM memory older USING memory newer
+WHERE older.user_id = newer.user_id AND older.key = newer.key AND older.id < newer.id;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_memory_user_key ON memory(user_id, key);
+
+-- BRIEF SNAPSHOTS: open-task count and newest open tasks per user, kept current by a trigger
+-- on tasks so briefs are a single-row read. top_tasks holds up to 10 {id, title}, newest first.
+CREATE TABLE IF NOT EXISTS brief_snapshots (
+    user_id BIGINT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    open_count INTEGER NOT NULL DEFAULT 0,
+    top_tasks JSONB NOT NULL DEFAULT '[]',
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION brief_top_tasks(p_user_id BIGINT)
+RETURNS JSONB
+LANGUAGE sql STABLE AS $$
+    SELECT COALESCE(jsonb_agg(jsonb_build_object('id', t.id, 'title', t.title) ORDER BY t.created_at DESC, t.id DESC), '[]'::jsonb)
+    FROM (
+        SELECT id, title, created_at FROM tasks
+        WHERE user_id = p_user_id AND status = 'open'
+        ORDER BY created_at DESC, id DESC
+        LIMIT 10
+    ) t;
+$$;
+
+-- Full rebuild for one user; used for backfill and if a snapshot row is missing
+CREATE OR REPLACE FUNCTION refresh_brief_snapshot(p_user_id BIGINT)
+RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO brief_snapshots (user_id, open_count, top_tasks, updated_at)
+    VALUES (
+        p_user_id,
+        (SELECT count(*) FROM tasks WHERE user_id = p_user_id AND status = 'open'),
+        brief_top_tasks(p_user_id),
+        NOW()
+    )
+    ON CONFLICT (user_id) DO UPDATE SET
+        open_count = EXCLUDED.open_count,
+        top_tasks = EXCLUDED.top_tasks,
+        updated_at = EXCLUDED.updated_at;
+$$;
+
+-- Applies one task change as a delta: counts move by +/-1, and the top list is
+-- only re-read (10 rows off idx_tasks_user_status_keyset) when it may have changed.
+CREATE OR REPLACE FUNCTION apply_brief_snapshot_delta()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    was_open BOOLEAN := false;
+    is_open BOOLEAN := false;
+    uid BIGINT;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        was_open := OLD.status = 'open';
+        uid := OLD.user_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        is_open := NEW.status = 'open';
+        uid := NEW.user_id;
+    END IF;
+    IF NOT was_open AND NOT is_open THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        -- A new task is the newest one: prepend it and trim
+        UPDATE brief_snapshots SET
+            open_count = open_count + 1,
+            top_tasks = (
+                SELECT COALESCE(jsonb_agg(x.e ORDER BY x.n), '[]'::jsonb)
+                FROM jsonb_array_elements(
+                    jsonb_build_array(jsonb_build_object('id', NEW.id, 'title', NEW.title)) || top_tasks
+                ) WITH ORDINALITY AS x(e, n)
+                WHERE x.n <= 10
+            ),
+            updated_at = NOW()
+        WHERE user_id = uid;
+    ELSE
+        UPDATE brief_snapshots SET
+            open_count = open_count + is_open::int - was_open::int,
+            top_tasks = CASE
+                WHEN is_open OR top_tasks @> jsonb_build_array(jsonb_build_object('id', OLD.id))
+                THEN brief_top_tasks(uid)
+                ELSE top_tasks
+            END,
+            updated_at = NOW()
+        WHERE user_id = uid;
+    END IF;
+    -- No snapshot yet (new user, or the row was removed): count from scratch
+    IF NOT FOUND THEN
+        PERFORM refresh_brief_snapshot(uid);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tasks_brief_snapshot ON tasks;
+CREATE TRIGGER tasks_brief_snapshot
+AFTER INSERT OR UPDATE OF status, title OR DELETE ON tasks
+FOR EACH ROW EXECUTE FUNCTION apply_brief_snapshot_delta();
+
+-- Backfill snapshots for existing users
+SELECT refresh_brief_snapshot(id) FROM users;
+
+-- DAILY BRIEF: one page of users with open-task count and newest titles, read from brief_snapshots
+-- Users are paged by id (keyset), so each call costs the same however many users exist.
+-- user_ids limits the page to the users whose brief is due this minute.
+DROP FUNCTION IF EXISTS daily_brief_page(BIGINT, INT, INT);
+CREATE OR REPLACE FUNCTION daily_brief_page(
+    after_id BIGINT DEFAULT 0,
+    page_size INT DEFAULT 500,
+    top_n INT DEFAULT 5,
+    user_ids BIGINT[] DEFAULT NULL
+)
+RETURNS TABLE (
+    id BIGINT,
+    telegram_user_id TEXT,
+    name TEXT,
+    timezone TEXT,
+    created_at TIMESTAMPTZ,
+    open_count BIGINT,
+    top_titles TEXT[]
+)
+LANGUAGE sql STABLE AS $$
+    SELECT u.id, u.telegram_user_id, u.name, u.timezone, u.created_at,
+           COALESCE(s.open_count, 0)::BIGINT,
+           ARRAY(
+               SELECT x.e->>'title'
+               FROM jsonb_array_elements(s.top_tasks) WITH ORDINALITY AS x(e, n)
+               WHERE x.n <= top_n
+               ORDER BY x.n
+           )
+    FROM users u
+    LEFT JOIN brief_snapshots s ON s.user_id = u.id
+    WHERE u.id > after_id AND u.telegram_user_id IS NOT NULL
+      AND (user_ids IS NULL OR u.id = ANY(user_ids))
+    ORDER BY u.id
+    LIMIT page_size;
+$$;
 
 -- Enable Row Level Security (RLS)
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
@@ -87,6 +229,7 @@ ALTER TABLE messages ENABLE ROW LEVEL SECURITY;
 ALTER TABLE approval_requests ENABLE ROW LEVEL SECURITY;
 ALTER TABLE memory ENABLE ROW LEVEL SECURITY;
 ALTER TABLE improvement_proposals ENABLE ROW LEVEL SECURITY;
+ALTER TABLE brief_snapshots ENABLE ROW LEVEL SECURITY;
 ALTER TABLE active_rules ENABLE ROW LEVEL SECURITY;
 
 -- Policy: Allow all for anon (for bot usage)
@@ -97,4 +240,5 @@ CREATE POLICY "Allow all for anon" ON messages FOR ALL USING (true);
 CREATE POLICY "Allow all for anon" ON approval_requests FOR ALL USING (true);
 CREATE POLICY "Allow all for anon" ON memory FOR ALL USING (true);
 CREATE POLICY "Allow all for anon" ON improvement_proposals FOR ALL USING (true);
+CREATE POLICY "Allow all for anon" ON brief_snapshots FOR ALL USING (true);
 CREATE POLICY "Allow all for anon" ON active_rules FOR ALL USING (true);
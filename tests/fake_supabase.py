@@ -0,0 +1,191 @@
+"""
+In-memory stand-in for the supabase client, covering the query-builder calls crud uses.
+"""
+from types import SimpleNamespace
+import asyncio
+import re
+
+# Only the keyset shape crud builds: a.lt."v",and(a.eq."v",id.lt.N)
+KEYSET_OR = re.compile(r'(\w+)\.lt\."([^"]+)",and\(\w+\.eq\."[^"]+",(\w+)\.lt\.(\d+)\)')
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.columns = "*"
+        self.payload = None
+        self.filters = []
+        self.order_by = []
+        self.row_limit = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+        self.count = None
+        self.head = False
+
+    def select(self, columns="*", count=None, head=None):
+        self.columns = columns
+        self.count = count
+        self.head = bool(head)
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict="", ignore_duplicates=False):
+        self.op, self.payload = "upsert", payload
+        self.on_conflict = [c.strip() for c in on_conflict.split(",") if c.strip()]
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda r: r.get(column) is not None and r.get(column) > value)
+        return self
+
+    def in_(self, column, values):
+        values = list(values)
+        self.filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def or_(self, expression):
+        column, value, tie_column, tie_value = KEYSET_OR.fullmatch(expression).groups()
+        tie_value = int(tie_value)
+        self.filters.append(lambda r: r[column] < value or (r[column] == value and r[tie_column] < tie_value))
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def _match(self, row):
+        return all(f(row) for f in self.filters)
+
+    def _fire(self, old, new):
+        trigger = self.client.triggers.get(self.table)
+        if trigger:
+            trigger(self.client, old, new)
+
+    def _project(self, row):
+        if self.columns == "*":
+            return dict(row)
+        return {c.strip(): row.get(c.strip()) for c in self.columns.split(",")}
+
+    def execute(self):
+        self.client.calls.append((self.table, self.op))
+        rows = self.client.tables.setdefault(self.table, [])
+
+        if self.op == "select":
+            found = [r for r in rows if self._match(r)]
+            for column, desc in reversed(self.order_by):
+                found.sort(key=lambda r: r.get(column), reverse=desc)
+            total = len(found) if self.count else None
+            if self.row_limit is not None:
+                found = found[:self.row_limit]
+            data = [] if self.head else [self._project(r) for r in found]
+            return SimpleNamespace(data=data, count=total)
+
+        if self.op in ("insert", "upsert"):
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            data = []
+            for item in payload:
+                existing = None
+                if self.op == "upsert" and self.on_conflict:
+                    existing = next((r for r in rows if all(r.get(c) == item.get(c) for c in self.on_conflict)), None)
+                if existing is not None:
+                    if not self.ignore_duplicates:
+                        existing.update(item)
+                        data.append(dict(existing))
+                    continue
+                row = dict(item)
+                row.setdefault("id", self.client.next_id(self.table))
+                row.setdefault("created_at", self.client.tick())
+                rows.append(row)
+                data.append(dict(row))
+                self._fire(None, dict(row))
+            return SimpleNamespace(data=data)
+
+        if self.op == "update":
+            data = []
+            for r in rows:
+                if self._match(r):
+                    old = dict(r)
+                    r.update(self.payload)
+                    data.append(dict(r))
+                    self._fire(old, dict(r))
+            return SimpleNamespace(data=data)
+
+        if self.op == "delete":
+            data = [dict(r) for r in rows if self._match(r)]
+            self.client.tables[self.table] = [r for r in rows if not self._match(r)]
+            for old in data:
+                self._fire(old, None)
+            return SimpleNamespace(data=data)
+
+class FakeRpc:
+    def __init__(self, client, fn, params):
+        self.client = client
+        self.fn = fn
+        self.params = params
+
+    def execute(self):
+        self.client.calls.append((self.fn, "rpc"))
+        return SimpleNamespace(data=self.client.functions[self.fn](self.client, **self.params))
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+        self.functions = {}
+        self.triggers = {}  # table -> fn(client, old_row, new_row), run after each row change
+        self.calls = []
+        self._ids = {}
+        self._clock = 0
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, fn, params=None):
+        return FakeRpc(self, fn, params or {})
+
+    def next_id(self, table):
+        self._ids[table] = self._ids.get(table, 0) + 1
+        return self._ids[table]
+
+    def tick(self):
+        self._clock += 1
+        return f"2026-01-01T00:00:{self._clock:05d}"
+
+class FakeAsyncQuery(FakeQuery):
+    async def execute(self):
+        await asyncio.sleep(self.client.latency)
+        return super().execute()
+
+class FakeAsyncRpc(FakeRpc):
+    async def execute(self):
+        await asyncio.sleep(self.client.latency)
+        return super().execute()
+
+class FakeAsyncSupabase(FakeSupabase):
+    latency = 0.0  # Simulated round trip per request, in seconds
+
+    def table(self, name):
+        return FakeAsyncQuery(self, name)
+
+    def rpc(self, fn, params=None):
+        return FakeAsyncRpc(self, fn, params or {})
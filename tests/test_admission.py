@@ -0,0 +1,78 @@
+import asyncio
+import time
+from core.admission import AdmissionController, plan_cost, intent_cost, CHEAP, EXPENSIVE
+from core.metrics import metrics
+from core.parser import Intent
+
+def test_cost_classes():
+    assert intent_cost(Intent.ADD_TASK) == CHEAP
+    assert intent_cost(Intent.UNKNOWN) == EXPENSIVE
+    assert plan_cost({"steps": [{"tool": "task_tool"}]}) == CHEAP
+    assert plan_cost({"steps": [{"tool": "task_tool"}, {"tool": "vision_tool"}]}) == EXPENSIVE
+
+def test_sheds_expensive_when_llm_saturated():
+    controller = AdmissionController(max_inflight_llm=2, name="test_admission")
+    shed = metrics.get_all()["counters"].get("test_admission_shed_llm_total", 0)
+
+    with controller.llm_call(), controller.llm_call():
+        assert controller.overload_reason() == "llm"
+        assert not controller.admit(EXPENSIVE)
+        assert controller.admit(CHEAP)
+
+    assert controller.llm_inflight == 0
+    assert controller.admit(EXPENSIVE)
+    assert metrics.get_all()["counters"]["test_admission_shed_llm_total"] == shed + 1
+
+def test_executor_pending_tracked():
+    controller = AdmissionController(max_executor_pending=2)
+
+    async def scenario():
+        jobs = [asyncio.ensure_future(controller.to_thread(time.sleep, 0.1)) for _ in range(2)]
+        await asyncio.sleep(0.02)
+        busy = controller.overload_reason()
+        await asyncio.gather(*jobs)
+        return busy
+
+    assert asyncio.run(scenario()) == "executor"
+    assert controller.executor_pending == 0
+
+def test_loop_lag_detected():
+    controller = AdmissionController(max_loop_lag_ms=50)
+
+    async def scenario():
+        controller.start_lag_monitor(interval=0.01)
+        await asyncio.sleep(0.02)
+        for _ in range(3):
+            time.sleep(0.15)  # Block the loop
+            await asyncio.sleep(0.001)  # Let the monitor take its sample
+        return controller.overload_reason()
+
+    assert asyncio.run(scenario()) == "loop_lag"
+
+def test_cheap_work_queues_until_load_clears():
+    controller = AdmissionController(max_inflight_llm=1, queue_timeout_ms=1000, name="test_admission_queue")
+
+    async def scenario():
+        with controller.llm_call():
+            waiter = asyncio.ensure_future(controller.admit_async(CHEAP))
+            await asyncio.sleep(0.1)
+            queued = controller.queued
+            shed_expensive = not await controller.admit_async(EXPENSIVE)
+        return queued, shed_expensive, await waiter
+
+    assert asyncio.run(scenario()) == (1, True, True)
+    assert controller.queued == 0
+    assert metrics.get_all()["counters"]["test_admission_queue_admitted_after_queue_total"] == 1
+
+def test_cheap_work_shed_when_queue_full_or_wait_times_out():
+    controller = AdmissionController(max_inflight_llm=1, max_queued=1, queue_timeout_ms=100, name="test_admission_full")
+
+    async def scenario():
+        with controller.llm_call():
+            return await asyncio.gather(controller.admit_async(CHEAP), controller.admit_async(CHEAP))
+
+    assert asyncio.run(scenario()) == [False, False]
+    counters = metrics.get_all()["counters"]
+    assert counters["test_admission_full_shed_queue_full_total"] == 1
+    assert counters["test_admission_full_shed_queue_timeout_total"] == 1
+    assert controller.state()["queued"] == 0
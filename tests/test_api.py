@@ -0,0 +1,61 @@
+import os
+import sys
+import types
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient  # noqa: E402
+from core import tracing  # noqa: E402
+from core.db import async_crud, crud  # noqa: E402
+from core.tracing import span  # noqa: E402
+from fake_supabase import FakeAsyncSupabase  # noqa: E402
+
+API_SRC = os.path.join(os.path.dirname(__file__), "..", "apps", "api", "src")
+
+def fake_agent_loop(text, user_id, db):
+    # Stands in for core.agent.loop (desktop tools need a display); opens the spans a run would
+    with span("agent.loop"):
+        with span("tool.task_tool"):
+            pass
+    return {"response": "ok", "run_id": 1}
+
+@pytest.fixture
+def api(monkeypatch):
+    loop_module = types.ModuleType("core.agent.loop")
+    loop_module.run_agent_loop = fake_agent_loop
+    monkeypatch.setitem(sys.modules, "core.agent.loop", loop_module)
+    monkeypatch.syspath_prepend(API_SRC)
+    monkeypatch.delitem(sys.modules, "main", raising=False)
+    import main
+
+    fake = FakeAsyncSupabase()
+
+    async def get_async_supabase():
+        return fake
+
+    monkeypatch.setattr(async_crud, "get_async_supabase", get_async_supabase)
+    monkeypatch.setattr(crud.message_log_buffer, "put", lambda row: None)
+    crud._user_cache.clear()
+    main.app.dependency_overrides[main.get_db] = lambda: None
+    return main
+
+@pytest.fixture
+def finished(monkeypatch):
+    spans = []
+    monkeypatch.setattr(tracing, "export", spans.append)
+    return spans
+
+def test_message_request_spans_share_one_trace(api, finished):
+    client = TestClient(api.app)
+    response = client.post(
+        "/v1/message",
+        json={"telegram_user_id": "42", "text": "add task buy milk"},
+        headers={"X-Request-ID": "req-api-1"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["request_id"] == "req-api-1"
+    assert response.headers["X-Request-ID"] == "req-api-1"
+    names = [s.name for s in finished]
+    assert {"agent.loop", "tool.task_tool", "POST /v1/message"} <= set(names)
+    assert {s.trace_id for s in finished} == {"req-api-1"}
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+import time
+from core.db import async_crud, crud
+from fake_supabase import FakeAsyncSupabase
+
+@pytest.fixture
+def supabase(monkeypatch):
+    fake = FakeAsyncSupabase()
+
+    async def get_async_supabase():
+        return fake
+
+    monkeypatch.setattr(async_crud, "get_async_supabase", get_async_supabase)
+    crud._user_cache.clear()
+    crud._open_task_cache.clear()
+    return fake
+
+def test_get_or_create_user_shares_sync_cache(supabase):
+    user = asyncio.run(async_crud.get_or_create_user("321", "Budi"))
+    assert user["name"] == "Budi"
+    assert crud._user_cache.get("321") == user
+
+def test_task_lifecycle(supabase):
+    async def scenario():
+        task = await async_crud.create_task(1, "beli matcha")
+        assert [t["title"] for t in await async_crud.get_tasks_by_user(1, "open")] == ["beli matcha"]
+        assert await async_crud.close_task(task["id"], 1)
+        assert await async_crud.get_tasks_by_user(1, "open") == []
+        assert await async_crud.delete_task(task["id"], 1)
+
+    asyncio.run(scenario())
+
+def test_concurrent_calls_do_not_serialize(supabase):
+    supabase.latency = 0.05
+    n = 20
+
+    async def scenario():
+        return await asyncio.gather(*[async_crud.create_task(1, f"task {i}") for i in range(n)])
+
+    started = time.perf_counter()
+    tasks = asyncio.run(scenario())
+    elapsed = time.perf_counter() - started
+    assert len({t["id"] for t in tasks}) == n
+    # Overlapping round trips take about one latency; back to back would take n of them
+    assert elapsed < supabase.latency * n / 4
+
+def daily_brief_page(client, after_id=0, page_size=500, top_n=5, user_ids=None):
+    """Python version of the daily_brief_page SQL function."""
+    users = sorted(
+        (u for u in client.tables.get("users", []) if u["id"] > after_id and (user_ids is None or u["id"] in user_ids)),
+        key=lambda u: u["id"],
+    )
+    page = []
+    for user in users[:page_size]:
+        open_tasks = [t for t in client.tables.get("tasks", []) if t["user_id"] == user["id"] and t["status"] == "open"]
+        open_tasks.sort(key=lambda t: (t["created_at"], t["id"]), reverse=True)
+        page.append({**user, "open_count": len(open_tasks), "top_titles": [t["title"] for t in open_tasks[:top_n]]})
+    return page
+
+def test_iter_daily_brief_pages(supabase):
+    supabase.functions["daily_brief_page"] = daily_brief_page
+    supabase.tables["users"] = [{"id": i, "telegram_user_id": str(i)} for i in range(1, 6)]
+
+    async def scenario():
+        for i in range(7):
+            await async_crud.create_task(2, f"task {i}")
+        return [page async for page in async_crud.iter_daily_brief_pages(page_size=2, top_n=5)]
+
+    pages = asyncio.run(scenario())
+    assert [[row["id"] for row in page] for page in pages] == [[1, 2], [3, 4], [5]]
+    assert pages[0][1]["open_count"] == 7
+    assert pages[0][1]["top_titles"] == ["task 6", "task 5", "task 4", "task 3", "task 2"]
+    assert [op for _, op in supabase.calls].count("rpc") == 3
+
+def test_daily_brief_pages_for_due_users(supabase):
+    supabase.functions["daily_brief_page"] = daily_brief_page
+    supabase.tables["users"] = [{"id": i, "telegram_user_id": str(i)} for i in range(1, 6)]
+
+    async def scenario():
+        return [page async for page in async_crud.iter_daily_brief_pages(page_size=2, top_n=5, user_ids=[4, 2])]
+
+    pages = asyncio.run(scenario())
+    assert [[row["id"] for row in page] for page in pages] == [[2, 4]]
+
+def test_get_users_page(supabase):
+    supabase.tables["users"] = [{"id": i, "telegram_user_id": str(i), "timezone": "UTC"} for i in range(1, 6)]
+
+    page = asyncio.run(async_crud.get_users_page(after_id=2, page_size=2))
+    assert page == [{"id": 3, "timezone": "UTC"}, {"id": 4, "timezone": "UTC"}]
@@ -0,0 +1,41 @@
+from datetime import date
+from core.brief_schedule import BriefSchedule, utc_minute
+
+def test_utc_minute_applies_offset():
+    # Asia/Makassar is UTC+8
+    assert utc_minute("Asia/Makassar", "07:30", date(2026, 1, 15)) == (23 * 60 + 30)
+    assert utc_minute("UTC", "07:30", date(2026, 1, 15)) == 7 * 60 + 30
+
+def test_utc_minute_follows_dst():
+    winter = utc_minute("Europe/Berlin", "08:00", date(2026, 1, 15))
+    summer = utc_minute("Europe/Berlin", "08:00", date(2026, 7, 15))
+    assert winter == 7 * 60
+    assert summer == 6 * 60
+
+def test_utc_minute_falls_back_on_bad_input():
+    assert utc_minute("Not/AZone", "bogus", date(2026, 1, 15)) == utc_minute("Asia/Makassar", "07:30", date(2026, 1, 15))
+
+def test_set_user_moves_between_buckets():
+    schedule = BriefSchedule()
+    on = date(2026, 1, 15)
+    schedule.set_user(1, "UTC", "07:30", on)
+    schedule.set_user(2, "UTC", "07:30", on)
+    assert schedule.due(450) == {1, 2}
+
+    schedule.set_user(1, "UTC", "09:00", on)
+    assert schedule.due(450) == {2}
+    assert schedule.due(540) == {1}
+
+    schedule.remove_user(2)
+    assert schedule.due(450) == set()
+    assert len(schedule) == 1
+
+def test_next_due_minute_wraps():
+    schedule = BriefSchedule()
+    on = date(2026, 1, 15)
+    assert schedule.next_due_minute(0) is None
+
+    schedule.load([(1, "UTC", "07:30"), (2, "UTC", "20:00")], on)
+    assert schedule.next_due_minute(0) == 450
+    assert schedule.next_due_minute(450) == 1200
+    assert schedule.next_due_minute(1200) == 450
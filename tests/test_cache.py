@@ -0,0 +1,60 @@
+"""
+Unit tests for in-process caches and invalidation bus.
+"""
+import threading
+import time
+from core.cache import TTLCache, InvalidationBus
+
+class TestTTLCache:
+
+    def test_get_set(self):
+        cache = TTLCache(max_size=10, ttl_seconds=60)
+        assert cache.get(1) is None
+        cache.set(1, {"brief_time": "07:30"})
+        assert cache.get(1) == {"brief_time": "07:30"}
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_expiry(self):
+        cache = TTLCache(max_size=10, ttl_seconds=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        cache = TTLCache(max_size=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_delete(self):
+        cache = TTLCache()
+        cache.set("a", 1)
+        assert cache.delete("a") is True
+        assert cache.delete("a") is False
+
+class TestInvalidationBus:
+
+    def test_publish_reaches_other_bus(self):
+        received = threading.Event()
+        keys = []
+
+        listener = InvalidationBus(port=47299)
+        listener.subscribe("preferences", lambda key: (keys.append(key), received.set()))
+        assert listener.start()
+
+        publisher = InvalidationBus(port=47299)
+        publisher.publish("preferences", 42)
+
+        assert received.wait(2)
+        assert keys == ["42"]
+
+    def test_disabled_bus_is_noop(self):
+        bus = InvalidationBus(port=0)
+        bus.publish("preferences", 1)
+        assert bus.start() is False
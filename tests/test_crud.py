@@ -0,0 +1,250 @@
+import pytest
+from core.db import crud
+from fake_supabase import FakeSupabase, FakeQuery
+
+@pytest.fixture
+def supabase(monkeypatch):
+    fake = FakeSupabase()
+    monkeypatch.setattr(crud, "get_supabase", lambda: fake)
+    crud._user_cache.clear()
+    crud._user_preference_cache.clear()
+    crud._open_task_cache.clear()
+    return fake
+
+def test_get_or_create_user_cached(supabase):
+    user = crud.get_or_create_user("555", "Ana")
+    assert user["name"] == "Ana"
+
+    calls = len(supabase.calls)
+    assert crud.get_or_create_user("555")["id"] == user["id"]
+    assert len(supabase.calls) == calls
+
+def test_get_or_create_user_lost_race(supabase, monkeypatch):
+    # Another process inserts the user right after our select misses
+    original_execute = FakeQuery.execute
+
+    def execute(query):
+        result = original_execute(query)
+        if query.table == "users" and query.op == "select" and not supabase.tables.get("raced"):
+            supabase.tables["raced"] = True
+            supabase.tables["users"].append({"id": 7, "telegram_user_id": "777", "name": "Other"})
+        return result
+
+    monkeypatch.setattr(FakeQuery, "execute", execute)
+    user = crud.get_or_create_user("777", "Me")
+
+    assert user["id"] == 7
+    assert len(supabase.tables["users"]) == 1
+
+def test_warm_user_cache(supabase):
+    supabase.tables["users"] = [{"id": i, "telegram_user_id": str(i), "created_at": str(i)} for i in range(1, 4)]
+    assert crud.warm_user_cache(["1", "3"]) == 2
+
+    calls = len(supabase.calls)
+    assert crud.get_user_by_telegram_id("3")["id"] == 3
+    assert len(supabase.calls) == calls
+
+def test_user_created_callbacks_only_for_new_users(supabase, monkeypatch):
+    created = []
+    monkeypatch.setattr(crud, "_user_created_callbacks", [created.append])
+    supabase.tables["users"] = [{"id": 7, "telegram_user_id": "700", "timezone": "UTC"}]
+
+    crud.get_or_create_user("700")
+    user = crud.get_or_create_user("800", "Sari")
+    assert created == [user]
+
+def test_set_user_preferences_single_upsert(supabase):
+    crud.set_user_preferences(1, {"brief_time": "06:00", "brief_format": "compact"})
+    crud.set_user_preference(1, "brief_time", "07:00")
+
+    assert [op for _, op in supabase.calls] == ["upsert", "upsert"]
+    assert crud.get_user_preferences(1) == {"brief_time": "07:00", "brief_format": "compact"}
+
+def test_log_message_bulk_insert(supabase):
+    crud.log_message(1, "hello", "telegram")
+    crud.log_message(1, "hi there", "agent")
+    crud.message_log_buffer.flush()
+
+    assert supabase.calls == [("messages", "insert")]
+    assert [m["text"] for m in supabase.tables["messages"]] == ["hello", "hi there"]
+
+def test_tasks_keyset_pagination(supabase):
+    for i in range(5):
+        crud.create_task(1, f"task {i}")
+    crud.create_task(2, "someone else")
+
+    # Open tasks: the first page fills the cache, later pages are cut from it
+    first = crud.get_tasks_by_user(1, "open", columns="title", limit=2)
+    assert [t["title"] for t in first] == ["task 4", "task 3"]
+    assert set(first[0]) == {"title", "id", "created_at"}
+
+    cursor = crud.next_cursor(first, 2)
+    second = crud.get_tasks_by_user(1, "open", columns="title", limit=2, after=cursor)
+    assert [t["title"] for t in second] == ["task 2", "task 1"]
+
+    third = crud.get_tasks_by_user(1, "open", limit=2, after=crud.next_cursor(second, 2))
+    assert [t["title"] for t in third] == ["task 0"]
+    assert crud.next_cursor(third, 2) is None
+
+def test_open_tasks_keyset_pagination_over_cache_cap(supabase, monkeypatch):
+    monkeypatch.setattr(crud.settings, "TASK_CACHE_MAX_TASKS", 2)
+    for i in range(5):
+        crud.create_task(1, f"task {i}")
+
+    first = crud.get_tasks_by_user(1, "open", columns="title", limit=2)
+    second = crud.get_tasks_by_user(1, "open", columns="title", limit=2, after=crud.next_cursor(first, 2))
+    assert [t["title"] for t in first + second] == ["task 4", "task 3", "task 2", "task 1"]
+    assert supabase.calls[-1] == ("tasks", "select")
+
+def test_all_tasks_keyset_pagination(supabase):
+    for i in range(5):
+        crud.create_task(1, f"task {i}")
+    crud.create_task(2, "someone else")
+
+    # No status filter, so this goes to the database rather than the open-task cache
+    first = crud.get_tasks_by_user(1, None, columns="title", limit=2)
+    assert [t["title"] for t in first] == ["task 4", "task 3"]
+    assert set(first[0]) == {"title", "id", "created_at"}
+
+    cursor = crud.next_cursor(first, 2)
+    second = crud.get_tasks_by_user(1, None, columns="title", limit=2, after=cursor)
+    assert [t["title"] for t in second] == ["task 2", "task 1"]
+
+    third = crud.get_tasks_by_user(1, None, limit=2, after=crud.next_cursor(second, 2))
+    assert [t["title"] for t in third] == ["task 0"]
+    assert crud.next_cursor(third, 2) is None
+
+def test_count_tasks_by_user(supabase):
+    for i in range(3):
+        crud.create_task(1, f"task {i}")
+    crud.close_task(1, 1)
+    assert crud.count_tasks_by_user(1, "open") == 2
+    assert crud.count_tasks_by_user(1) == 3
+
+def test_open_task_cache_served_without_network(supabase):
+    crud.create_task(1, "a")
+    crud.get_tasks_by_user(1, "open")  # fills the cache
+
+    calls = len(supabase.calls)
+    crud.create_task(1, "b")
+    assert len(supabase.calls) == calls + 1  # only the insert
+
+    calls = len(supabase.calls)
+    assert [t["title"] for t in crud.get_tasks_by_user(1, "open", columns="title")] == ["b", "a"]
+    assert crud.count_tasks_by_user(1, "open") == 2
+    assert len(supabase.calls) == calls
+
+def test_open_task_cache_updated_by_close_and_delete(supabase):
+    a = crud.create_task(1, "a")
+    b = crud.create_task(1, "b")
+    c = crud.create_task(1, "c")
+    crud.get_tasks_by_user(1, "open")
+
+    crud.close_task(a["id"], 1)
+    crud.delete_task(b["id"], 1)
+    assert [t["id"] for t in crud.get_tasks_by_user(1, "open")] == [c["id"]]
+    assert crud.close_task(999, 1) is None
+
+def test_open_task_fill_racing_a_create_is_not_cached(supabase, monkeypatch):
+    crud.create_task(1, "a")
+    fill_query = crud.open_tasks_query
+
+    class RacingQuery:
+        def __init__(self, query):
+            self.query = query
+
+        def execute(self):
+            result = self.query.execute()
+            crud.create_task(1, "b")  # Lands after the read, before the cache is filled
+            return result
+
+    monkeypatch.setattr(crud, "open_tasks_query", lambda client, user_id: RacingQuery(fill_query(client, user_id)))
+    assert [t["title"] for t in crud.get_tasks_by_user(1, "open")] == ["a"]
+    assert crud._open_task_cache.peek(1) is None
+
+    monkeypatch.setattr(crud, "open_tasks_query", fill_query)
+    assert [t["title"] for t in crud.get_tasks_by_user(1, "open")] == ["b", "a"]
+
+def test_open_task_cache_skips_users_over_cap(supabase, monkeypatch):
+    monkeypatch.setattr(crud.settings, "TASK_CACHE_MAX_TASKS", 2)
+    for i in range(3):
+        crud.create_task(1, f"task {i}")
+
+    assert len(crud.get_tasks_by_user(1, "open")) == 3
+    assert crud._open_task_cache.peek(1) is crud._TOO_MANY_TASKS
+
+BRIEF_SNAPSHOT_SIZE = 10
+
+def brief_top_tasks(client, user_id):
+    """Python version of the brief_top_tasks SQL function."""
+    open_tasks = [t for t in client.tables.get("tasks", []) if t["user_id"] == user_id and t["status"] == "open"]
+    open_tasks.sort(key=lambda t: (t["created_at"], t["id"]), reverse=True)
+    return [{"id": t["id"], "title": t["title"]} for t in open_tasks[:BRIEF_SNAPSHOT_SIZE]]
+
+def refresh_brief_snapshot(client, user_id):
+    """Python version of the refresh_brief_snapshot SQL function."""
+    snapshots = client.tables.setdefault("brief_snapshots", [])
+    snapshots[:] = [s for s in snapshots if s["user_id"] != user_id]
+    open_count = sum(1 for t in client.tables.get("tasks", []) if t["user_id"] == user_id and t["status"] == "open")
+    snapshots.append({"user_id": user_id, "open_count": open_count, "top_tasks": brief_top_tasks(client, user_id)})
+
+def apply_brief_snapshot_delta(client, old, new):
+    """Python version of the apply_brief_snapshot_delta trigger."""
+    was_open = old is not None and old["status"] == "open"
+    is_open = new is not None and new["status"] == "open"
+    if not was_open and not is_open:
+        return
+    uid = (new or old)["user_id"]
+    snapshot = next((s for s in client.tables.get("brief_snapshots", []) if s["user_id"] == uid), None)
+    if snapshot is None:
+        refresh_brief_snapshot(client, uid)
+    elif old is None:
+        snapshot["open_count"] += 1
+        snapshot["top_tasks"] = ([{"id": new["id"], "title": new["title"]}] + snapshot["top_tasks"])[:BRIEF_SNAPSHOT_SIZE]
+    else:
+        snapshot["open_count"] += is_open - was_open
+        if is_open or any(t["id"] == old["id"] for t in snapshot["top_tasks"]):
+            snapshot["top_tasks"] = brief_top_tasks(client, uid)
+
+def test_brief_snapshot_deltas_match_full_rebuild(supabase):
+    supabase.triggers["tasks"] = apply_brief_snapshot_delta
+
+    tasks = [crud.create_task(1, f"task {i}") for i in range(12)]
+    snapshot = crud.get_brief_snapshot(1)
+    assert snapshot["open_count"] == 12
+    # Newest first, trimmed to the snapshot size
+    assert [t["title"] for t in snapshot["top_tasks"]] == [f"task {i}" for i in range(11, 1, -1)]
+
+    crud.close_task(tasks[11]["id"], 1)  # In the top list: re-read, task 1 moves up
+    crud.close_task(tasks[0]["id"], 1)   # Outside it: only the count moves
+    crud.delete_task(tasks[5]["id"], 1)
+    supabase.table("tasks").update({"status": "open"}).eq("id", tasks[11]["id"]).execute()
+    assert crud.get_brief_snapshot(1) == {
+        "open_count": crud.count_tasks_by_user(1, "open"),
+        "top_tasks": brief_top_tasks(supabase, 1),
+    }
+
+def test_brief_snapshot_missing_row_is_rebuilt(supabase):
+    supabase.triggers["tasks"] = apply_brief_snapshot_delta
+    for i in range(3):
+        crud.create_task(2, f"task {i}")
+
+    supabase.tables["brief_snapshots"] = []
+    assert crud.get_brief_snapshot(2) == {"open_count": 0, "top_tasks": []}
+
+    # The next change recounts from scratch instead of starting at one
+    crud.create_task(2, "task 3")
+    snapshot = crud.get_brief_snapshot(2)
+    assert snapshot["open_count"] == 4
+    assert [t["title"] for t in snapshot["top_tasks"]] == ["task 3", "task 2", "task 1", "task 0"]
+
+def test_brief_snapshot_single_read(supabase):
+    top_tasks = [{"id": i, "title": f"task {i}"} for i in range(12, 2, -1)]
+    supabase.tables["brief_snapshots"] = [{"user_id": 1, "open_count": 42, "top_tasks": top_tasks}]
+
+    snapshot = crud.get_brief_snapshot(1)
+    assert snapshot == {"open_count": 42, "top_tasks": top_tasks}
+    assert supabase.calls == [("brief_snapshots", "select")]
+
+def test_brief_snapshot_defaults_when_missing(supabase):
+    assert crud.get_brief_snapshot(9) == {"open_count": 0, "top_tasks": []}
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from datetime import timedelta
+from core.fanout import AsyncTokenBucket, FanoutSender, retry_after_seconds
+from core.metrics import metrics
+
+class FloodError(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Flood control exceeded")
+        self.retry_after = retry_after
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(FloodError(2)) == 2.0
+    assert retry_after_seconds(FloodError(timedelta(milliseconds=500))) == 0.5
+    assert retry_after_seconds(ValueError("boom")) is None
+
+def test_token_bucket_limits_rate():
+    async def scenario():
+        bucket = AsyncTokenBucket(rate=100, burst=10)
+        started = time.monotonic()
+        for _ in range(30):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # 10 from the burst, 20 more at 100/s
+    assert 0.15 <= asyncio.run(scenario()) < 0.5
+
+def test_sends_concurrently():
+    in_flight = []
+    peak = []
+
+    async def send(chat_id, text):
+        in_flight.append(chat_id)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.02)
+        in_flight.remove(chat_id)
+
+    async def scenario():
+        sender = FanoutSender(send, AsyncTokenBucket(rate=1000), concurrency=10, per_chat_interval=0)
+        return await sender.send_all([(i, "hi") for i in range(50)])
+
+    result = asyncio.run(scenario())
+    assert result["sent"] == 50
+    assert result["failed"] == 0
+    assert max(peak) == 10
+
+def test_retries_flood_control_with_server_delay():
+    attempts = {}
+
+    async def send(chat_id, text):
+        attempts[chat_id] = attempts.get(chat_id, 0) + 1
+        if chat_id == 1 and attempts[chat_id] == 1:
+            raise FloodError(0.05)
+
+    async def scenario():
+        sender = FanoutSender(send, AsyncTokenBucket(rate=1000), per_chat_interval=0, name="test_fanout")
+        return await sender.send_all([(1, "a"), (2, "b")])
+
+    retried = metrics.get_all()["counters"].get("test_fanout_retried_total", 0)
+    result = asyncio.run(scenario())
+    assert result["sent"] == 2
+    assert result["retried"] == 1
+    assert attempts[1] == 2
+    assert metrics.get_all()["counters"]["test_fanout_retried_total"] == retried + 1
+
+def test_other_errors_fail_without_retry():
+    calls = []
+
+    async def send(chat_id, text):
+        calls.append(chat_id)
+        raise RuntimeError("chat not found")
+
+    async def scenario():
+        sender = FanoutSender(send, AsyncTokenBucket(rate=1000), per_chat_interval=0)
+        return await sender.send_all([(1, "a")])
+
+    result = asyncio.run(scenario())
+    assert result["failed"] == 1
+    assert calls == [1]
+
+def test_per_chat_interval_spaces_messages():
+    sent_at = []
+
+    async def send(chat_id, text):
+        sent_at.append(time.monotonic())
+
+    async def scenario():
+        sender = FanoutSender(send, AsyncTokenBucket(rate=1000), per_chat_interval=0.1)
+        await sender.send_all([(7, "a"), (7, "b"), (7, "c")])
+
+    asyncio.run(scenario())
+    sent_at.sort()
+    assert sent_at[2] - sent_at[0] >= 0.19
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from core.database import Base
+from core.models import SchedulerLease
+from core.leader import LeaseConfigError, ShardLeases, shard_of, try_acquire
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture(scope="function")
+def session_factory():
+    Base.metadata.create_all(bind=engine)
+    try:
+        yield TestingSessionLocal
+    finally:
+        Base.metadata.drop_all(bind=engine)
+
+def test_lease_is_exclusive_until_expiry(session_factory):
+    with session_factory() as db:
+        assert try_acquire(db, "leader", "a", 30)
+        assert try_acquire(db, "leader", "a", 30)  # Renewal
+        assert not try_acquire(db, "leader", "b", 30)
+
+        db.query(SchedulerLease).update({"expires_at": 0})
+        db.commit()
+        assert try_acquire(db, "leader", "b", 30)
+        assert not try_acquire(db, "leader", "a", 30)
+
+def test_single_shard_elects_one_leader(session_factory):
+    first = ShardLeases(session_factory, shards=1, owner="a")
+    second = ShardLeases(session_factory, shards=1, owner="b")
+
+    assert first.refresh() == {0}
+    assert second.refresh() == set()
+    assert first.owns(42) and not second.owns(42)
+
+    first.release_all()
+    assert second.refresh() == {0}
+
+def test_shards_split_between_replicas(session_factory):
+    first = ShardLeases(session_factory, shards=4, max_held=2, owner="a")
+    second = ShardLeases(session_factory, shards=4, max_held=2, owner="b")
+
+    owned_first = first.refresh()
+    owned_second = second.refresh()
+    assert len(owned_first) == 2 and len(owned_second) == 2
+    assert owned_first.isdisjoint(owned_second)
+
+    # Every user is owned by exactly one replica
+    for user_id in range(100):
+        assert first.owns(user_id) != second.owns(user_id)
+
+def test_shard_of_is_stable():
+    assert shard_of(12345, 8) == shard_of(12345, 8)
+    assert {shard_of(u, 4) for u in range(100)} == {0, 1, 2, 3}
+
+def test_check_rejects_sqlite_for_several_shards(session_factory):
+    with pytest.raises(LeaseConfigError):
+        ShardLeases(session_factory, shards=4).check()
+
+def test_check_single_shard_falls_back_to_local_ownership():
+    # No scheduler_leases table here at all
+    leases = ShardLeases(TestingSessionLocal, shards=1)
+    leases.check()
+
+    assert leases.local
+    assert leases.refresh() == {0}
+    assert leases.owns(42)
+    leases.release_all()
+    assert leases.owned == set()
@@ -0,0 +1,116 @@
+import gzip
+import json
+import logging
+import queue
+import threading
+from core.logging_config import (
+    BoundedQueueHandler, BatchingQueueListener, JSONFormatter, gzip_rotating_file_handler,
+    SamplingFilter, dumps, parse_sample_rates, set_request_id, DROP_OLDEST, DROP_NEWEST,
+)
+
+class ListSink(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+def make_record(msg, *args, level=logging.INFO):
+    return logging.LogRecord("test", level, __file__, 1, msg, args, None)
+
+def test_prepare_captures_request_id_and_message_on_caller():
+    q = queue.Queue()
+    handler = BoundedQueueHandler(q)
+    set_request_id("req-1")
+    handler.handle(make_record("hello %s", "world"))
+
+    record = q.get_nowait()
+    assert record.request_id == "req-1"
+    assert record.getMessage() == "hello world"
+
+    # Formatted later on another thread, the request id survives
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(json.loads(JSONFormatter().format(record))))
+    thread.start()
+    thread.join()
+    assert result["request_id"] == "req-1"
+
+def test_overflow_drop_policies():
+    oldest = BoundedQueueHandler(queue.Queue(maxsize=2), DROP_OLDEST)
+    newest = BoundedQueueHandler(queue.Queue(maxsize=2), DROP_NEWEST)
+    for handler in (oldest, newest):
+        for i in range(4):
+            handler.handle(make_record(f"m{i}"))
+
+    assert [r.msg for r in oldest.queue.queue] == ["m2", "m3"]
+    assert [r.msg for r in newest.queue.queue] == ["m0", "m1"]
+    assert oldest.dropped == newest.dropped == 2
+
+def test_listener_writes_batches_in_order(tmp_path):
+    path = tmp_path / "app.log"
+    file_sink = logging.FileHandler(path)
+    file_sink.setLevel(logging.INFO)
+    list_sink = ListSink()
+    q = queue.Queue()
+    listener = BatchingQueueListener(q, [file_sink, list_sink], batch_size=10)
+    for i in range(25):
+        q.put(make_record(f"line {i}"))
+    q.put(make_record("too quiet", level=logging.DEBUG))
+    listener.start()
+    listener.stop()
+
+    assert path.read_text().splitlines() == [f"line {i}" for i in range(25)]
+    assert len(list_sink.records) == 26  # ListSink has no level
+
+def test_gzip_rotation(tmp_path):
+    path = tmp_path / "app.log"
+    sink = gzip_rotating_file_handler(str(path), max_bytes=200, backups=2)
+    q = queue.Queue()
+    listener = BatchingQueueListener(q, [sink], batch_size=50)
+    for i in range(30):
+        q.put(make_record(f"record number {i:03d}"))
+    listener.start()
+    listener.stop()
+
+    rotated = tmp_path / "app.log.1.gz"
+    assert rotated.exists()
+    assert (tmp_path / "app.log.2.gz").exists()
+    assert not (tmp_path / "app.log.3.gz").exists()
+    with gzip.open(rotated, "rt") as f:
+        assert f.read().startswith("record number")
+    assert path.stat().st_size < 200
+    assert path.read_text().splitlines()[-1] == "record number 029"
+
+def test_large_arguments_are_capped_before_rendering():
+    handler = BoundedQueueHandler(queue.Queue(), max_field_chars=100, max_message_chars=500)
+    result = {"success": True, "content": "x" * 100_000, "items": list(range(10_000))}
+    handler.handle(logging.LogRecord("test", logging.INFO, __file__, 1, "[Agent] Result: %s", (result,), None))
+    handler.handle(make_record("stdout: %s", "y" * 10_000))
+    handler.handle(make_record("%(user)s did %(what)s", {"user": "u1", "what": "z" * 1000}))
+    handler.handle(make_record("f-string " + "w" * 10_000))
+
+    capped_dict, capped_str, mapping, long_message = [r.getMessage() for r in handler.queue.queue]
+    assert capped_dict.startswith("[Agent] Result: {") and len(capped_dict) < 200
+    assert capped_str == "stdout: " + "y" * 100 + "... [+9900 chars]"
+    assert mapping.startswith("u1 did zzz") and len(mapping) < 150
+    assert len(long_message) < 530
+
+def test_sampling_filter_keeps_warnings_and_uses_longest_prefix():
+    rates = parse_sample_rates("core.agent=0.0, core.agent.loop=1")
+    sampling = SamplingFilter(rates)
+
+    def record(name, level):
+        return logging.LogRecord(name, level, __file__, 1, "m", None, None)
+
+    assert not sampling.filter(record("core.agent.llm_client", logging.INFO))
+    assert sampling.filter(record("core.agent.llm_client", logging.WARNING))
+    assert sampling.filter(record("core.agent.loop", logging.INFO))
+    assert sampling.filter(record("core.db", logging.INFO))
+
+    half = SamplingFilter({"hot": 0.5})
+    kept = sum(half.filter(record("hot", logging.INFO)) for _ in range(2000))
+    assert 800 < kept < 1200
+
+def test_dumps_handles_non_json_values():
+    assert json.loads(dumps({"a": 1, "module": threading}))["a"] == 1
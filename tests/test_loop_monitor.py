@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import time
+from core.loop_monitor import LoopMonitor, InstrumentedThreadPoolExecutor
+from core.metrics import metrics
+
+def test_records_blocking_callback_with_stack():
+    monitor = LoopMonitor(threshold_ms=50, interval=0.01, name="test_loop")
+
+    async def blocking_handler():
+        time.sleep(0.3)  # Sync call inside a coroutine
+
+    async def main():
+        monitor.start(install_executor=False)
+        await asyncio.sleep(0.05)
+        await blocking_handler()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+
+    stalls = monitor.top_stalls()
+    assert len(stalls) == 1
+    assert stalls[0]["duration_ms"] >= 200
+    assert "blocking_handler" in stalls[0]["site"]
+    assert "blocking_handler" in stalls[0]["stack"]
+    assert metrics.get_all()["counters"]["test_loop_stalls_total"] >= 1
+
+def test_keeps_only_longest_stalls():
+    monitor = LoopMonitor(top_n=2)
+    for duration in (120, 500, 80, 300):
+        monitor._record(duration, f"site-{duration}", [])
+
+    assert [s["duration_ms"] for s in monitor.top_stalls()] == [500, 300]
+
+def test_executor_reports_queue_depth_and_utilization():
+    executor = InstrumentedThreadPoolExecutor(max_workers=2, name="test_pool")
+    release = threading.Event()
+    futures = [executor.submit(release.wait) for _ in range(5)]
+    time.sleep(0.05)
+
+    assert executor.stats() == {"queued": 3, "active": 2, "utilization": 1.0}
+    release.set()
+    for f in futures:
+        f.result()
+    assert executor.stats() == {"queued": 0, "active": 0, "utilization": 0.0}
+    assert metrics.get_histogram("test_pool_queue_wait_ms")["count"] == 5
+    executor.shutdown()
+
+def test_installs_instrumented_default_executor():
+    monitor = LoopMonitor(interval=0.01, name="test_loop2")
+
+    async def main():
+        monitor.start()
+        return await asyncio.to_thread(lambda: 42)
+
+    assert asyncio.run(main()) == 42
+    assert monitor.executor is not None
+    assert metrics.get_histogram("executor_queue_wait_ms")["count"] >= 1
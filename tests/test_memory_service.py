@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core.database import Base
+from core.models import Memory, User
+from core.agent import memory_service
+
+# Setup in-memory DB for testing
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture(scope="function")
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    session.add(User(id=1, telegram_user_id="111"))
+    session.commit()
+    memory_service._preference_cache.clear()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+def test_defaults_when_unset(db):
+    assert memory_service.get_preference(db, 1, "brief_time") == "07:30"
+
+def test_set_preference_upserts_single_row(db):
+    memory_service.set_preference(db, 1, "brief_time", "06:00")
+    memory_service.set_preference(db, 1, "brief_format", "compact")
+
+    rows = db.query(Memory).filter(Memory.user_id == 1).all()
+    assert len(rows) == 1
+    assert rows[0].value_json == {"brief_time": "06:00", "brief_format": "compact"}
+
+def test_other_dialects_fall_back_to_read_merge_write(db, monkeypatch):
+    memory_service.set_preference(db, 1, "brief_time", "06:00")
+    monkeypatch.setattr(engine.dialect, "name", "mysql")
+
+    prefs = memory_service.set_preference(db, 1, "timezone", "UTC")
+    memory_service.set_preference(db, 1, "brief_time", "06:30")
+
+    rows = db.query(Memory).filter(Memory.user_id == 1).all()
+    assert len(rows) == 1
+    assert rows[0].value_json == {"brief_time": "06:30", "timezone": "UTC"}
+    assert prefs["timezone"] == "UTC" and prefs["brief_format"] == "detailed"
+
+def test_set_preferences_bulk(db):
+    prefs = memory_service.set_preferences(db, 1, {"brief_time": "08:15", "timezone": "UTC"})
+    assert prefs["brief_time"] == "08:15"
+    assert prefs["timezone"] == "UTC"
+    assert prefs["brief_format"] == "detailed"
+
+def test_cache_written_through(db):
+    memory_service.get_all_preferences(db, 1)
+    memory_service.set_preference(db, 1, "brief_time", "09:00")
+
+    # Served from cache, no reload needed
+    hits = memory_service._preference_cache.hits
+    assert memory_service.get_preference(db, 1, "brief_time") == "09:00"
+    assert memory_service._preference_cache.hits == hits + 1
+
+def test_schedule_preferences_only_explicit(db):
+    db.add(User(id=2, telegram_user_id="222"))
+    db.commit()
+    memory_service.set_preferences(db, 1, {"brief_time": "06:45", "brief_format": "compact"})
+    memory_service.set_preference(db, 2, "timezone", "UTC")
+
+    stored = memory_service.get_schedule_preferences(db)
+    assert stored == {1: {"brief_time": "06:45"}, 2: {"timezone": "UTC"}}
+    assert memory_service.get_schedule_preferences(db, [2]) == {2: {"timezone": "UTC"}}
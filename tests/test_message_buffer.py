@@ -0,0 +1,60 @@
+import threading
+import time
+from core.db.message_buffer import MessageLogBuffer, DROP_NEWEST
+
+def test_flushes_on_batch_size():
+    batches = []
+    flushed = threading.Event()
+    buffer = MessageLogBuffer(lambda rows: (batches.append(rows), flushed.set()), batch_size=3, flush_interval_ms=10000)
+
+    for i in range(3):
+        buffer.put({"text": str(i)})
+
+    assert flushed.wait(2)
+    assert [r["text"] for r in batches[0]] == ["0", "1", "2"]
+    buffer.close()
+
+def test_flushes_on_interval():
+    batches = []
+    buffer = MessageLogBuffer(batches.append, batch_size=100, flush_interval_ms=20)
+    buffer.put({"text": "a"})
+    time.sleep(0.2)
+    assert batches == [[{"text": "a"}]]
+    buffer.close()
+
+def test_drop_oldest_when_full():
+    release = threading.Event()
+    batches = []
+
+    def slow_flush(rows):
+        release.wait(2)
+        batches.append(rows)
+
+    buffer = MessageLogBuffer(slow_flush, batch_size=1, flush_interval_ms=10000, max_pending=2)
+    buffer.put({"text": "in-flight"})
+    time.sleep(0.05)  # Flusher now blocked on the first row
+
+    assert buffer.put({"text": "a"})
+    assert buffer.put({"text": "b"})
+    assert buffer.put({"text": "c"}) is False
+    assert buffer.dropped == 1
+
+    release.set()
+    buffer.close()
+    texts = [r["text"] for batch in batches for r in batch]
+    assert texts == ["in-flight", "b", "c"]
+
+def test_drop_newest_rejects_row():
+    buffer = MessageLogBuffer(lambda rows: None, max_pending=1, flush_interval_ms=10000, batch_size=10, drop_policy=DROP_NEWEST)
+    assert buffer.put({"text": "a"})
+    assert buffer.put({"text": "b"}) is False
+    assert len(buffer) == 1
+    buffer.close()
+
+def test_close_flushes_remaining():
+    batches = []
+    buffer = MessageLogBuffer(batches.append, batch_size=100, flush_interval_ms=10000)
+    buffer.put({"text": "a"})
+    buffer.close()
+    assert batches == [[{"text": "a"}]]
+    assert buffer.put({"text": "b"}) is False
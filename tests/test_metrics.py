@@ -0,0 +1,155 @@
+import pytest
+import os
+import socket
+import threading
+from types import SimpleNamespace
+from urllib.request import urlopen
+from core.metrics import Histogram, Metrics
+from core import prometheus
+from core.prometheus import render, start_metrics_server
+
+def test_histogram_buckets_within_relative_error():
+    histogram = Histogram()
+    for value in (0.05, 1.0, 3.7, 250.0, 12_345.0, 1_000_000.0):
+        bound = histogram.upper_bound(histogram._index(value))
+        assert value <= bound * (1 + 1e-9)
+        assert bound <= value * 1.09
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for value in range(1, 1001):
+        histogram.observe(float(value))
+
+    summary = histogram.summary()
+    assert summary["count"] == 1000
+    assert summary["min"] == 1.0
+    assert summary["max"] == 1000.0
+    assert summary["p50"] == pytest.approx(500, rel=0.09)
+    assert summary["p90"] == pytest.approx(900, rel=0.09)
+    assert summary["p99"] == pytest.approx(990, rel=0.09)
+
+def test_histogram_clamps_out_of_range_values():
+    histogram = Histogram(lowest=1, highest=100)
+    histogram.observe(0.001)
+    histogram.observe(10_000)
+
+    assert histogram.counts[0] == 1
+    assert histogram.counts[-1] == 1
+    assert histogram.percentile(100) == 10_000
+
+def test_empty_histogram_summary():
+    assert Histogram().summary()["p99"] == 0.0
+
+def test_observe_keeps_label_sets_apart():
+    m = Metrics()
+    m.observe("latency_ms", 10, route="/a")
+    m.observe("latency_ms", 20, route="/b")
+    m.observe("latency_ms", 30, route="/a")
+
+    assert m.get_histogram("latency_ms", route="/a")["count"] == 2
+    assert m.get_histogram("latency_ms", route="/b")["count"] == 1
+    assert m.get_histogram("latency_ms", route="/c")["count"] == 0
+
+def test_time_records_duration_and_error_status():
+    m = Metrics()
+    with m.time("tool_ms", tool="t", status="ok"):
+        pass
+    with pytest.raises(RuntimeError):
+        with m.time("tool_ms", tool="t", status="ok"):
+            raise RuntimeError("boom")
+
+    assert m.get_histogram("tool_ms", tool="t", status="ok")["count"] == 1
+    assert m.get_histogram("tool_ms", tool="t", status="error")["count"] == 1
+
+def test_get_all_includes_histograms():
+    m = Metrics()
+    m.observe("latency_ms", 5, method="GET", status=200)
+
+    histograms = m.get_all()["histograms"]
+    assert list(histograms) == ['latency_ms{method="GET",status="200"}']
+    assert histograms['latency_ms{method="GET",status="200"}']["count"] == 1
+
+def test_prometheus_render_histogram_buckets():
+    m = Metrics()
+    m.increment("requests_total", 3)
+    m.set_gauge("queue depth", 2)
+    for value in (0.5, 3, 3, 700):
+        m.observe("latency_ms", value, path='/a"b')
+
+    lines = render(m, include_process=False).splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert "requests_total 3" in lines
+    assert "queue_depth 2" in lines
+    assert "# TYPE latency_ms histogram" in lines
+    assert 'latency_ms_bucket{path="/a\\"b",le="0.64"} 1' in lines
+    assert 'latency_ms_bucket{path="/a\\"b",le="5.12"} 3' in lines
+    assert 'latency_ms_bucket{path="/a\\"b",le="+Inf"} 4' in lines
+    assert 'latency_ms_count{path="/a\\"b"} 4' in lines
+
+def test_metrics_server_serves_process_stats():
+    m = Metrics()
+    m.increment("hits_total")
+    server = start_metrics_server(port=_free_port(), registry=m)
+    try:
+        body = urlopen(f"http://127.0.0.1:{server.server_port}/metrics").read().decode()
+    finally:
+        server.shutdown()
+
+    assert "hits_total 1" in body
+    assert 'python_gc_collections_total{generation="0"}' in body
+    assert "process_resident_memory_bytes" in body
+
+@pytest.mark.parametrize("platform, rss_bytes", [("darwin", 50_000_000), ("freebsd14", 50_000_000 * 1024)])
+def test_process_stats_without_proc(monkeypatch, platform, rss_bytes):
+    real_open, real_listdir = open, os.listdir
+
+    def no_proc(opener):
+        def wrapped(path, *args, **kwargs):
+            if str(path).startswith("/proc"):
+                raise FileNotFoundError(path)
+            return opener(path, *args, **kwargs)
+        return wrapped
+
+    monkeypatch.setattr("builtins.open", no_proc(real_open))
+    monkeypatch.setattr(prometheus.os, "listdir", no_proc(real_listdir))
+    monkeypatch.setattr(prometheus.sys, "platform", platform)
+    monkeypatch.setattr(prometheus.resource, "getrusage", lambda who: SimpleNamespace(ru_maxrss=50_000_000))
+
+    stats = prometheus.process_stats()
+    assert stats["process_resident_memory_bytes"] == rss_bytes
+    assert stats["process_open_fds"] > 0  # From /dev/fd
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_concurrent_increments_are_not_lost():
+    m = Metrics()
+
+    def worker():
+        for _ in range(10000):
+            m.increment("hits")
+            m.observe("latency_ms", 1.0)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert m.get_all()["counters"]["hits"] == 80000
+    assert m.get_histogram("latency_ms")["count"] == 80000
+
+def test_finished_thread_shards_are_folded():
+    m = Metrics()
+    m.increment("hits")
+    for _ in range(3):
+        t = threading.Thread(target=m.increment, args=("hits", 2))
+        t.start()
+        t.join()
+
+    assert m.get_all()["counters"]["hits"] == 7
+    assert len(m._shards) == 1  # Only the live main-thread shard is kept
+    m.increment("hits")
+    assert m.get_all()["counters"]["hits"] == 8
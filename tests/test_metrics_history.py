@@ -0,0 +1,55 @@
+import pytest
+import time
+from core.metrics import Metrics
+from core.metrics_history import MetricsHistory, RingBuffer, SECOND, MINUTE
+
+def test_ring_buffer_keeps_latest_slots():
+    ring = RingBuffer(3)
+    for t in range(100, 105):
+        ring.put(t, t * 10)
+
+    assert ring.since(0) == [(102, 1020), (103, 1030), (104, 1040)]
+    assert ring.since(104) == [(104, 1040)]
+
+def test_history_records_counter_deltas_and_latency():
+    m = Metrics()
+    history = MetricsHistory(m, counters=["requests_total"], histograms=["latency_ms"])
+    start = int(time.time()) - 30
+    start -= start % 60  # Begin on a minute boundary
+
+    history.sample(start)  # Baseline
+    m.increment("requests_total", 5)
+    m.observe("latency_ms", 10, route="/a")
+    m.observe("latency_ms", 1000, route="/b")
+    history.sample(start + 1)
+    m.increment("requests_total", 2)
+    history.sample(start + 2)
+
+    series = history.query(SECOND, window_seconds=120)["series"]
+    assert series["requests_total"] == [(start + 1, 5), (start + 2, 2)]
+    point = series["latency_ms"][0][1]
+    assert point["count"] == 2
+    assert point["p50"] == pytest.approx(10, rel=0.09)
+    assert point["p99"] == pytest.approx(1000, rel=0.09)
+    assert series["latency_ms"][1][1]["count"] == 0
+
+def test_history_rolls_up_minutes():
+    m = Metrics()
+    history = MetricsHistory(m, counters=["requests_total"], histograms=["latency_ms"])
+    start = int(time.time()) - 600
+    start -= start % 60
+
+    history.sample(start)
+    for second in range(1, 61):
+        m.increment("requests_total")
+        m.observe("latency_ms", second)
+        history.sample(start + second)
+
+    series = history.query(MINUTE, window_seconds=3600)["series"]
+    # Seconds 1-59 belong to the first minute; second 60 opens the next one
+    assert series["requests_total"] == [(start, 59)]
+    assert series["latency_ms"][0][1]["count"] == 59
+
+def test_history_rejects_unknown_resolution():
+    with pytest.raises(ValueError):
+        MetricsHistory(Metrics()).query("hour")
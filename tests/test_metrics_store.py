@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+from core.metrics_store import MmapFile, MultiProcessMetrics, read_entries, ARCHIVE_FILE, _encode
+
+CORE_SRC = os.path.join(os.path.dirname(__file__), "..", "packages", "core", "src")
+
+def run_worker(directory, script: str):
+    env = dict(os.environ, METRICS_MULTIPROC_DIR=str(directory), PYTHONPATH=CORE_SRC)
+    subprocess.run([sys.executable, "-c", "from core.metrics import metrics\n" + script], env=env, check=True)
+
+def test_mmap_file_roundtrip_and_growth(tmp_path):
+    store = MmapFile(str(tmp_path / "1.db"), initial_size=64)
+    for i in range(50):
+        store.write(f"key-{i}".encode(), float(i))
+    store.write(b"key-3", 42.0)
+
+    entries = read_entries(str(tmp_path / "1.db"))
+    assert len(entries) == 50
+    assert entries[b"key-3"] == 42.0
+    assert entries[b"key-49"] == 49.0
+
+def test_aggregates_live_workers(tmp_path):
+    # A live "worker": the parent process id is certainly running
+    other = MmapFile(str(tmp_path / f"{os.getppid()}.db"))
+    other.write(_encode("c", "requests_total", ()), 5)
+    other.write(_encode("g", "queue_depth", ()), 7)
+    other.write(_encode("hb", "latency_ms", (("route", "/a"),), 10), 2)
+    other.write(_encode("hs", "latency_ms", (("route", "/a"),)), 0.2)
+    other.write(_encode("hmin", "latency_ms", (("route", "/a"),)), 0.1)
+    other.write(_encode("hmax", "latency_ms", (("route", "/a"),)), 0.1)
+
+    m = MultiProcessMetrics(str(tmp_path))
+    m.increment("requests_total", 3)
+    m.set_gauge("queue_depth", 2)
+    m.observe("latency_ms", 50, route="/a")
+
+    data = m.get_all()
+    assert data["counters"]["requests_total"] == 8
+    assert data["gauges"]["queue_depth"] == 7
+    assert m.get_histogram("latency_ms", route="/a")["count"] == 3
+
+def test_dead_worker_files_are_archived(tmp_path):
+    run_worker(tmp_path, "metrics.increment('requests_total', 4)\nmetrics.observe('latency_ms', 12.0)\nmetrics.set_gauge('queue_depth', 9)")
+    run_worker(tmp_path, "metrics.increment('requests_total', 1)")
+    assert len([f for f in os.listdir(tmp_path) if f.endswith(".db")]) == 2
+
+    m = MultiProcessMetrics(str(tmp_path))
+    m.increment("requests_total")
+    data = m.get_all()
+
+    assert data["counters"]["requests_total"] == 6
+    assert data["histograms"]["latency_ms"]["count"] == 1
+    assert "queue_depth" not in data["gauges"]  # Gauges die with their worker
+    assert sorted(f for f in os.listdir(tmp_path) if f.endswith(".db")) == sorted([ARCHIVE_FILE, f"{os.getpid()}.db"])
+    # Archived counts are kept on later reads
+    assert m.get_all()["counters"]["requests_total"] == 6
+
+def test_file_left_under_our_pid_is_archived_not_truncated(tmp_path):
+    # An exited worker had this pid and was never folded
+    stale = MmapFile(str(tmp_path / f"{os.getpid()}.db"))
+    stale.write(_encode("c", "requests_total", ()), 5)
+    stale.close()
+
+    m = MultiProcessMetrics(str(tmp_path))
+    m.increment("requests_total")
+    assert m.get_all()["counters"]["requests_total"] == 6
+
+def test_history_samples_local_totals_only(tmp_path, monkeypatch):
+    from core.metrics_history import MetricsHistory
+
+    m = MultiProcessMetrics(str(tmp_path))
+
+    def flush():
+        raise AssertionError("history must not flush or read other workers")
+
+    monkeypatch.setattr(m, "flush", flush)
+    m.increment("requests_total", 2)
+    history = MetricsHistory(registry=m, counters=["requests_total"], histograms=[])
+    history.sample(now=100)
+    m.increment("requests_total")
+    history.sample(now=101)
+    assert history._rings["second"]["requests_total"].since(0) == [(101, 1)]
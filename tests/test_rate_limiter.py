@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core import rate_limiter
+from core.rate_limiter import RateLimiter, StripedRateLimiter, AsyncRateLimiter, SqliteRateLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", fake)
+    return fake
+
+def test_allows_burst_then_blocks(clock):
+    limiter = RateLimiter(max_requests=20, window_seconds=60)
+    results = [limiter.is_allowed("u") for _ in range(21)]
+
+    assert results[0] == (True, 19)
+    assert results[19] == (True, 0)
+    assert results[20] == (False, 0)
+    assert limiter.get_retry_after("u") == 3
+
+def test_refills_at_steady_rate(clock):
+    limiter = RateLimiter(max_requests=2, window_seconds=10)
+    assert limiter.is_allowed("u")[0]
+    assert limiter.is_allowed("u")[0]
+    assert not limiter.is_allowed("u")[0]
+
+    clock.now += 5
+    assert limiter.is_allowed("u") == (True, 0)
+    assert not limiter.is_allowed("u")[0]
+
+def test_retry_after_zero_for_unknown_key(clock):
+    assert RateLimiter().get_retry_after("nobody") == 0
+
+def test_idle_keys_are_swept(clock):
+    limiter = RateLimiter(max_requests=5, window_seconds=10)
+    for i in range(100):
+        limiter.is_allowed(f"user-{i}")
+    assert len(limiter) == 100
+
+    clock.now += 11
+    limiter.is_allowed("active")
+    assert len(limiter) == 1
+
+def test_bucket_stores_single_float():
+    bucket = rate_limiter._Bucket(1.0)
+    assert not hasattr(bucket, "__dict__")
+
+def test_striped_limiter_isolates_keys(clock):
+    limiter = StripedRateLimiter(max_requests=2, window_seconds=10, stripes=4)
+    assert limiter.is_allowed("a")[0] and limiter.is_allowed("a")[0]
+    assert not limiter.is_allowed("a")[0]
+    assert limiter.is_allowed("b") == (True, 1)
+    assert limiter.get_retry_after("a") == 5
+    assert len(limiter) == 2
+
+def test_striped_limiter_under_threads():
+    limiter = StripedRateLimiter(max_requests=100, window_seconds=60, stripes=8)
+
+    def hammer(_):
+        return sum(limiter.is_allowed(f"user-{i % 10}")[0] for i in range(50))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        allowed = sum(pool.map(hammer, range(8)))
+
+    # 10 keys x 100 allowed each, never more despite concurrent checks
+    assert allowed == 400
+    limiter_full = sum(limiter.is_allowed(f"user-{i}")[0] for i in range(10) for _ in range(100))
+    assert allowed + limiter_full == 1000
+
+def test_async_limiter_in_event_loop(clock):
+    limiter = AsyncRateLimiter(max_requests=3, window_seconds=30)
+
+    async def scenario():
+        return [limiter.is_allowed("u")[0] for _ in range(4)]
+
+    assert asyncio.run(scenario()) == [True, True, True, False]
+    assert limiter.get_retry_after("u") == 10
+
+def test_sqlite_limiter_shared_between_instances(tmp_path):
+    path = str(tmp_path / "limits.db")
+    worker_a = SqliteRateLimiter(path, max_requests=3, window_seconds=60)
+    worker_b = SqliteRateLimiter(path, max_requests=3, window_seconds=60)
+
+    assert worker_a.is_allowed("u") == (True, 2)
+    assert worker_b.is_allowed("u") == (True, 1)
+    assert worker_a.is_allowed("u") == (True, 0)
+    assert worker_b.is_allowed("u") == (False, 0)
+    assert 1 <= worker_a.get_retry_after("u") <= 20
+    assert worker_b.get_retry_after("other") == 0
+
+def test_sqlite_limiter_batches_keys(tmp_path):
+    limiter = SqliteRateLimiter(str(tmp_path / "limits.db"), max_requests=1, window_seconds=60)
+    assert limiter.is_allowed_many(["user", "chat"]) == [(True, 0), (True, 0)]
+    assert limiter.is_allowed_many(["user", "fresh"]) == [(False, 0), (True, 0)]
+
+def test_sqlite_limiter_exact_under_threads(tmp_path):
+    path = str(tmp_path / "limits.db")
+    limiters = [SqliteRateLimiter(path, max_requests=50, window_seconds=60) for _ in range(4)]
+
+    def hammer(limiter):
+        return sum(limiter.is_allowed("hot")[0] for _ in range(40))
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        assert sum(pool.map(hammer, limiters)) == 50
+
+def test_create_rate_limiter_backends(monkeypatch, tmp_path):
+    assert isinstance(rate_limiter.create_rate_limiter(5, 60, "t"), StripedRateLimiter)
+    assert isinstance(rate_limiter.create_rate_limiter(5, 60, "t", in_memory=AsyncRateLimiter), AsyncRateLimiter)
+
+    monkeypatch.setattr(rate_limiter.settings, "RATE_LIMIT_BACKEND", "sqlite")
+    monkeypatch.setattr(rate_limiter.settings, "RATE_LIMIT_SQLITE_PATH", str(tmp_path / "limits.db"))
+    limiter = rate_limiter.create_rate_limiter(5, 60, "t")
+    assert isinstance(limiter, SqliteRateLimiter)
+    limiter.is_allowed("u")
+    assert limiter._conn().execute("SELECT key FROM rate_limits").fetchall() == [("t:u",)]
+
+def test_check_async_runs_sqlite_off_the_loop(tmp_path, monkeypatch):
+    limiter = SqliteRateLimiter(str(tmp_path / "limits.db"), max_requests=1, window_seconds=60)
+    threads = []
+    is_allowed = limiter.is_allowed
+    monkeypatch.setattr(limiter, "is_allowed", lambda key: threads.append(threading.get_ident()) or is_allowed(key))
+
+    async def scenario():
+        return [await rate_limiter.check_async(limiter, "u") for _ in range(2)], threading.get_ident()
+
+    (first, second), loop_thread = asyncio.run(scenario())
+    assert first == (True, 0, 0)
+    assert second[0] is False and second[2] > 0
+    assert loop_thread not in threads
+
+def test_check_async_in_memory():
+    limiter = AsyncRateLimiter(max_requests=1, window_seconds=60)
+    assert asyncio.run(rate_limiter.check_async(limiter, "u")) == (True, 0, 0)
+    assert asyncio.run(rate_limiter.check_async(limiter, "u"))[0] is False
@@ -0,0 +1,58 @@
+import asyncio
+import os
+import sys
+import pytest
+from datetime import date, datetime
+import pytz
+
+pytest.importorskip("telegram")
+pytest.importorskip("apscheduler")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps", "bot", "src"))
+import scheduler  # noqa: E402
+
+class FakeClock:
+    """datetime stand-in for the scheduler module; only now() moves."""
+    current = datetime(2026, 1, 15, 7, 30, tzinfo=pytz.utc)
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+@pytest.fixture
+def run(monkeypatch):
+    monkeypatch.setattr(scheduler, "datetime", FakeClock)
+    monkeypatch.setattr(scheduler.brief_leases, "owns", lambda user_id: True)
+    armed = []
+    monkeypatch.setattr(scheduler.scheduler, "add_job", lambda fn, trigger, args, **kw: armed.append((trigger.run_date, args[1])))
+    sent = []
+
+    async def send_daily_brief(app, user_ids):
+        sent.append(sorted(user_ids))
+        FakeClock.current = datetime(2026, 1, 15, 7, 32, 40, tzinfo=pytz.utc)  # Sending took over two minutes
+
+    monkeypatch.setattr(scheduler, "send_daily_brief", send_daily_brief)
+    scheduler.brief_schedule.clear()
+    yield sent, armed
+    scheduler.brief_schedule.clear()
+    FakeClock.current = datetime(2026, 1, 15, 7, 30, tzinfo=pytz.utc)
+
+def test_bucket_due_during_a_long_run_is_not_skipped(run):
+    sent, armed = run
+    on = date(2026, 1, 15)
+    scheduler.brief_schedule.load([(1, "UTC", "07:30"), (2, "UTC", "07:31"), (3, "UTC", "09:00")], on)
+
+    asyncio.run(scheduler.run_due_briefs(None, 450))
+    assert sent == [[1]]
+    # 07:31 passed while sending: armed to run now, not skipped to 09:00
+    assert armed == [(FakeClock.current, 451)]
+
+    asyncio.run(scheduler.run_due_briefs(None, 451))
+    assert sent == [[1], [2]]
+    assert armed[-1] == (datetime(2026, 1, 15, 9, 0, tzinfo=pytz.utc), 540)
+
+def test_only_bucket_is_not_rerun_the_same_day(run):
+    sent, armed = run
+    scheduler.brief_schedule.load([(1, "UTC", "07:30")], date(2026, 1, 15))
+
+    asyncio.run(scheduler.run_due_briefs(None, 450))
+    assert armed == [(datetime(2026, 1, 16, 7, 30, tzinfo=pytz.utc), 450)]
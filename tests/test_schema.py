@@ -0,0 +1,98 @@
+import asyncio
+import os
+import uuid
+import pytest
+
+asyncpg = pytest.importorskip("asyncpg")
+
+# Runs supabase_schema.sql against a real Postgres, e.g. TEST_POSTGRES_URL=postgresql://postgres@localhost/postgres
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+SCHEMA_SQL = os.path.join(os.path.dirname(__file__), "..", "supabase_schema.sql")
+
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+
+def run_in_schema(scenario):
+    """Apply the schema in a throwaway Postgres schema and run scenario(conn) there."""
+    async def main():
+        conn = await asyncpg.connect(POSTGRES_URL)
+        schema = f"test_{uuid.uuid4().hex[:8]}"
+        try:
+            await conn.execute(f"CREATE SCHEMA {schema}; SET search_path TO {schema}")
+            with open(SCHEMA_SQL) as f:
+                await conn.execute(f.read())
+            return await scenario(conn)
+        finally:
+            await conn.execute(f"DROP SCHEMA {schema} CASCADE")
+            await conn.close()
+
+    return asyncio.run(main())
+
+async def snapshot(conn, user_id):
+    row = await conn.fetchrow("SELECT open_count, top_tasks::text FROM brief_snapshots WHERE user_id = $1", user_id)
+    return row and tuple(row)
+
+async def rebuilt_snapshot(conn, user_id):
+    """The snapshot refresh_brief_snapshot computes from scratch; the stored row is left as it was."""
+    tx = conn.transaction()
+    await tx.start()
+    try:
+        await conn.execute("SELECT refresh_brief_snapshot($1)", user_id)
+        return await snapshot(conn, user_id)
+    finally:
+        await tx.rollback()
+
+async def add_user(conn, telegram_user_id):
+    return await conn.fetchval("INSERT INTO users (telegram_user_id) VALUES ($1) RETURNING id", telegram_user_id)
+
+async def add_task(conn, user_id, title):
+    return await conn.fetchval("INSERT INTO tasks (user_id, title) VALUES ($1, $2) RETURNING id", user_id, title)
+
+def test_trigger_deltas_match_full_rebuild():
+    async def scenario(conn):
+        user_id = await add_user(conn, "101")
+        other_id = await add_user(conn, "102")
+        ids = [await add_task(conn, user_id, f"task {i}") for i in range(12)]
+        await add_task(conn, other_id, "not mine")
+        changes = [
+            ("UPDATE tasks SET status = 'done' WHERE id = $1", ids[-1]),  # In the top list
+            ("UPDATE tasks SET status = 'done' WHERE id = $1", ids[0]),  # Below the top list
+            ("UPDATE tasks SET status = 'open' WHERE id = $1", ids[-1]),  # Reopened
+            ("UPDATE tasks SET title = 'renamed' WHERE id = $1", ids[5]),
+            ("UPDATE tasks SET priority = 2 WHERE id = $1", ids[8]),  # Not a trigger column
+            ("DELETE FROM tasks WHERE id = ANY($1::bigint[])", ids[3:6]),
+        ]
+        checks = [(await snapshot(conn, user_id), await rebuilt_snapshot(conn, user_id))]
+        for query, arg in changes:
+            await conn.execute(query, arg)
+            checks.append((await snapshot(conn, user_id), await rebuilt_snapshot(conn, user_id)))
+        checks.append((await snapshot(conn, other_id), await rebuilt_snapshot(conn, other_id)))
+        return checks, await snapshot(conn, user_id)
+
+    checks, final = run_in_schema(scenario)
+    for stored, expected in checks:
+        assert stored == expected
+    assert final[0] == 8
+
+def test_missing_snapshot_row_is_rebuilt_by_trigger():
+    async def scenario(conn):
+        user_id = await add_user(conn, "201")
+        for i in range(3):
+            await add_task(conn, user_id, f"task {i}")
+        await conn.execute("DELETE FROM brief_snapshots WHERE user_id = $1", user_id)
+        await add_task(conn, user_id, "task 3")
+        return await snapshot(conn, user_id), await rebuilt_snapshot(conn, user_id)
+
+    stored, expected = run_in_schema(scenario)
+    assert stored == expected
+    assert stored[0] == 4
+
+def test_daily_brief_page_reads_snapshots():
+    async def scenario(conn):
+        user_id = await add_user(conn, "301")
+        await add_user(conn, "302")
+        for i in range(7):
+            await add_task(conn, user_id, f"task {i}")
+        return await conn.fetch("SELECT id, open_count, top_titles FROM daily_brief_page(0, 10, 3)")
+
+    rows = run_in_schema(scenario)
+    assert [(r["open_count"], r["top_titles"]) for r in rows] == [(7, ["task 6", "task 5", "task 4"]), (0, [])]
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from contextvars import copy_context
+from core import tracing
+from core.logging_config import request_id_var, set_request_id
+from core.loop_monitor import InstrumentedThreadPoolExecutor
+from core.tracing import JsonlSpanExporter, Span, span, traced, inject_env, load_chrome_trace
+
+CORE_SRC = os.path.join(os.path.dirname(__file__), "..", "packages", "core", "src")
+
+@pytest.fixture
+def finished(monkeypatch):
+    spans = []
+    monkeypatch.setattr(tracing, "export", spans.append)
+    return spans
+
+def in_fresh_context(fn):
+    return copy_context().run(fn)
+
+def test_nested_spans_share_request_id(finished):
+    def run():
+        set_request_id("req-42")
+        with span("outer") as outer:
+            with span("inner", tool="task_tool") as inner:
+                pass
+        return outer, inner
+
+    outer, inner = in_fresh_context(run)
+    assert [s.name for s in finished] == ["inner", "outer"]
+    assert outer.trace_id == inner.trace_id == "req-42"
+    assert inner.parent_id == outer.span_id
+    assert outer.parent_id is None
+    assert inner.attributes == {"tool": "task_tool"}
+
+def test_root_span_starts_new_trace_and_restores_request_id(finished):
+    def run():
+        set_request_id("req-1")
+        with span("parent"):
+            with span("job", root=True) as job:
+                inside = request_id_var.get()
+        return job, inside, request_id_var.get()
+
+    job, inside, after = in_fresh_context(run)
+    assert job.trace_id != "req-1" and job.parent_id is None
+    assert inside == job.trace_id
+    assert after == "req-1"
+
+def test_span_records_errors(finished):
+    def run():
+        with span("boom"):
+            raise ValueError("bad")
+
+    with pytest.raises(ValueError):
+        in_fresh_context(run)
+    assert finished[-1].status == "error"
+    assert finished[-1].attributes["error"] == "ValueError"
+
+def test_propagates_across_tasks_and_threads(finished):
+    executor = InstrumentedThreadPoolExecutor(max_workers=2)
+
+    @traced("worker")
+    def blocking_step():
+        return request_id_var.get()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        with span("request") as request:
+            ids = await asyncio.gather(
+                asyncio.to_thread(blocking_step),
+                loop.run_in_executor(executor, blocking_step),
+                traced("task")(asyncio.sleep)(0),
+            )
+        return request, ids
+
+    request, ids = asyncio.run(main())
+    executor.shutdown()
+    workers = [s for s in finished if s.name == "worker"]
+    assert ids[:2] == [request.trace_id, request.trace_id]
+    assert [s.parent_id for s in workers] == [request.span_id] * 2
+    assert next(s for s in finished if s.name == "task").parent_id == request.span_id
+
+def test_subprocess_joins_trace(finished):
+    def run():
+        with span("shell") as parent:
+            env = inject_env()
+        env["PYTHONPATH"] = CORE_SRC
+        script = "from core import tracing\nprint(tracing.request_id_var.get(), tracing.current_span().span_id)"
+        out = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+        return parent, out.stdout.split()
+
+    parent, (trace_id, parent_id) = in_fresh_context(run)
+    assert trace_id == parent.trace_id
+    assert parent_id == parent.span_id
+
+def test_jsonl_exporter_writes_chrome_trace_events(tmp_path):
+    path = str(tmp_path / "spans.jsonl")
+    exporter = JsonlSpanExporter(path)
+    for name in ("a", "b"):
+        s = Span(name, "req-9", attempt=1)
+        s.duration = 0.0025
+        exporter.export(s)
+    exporter.shutdown()
+
+    events = load_chrome_trace(path)["traceEvents"]
+    assert [e["name"] for e in events] == ["a", "b"]
+    assert events[0]["ph"] == "X"
+    assert events[0]["dur"] == 2500
+    assert events[0]["args"]["trace_id"] == "req-9"
+    assert events[0]["args"]["attempt"] == 1
+
+def test_traced_root_handler_does_not_leak_request_id(finished):
+    @traced("bot.message", root=True)
+    async def handler():
+        tracing.current_span().set(intent="add_task")
+        return request_id_var.get()
+
+    async def main():
+        inside = await handler()
+        return inside, request_id_var.get()
+
+    before = request_id_var.get()
+    inside, after = asyncio.run(main())
+    assert inside == finished[-1].trace_id != before
+    assert after == before
+    assert finished[-1].attributes == {"intent": "add_task"}